@@ -12,16 +12,44 @@ from sqlalchemy import insert, select, update
 
 from app.core.constants import (
     API_VERSION,
+    DEFAULT_ADAPTIVE_TIMEOUT_MIN_SECONDS,
+    DEFAULT_ADAPTIVE_TIMEOUT_MULTIPLIER,
+    DEFAULT_ADAPTIVE_TIMEOUT_PERCENTILE,
     DEFAULT_CREATE_IMAGE_MODEL,
     DEFAULT_FILTER_MODELS,
+    DEFAULT_HTTP_POOL_KEEPALIVE_EXPIRY,
+    DEFAULT_HTTP_POOL_MAX_CONNECTIONS,
+    DEFAULT_HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+    DEFAULT_LOG_WRITE_BEHIND_BATCH_SIZE,
+    DEFAULT_LOG_WRITE_BEHIND_FLUSH_INTERVAL_MS,
+    DEFAULT_LOG_WRITE_BEHIND_OVERFLOW_POLICY,
+    DEFAULT_LOG_WRITE_BEHIND_QUEUE_SIZE,
     DEFAULT_MODEL,
     DEFAULT_SAFETY_SETTINGS,
+    DEFAULT_STREAM_BATCH_SIZE,
+    DEFAULT_STREAM_BATCH_UNIT,
     DEFAULT_STREAM_CHUNK_SIZE,
     DEFAULT_STREAM_LONG_TEXT_THRESHOLD,
     DEFAULT_STREAM_MAX_DELAY,
     DEFAULT_STREAM_MIN_DELAY,
+    DEFAULT_STREAM_PACING_TICK_MS,
     DEFAULT_STREAM_SHORT_TEXT_THRESHOLD,
     DEFAULT_TIMEOUT,
+    DEFAULT_UPSTREAM_HTTP2_MAX_CONNECTIONS_PER_HOST,
+    DEFAULT_KEY_COOLDOWN_BASE_SECONDS,
+    DEFAULT_KEY_COOLDOWN_MAX_SECONDS,
+    DEFAULT_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS,
+    DEFAULT_KEY_AFFINITY_LOAD_FACTOR,
+    DEFAULT_KEY_AFFINITY_PREFIX_CONTENTS,
+    DEFAULT_RESPONSE_CACHE_DISK_MAX_BYTES,
+    DEFAULT_RESPONSE_CACHE_MAX_BYTES,
+    DEFAULT_RESPONSE_CACHE_REPLAY_CHUNK_SIZE,
+    DEFAULT_RESPONSE_CACHE_TTL_SECONDS,
+    DEFAULT_HEDGE_BUDGET_PERCENT,
+    DEFAULT_HEDGE_DEFAULT_DELAY_SECONDS,
+    DEFAULT_HEDGE_DELAY_PERCENTILE,
+    DEFAULT_HEDGE_MIN_DELAY_SECONDS,
+    DEFAULT_HEDGE_STREAM_TTFB_MS,
     MAX_RETRIES,
 )
 from app.log.logger import Logger
@@ -56,14 +84,75 @@ class Settings(BaseSettings):
     BASE_URL: str = f"https://generativelanguage.googleapis.com/{API_VERSION}"
     AUTH_TOKEN: str = ""
     MAX_FAILURES: int = 3
+    KEY_COOLDOWN_BASE_SECONDS: float = DEFAULT_KEY_COOLDOWN_BASE_SECONDS  # key 遇到限流或临时错误后的首次冷却时长（秒）
+    KEY_COOLDOWN_MAX_SECONDS: float = DEFAULT_KEY_COOLDOWN_MAX_SECONDS  # 指数退避的冷却时长上限（秒）
+    KEY_HEALTH_PERSIST_ENABLED: bool = True  # 是否将 key 健康状态持久化到数据库，重启后恢复
+    KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS: int = DEFAULT_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS  # 健康状态快照写入间隔（秒）
+    KEY_SELECTION_STRATEGY: str = "round_robin"  # 选 key 策略: round_robin 轮询 / least_outstanding 进行中请求最少优先
+    KEY_AFFINITY_ENABLED: bool = False  # 是否按请求前缀将同一会话固定到同一个 key，以命中隐式上下文缓存
+    KEY_AFFINITY_PREFIX_CONTENTS: int = DEFAULT_KEY_AFFINITY_PREFIX_CONTENTS  # 参与亲和哈希的 contents 条数（另含 systemInstruction）
+    KEY_AFFINITY_LOAD_FACTOR: float = DEFAULT_KEY_AFFINITY_LOAD_FACTOR  # 有界负载系数，首选 key 进行中请求超过平均值的该倍数时顺延到下一个 key
+    KEY_STATE_BACKEND: str = "memory"  # key 状态共享后端: memory/database/redis，多 worker 部署时使用 database 或 redis
+    KEY_STATE_REDIS_URL: str = "redis://localhost:6379/0"  # KEY_STATE_BACKEND=redis 时的连接地址
+    KEY_STATE_SYNC_INTERVAL_SECONDS: float = 1.0  # 从共享后端同步其他 worker 更新的 key 状态的间隔（秒）
     TEST_MODEL: str = DEFAULT_MODEL
     TIME_OUT: int = DEFAULT_TIMEOUT
     MAX_RETRIES: int = MAX_RETRIES
+    REQUEST_DEADLINE_SECONDS: float = 0  # 单个请求（含所有重试）的最长处理时间（秒），0 表示不限制；客户端可通过 X-Request-Timeout 头进一步缩短
+    MODEL_REQUEST_DEADLINES: Dict[str, float] = {}  # 按模型覆盖请求的最长处理时间（秒）
+    ADAPTIVE_TIMEOUT_ENABLED: bool = False  # 是否按模型近期延迟收紧非流式请求的单次超时
+    ADAPTIVE_TIMEOUT_PERCENTILE: float = DEFAULT_ADAPTIVE_TIMEOUT_PERCENTILE  # 自适应超时参考的延迟百分位
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = DEFAULT_ADAPTIVE_TIMEOUT_MULTIPLIER  # 单次超时为该百分位延迟的倍数（不超过 TIME_OUT）
+    ADAPTIVE_TIMEOUT_MIN_SECONDS: float = DEFAULT_ADAPTIVE_TIMEOUT_MIN_SECONDS  # 自适应超时下限（秒）
     PROXIES: List[str] = []
     PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY: bool = True  # 是否使用一致性哈希来选择代理
     VERTEX_API_KEYS: List[str] = []
     VERTEX_EXPRESS_BASE_URL: str = "https://aiplatform.googleapis.com/v1beta1/publishers/google"
 
+    # HTTP 连接池配置
+    HTTP_POOL_MAX_CONNECTIONS: int = DEFAULT_HTTP_POOL_MAX_CONNECTIONS
+    HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS: int = DEFAULT_HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = DEFAULT_HTTP_POOL_KEEPALIVE_EXPIRY  # 空闲连接保活时间（秒）
+    UPSTREAM_HTTP2_ENABLED: bool = False  # 是否使用 HTTP/2 多路复用连接上游
+    UPSTREAM_HTTP2_MAX_CONNECTIONS_PER_HOST: int = DEFAULT_UPSTREAM_HTTP2_MAX_CONNECTIONS_PER_HOST  # HTTP/2 模式下每个上游主机的最大连接数
+
+    # Key 限流配置（0 表示不限制）
+    KEY_RATE_LIMIT_ENABLED: bool = False  # 是否按 key 的 RPM/TPM/RPD 余量选择 key
+    KEY_RPM_LIMIT: int = 0  # 每个 key 每个模型的每分钟请求数上限
+    KEY_TPM_LIMIT: int = 0  # 每个 key 每个模型的每分钟 token 数上限
+    KEY_RPD_LIMIT: int = 0  # 每个 key 每个模型的每日请求数上限
+    MODEL_RPM_LIMITS: Dict[str, float] = {}  # 按模型覆盖 RPM 上限
+    MODEL_TPM_LIMITS: Dict[str, float] = {}  # 按模型覆盖 TPM 上限
+    MODEL_RPD_LIMITS: Dict[str, float] = {}  # 按模型覆盖 RPD 上限
+
+    # 请求合并配置
+    SINGLE_FLIGHT_ENABLED: bool = False  # 是否合并同时到达的相同非流式请求（generateContent/countTokens）
+    SINGLE_FLIGHT_WINDOW_SECONDS: float = 0.0  # 首个请求完成后结果继续共享的时长（秒），0 表示只合并进行中的请求
+    SINGLE_FLIGHT_DETERMINISTIC_ONLY: bool = True  # 是否只合并 temperature 为 0 的 generateContent 请求
+
+    # 响应缓存配置
+    RESPONSE_CACHE_ENABLED: bool = False  # 是否缓存非流式 generateContent 的上游响应
+    RESPONSE_CACHE_TTL_SECONDS: int = DEFAULT_RESPONSE_CACHE_TTL_SECONDS  # 缓存有效期（秒）
+    RESPONSE_CACHE_MAX_BYTES: int = DEFAULT_RESPONSE_CACHE_MAX_BYTES  # 内存层容量上限（字节），超出后按 LRU 淘汰
+    RESPONSE_CACHE_DETERMINISTIC_ONLY: bool = True  # 是否只缓存 temperature 为 0 的请求
+    RESPONSE_CACHE_DISK_PATH: str = ""  # 磁盘层 SQLite 文件路径，留空则只使用内存层
+    RESPONSE_CACHE_DISK_MAX_BYTES: int = DEFAULT_RESPONSE_CACHE_DISK_MAX_BYTES  # 磁盘层容量上限（字节）
+    RESPONSE_CACHE_REPLAY_CHUNK_SIZE: int = DEFAULT_RESPONSE_CACHE_REPLAY_CHUNK_SIZE  # 流式请求命中缓存时每块的字符数，0 表示每个 part 一块
+    RESPONSE_CACHE_REPLAY_DELAY_SECONDS: float = 0.0  # 流式回放时相邻两块的间隔（秒），0 表示立即发送
+
+    # 对冲请求配置
+    HEDGE_ENABLED: bool = False  # 非流式 generateContent 超过延迟阈值未返回时，是否用另一个 key 发起备份请求
+    HEDGE_DELAY_PERCENTILE: float = DEFAULT_HEDGE_DELAY_PERCENTILE  # 延迟阈值取该模型近期延迟的百分位
+    HEDGE_DEFAULT_DELAY_SECONDS: float = DEFAULT_HEDGE_DEFAULT_DELAY_SECONDS  # 延迟样本不足时的阈值（秒）
+    HEDGE_MIN_DELAY_SECONDS: float = DEFAULT_HEDGE_MIN_DELAY_SECONDS  # 延迟阈值下限（秒）
+    HEDGE_STREAM_ENABLED: bool = False  # 流式请求超过首字节阈值未收到第一个事件时，是否用另一个 key 再打开一个流
+    HEDGE_STREAM_TTFB_MS: int = DEFAULT_HEDGE_STREAM_TTFB_MS  # 流式请求的首字节对冲阈值（毫秒）
+    HEDGE_BUDGET_PERCENT: float = DEFAULT_HEDGE_BUDGET_PERCENT  # 对冲请求最多占总请求的百分比（流式与非流式共用）
+
+    # 流式续传与直通配置
+    STREAM_RESUME_ENABLED: bool = False  # 流式响应已输出部分文本后中断时，是否把已输出文本作为 model 轮次在新 key 上继续生成，而不是从头开始
+    STREAM_PASSTHROUGH_ENABLED: bool = False  # 原生 Gemini 流式请求不需要改写响应时，是否直接转发上游字节流，跳过逐块 JSON 解析与序列化
+
     # 智能路由配置
     URL_NORMALIZATION_ENABLED: bool = False  # 是否启用智能路由映射功能
 
@@ -105,6 +194,9 @@ class Settings(BaseSettings):
     STREAM_SHORT_TEXT_THRESHOLD: int = DEFAULT_STREAM_SHORT_TEXT_THRESHOLD
     STREAM_LONG_TEXT_THRESHOLD: int = DEFAULT_STREAM_LONG_TEXT_THRESHOLD
     STREAM_CHUNK_SIZE: int = DEFAULT_STREAM_CHUNK_SIZE
+    STREAM_BATCH_UNIT: str = DEFAULT_STREAM_BATCH_UNIT  # 文本切分单位: grapheme 按字素 / word 按词（中日韩字符每字一词）
+    STREAM_BATCH_SIZE: int = DEFAULT_STREAM_BATCH_SIZE  # 短文本每次输出的单位数
+    STREAM_PACING_TICK_MS: int = DEFAULT_STREAM_PACING_TICK_MS  # 所有流共享的输出节拍间隔（毫秒）
 
     # 假流式配置 (Fake Streaming Configuration)
     FAKE_STREAM_ENABLED: bool = False  # 是否启用假流式输出
@@ -124,6 +216,13 @@ class Settings(BaseSettings):
     AUTO_DELETE_ERROR_LOGS_DAYS: int = 7
     AUTO_DELETE_REQUEST_LOGS_ENABLED: bool = False
     AUTO_DELETE_REQUEST_LOGS_DAYS: int = 30
+    LOG_WRITE_BEHIND_ENABLED: bool = False  # 请求/错误日志先进入内存队列，由后台任务批量写入数据库
+    LOG_WRITE_BEHIND_QUEUE_SIZE: int = DEFAULT_LOG_WRITE_BEHIND_QUEUE_SIZE
+    LOG_WRITE_BEHIND_BATCH_SIZE: int = DEFAULT_LOG_WRITE_BEHIND_BATCH_SIZE
+    LOG_WRITE_BEHIND_FLUSH_INTERVAL_MS: int = DEFAULT_LOG_WRITE_BEHIND_FLUSH_INTERVAL_MS
+    LOG_WRITE_BEHIND_OVERFLOW_POLICY: str = DEFAULT_LOG_WRITE_BEHIND_OVERFLOW_POLICY  # 队列满时: drop_oldest 丢弃最早 / drop_newest 丢弃最新 / block 等待
+    STATS_ROLLUP_ENABLED: bool = False  # 写入请求日志时维护分钟/小时汇总表，统计页面从汇总表查询
+    LIVE_STATS_ENABLED: bool = False  # 最近 1 分钟/1 小时的调用统计使用进程内滑动窗口计数（仅适用于单 worker 部署）
     SAFETY_SETTINGS: List[Dict[str, str]] = DEFAULT_SAFETY_SETTINGS
 
     # Files API
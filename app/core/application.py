@@ -8,12 +8,19 @@ from fastapi.templating import Jinja2Templates
 from app.config.config import settings, sync_initial_settings
 from app.database.connection import connect_to_db, disconnect_from_db
 from app.database.initialization import initialize_database
+from app.database.services import start_log_queue, stop_log_queue
 from app.exception.exceptions import setup_exception_handlers
 from app.log.logger import get_application_logger, setup_access_logging
 from app.middleware.middleware import setup_middlewares
 from app.router.routes import setup_routers
 from app.scheduler.scheduled_tasks import start_scheduler, stop_scheduler
-from app.service.key.key_manager import get_key_manager_instance
+from app.service.chat.response_cache import close_response_cache
+from app.service.client.http_client_registry import close_http_clients
+from app.service.key.key_manager import (
+    close_key_state_backend,
+    get_key_manager_instance,
+    persist_key_health_snapshot,
+)
 from app.service.update.update_service import check_for_updates
 from app.utils.helpers import get_current_version
 
@@ -52,6 +59,54 @@ async def _shutdown_database():
     await disconnect_from_db()
 
 
+def _start_log_queue():
+    """Starts the write-behind request/error log queue when enabled."""
+    try:
+        start_log_queue()
+    except Exception as e:
+        logger.error(f"Failed to start write-behind log queue: {e}")
+
+
+async def _drain_log_queue():
+    """Flushes queued request/error logs before the database disconnects."""
+    try:
+        await stop_log_queue()
+    except Exception as e:
+        logger.error(f"Failed to drain write-behind log queue: {e}")
+
+
+async def _persist_key_health():
+    """Writes the final key health snapshot before the database disconnects."""
+    try:
+        await persist_key_health_snapshot()
+    except Exception as e:
+        logger.error(f"Failed to persist key health snapshot: {e}")
+
+
+async def _shutdown_key_state_backend():
+    """Closes the shared key state backend connection."""
+    try:
+        await close_key_state_backend()
+    except Exception as e:
+        logger.error(f"Failed to close key state backend: {e}")
+
+
+def _shutdown_response_cache():
+    """Closes the on-disk response cache tier."""
+    try:
+        close_response_cache()
+    except Exception as e:
+        logger.error(f"Failed to close response cache: {e}")
+
+
+async def _shutdown_http_clients():
+    """Closes pooled upstream HTTP clients."""
+    try:
+        await close_http_clients()
+    except Exception as e:
+        logger.error(f"Failed to close pooled HTTP clients: {e}")
+
+
 def _start_scheduler():
     """Starts the background scheduler."""
     try:
@@ -95,6 +150,7 @@ async def lifespan(app: FastAPI):
     logger.info("Application starting up...")
     try:
         await _setup_database_and_config(settings)
+        _start_log_queue()
         await _perform_update_check(app)
         _start_scheduler()
 
@@ -107,6 +163,11 @@ async def lifespan(app: FastAPI):
 
     logger.info("Application shutting down...")
     _stop_scheduler()
+    await _shutdown_http_clients()
+    _shutdown_response_cache()
+    await _drain_log_queue()
+    await _persist_key_health()
+    await _shutdown_key_state_backend()
     await _shutdown_database()
 
 
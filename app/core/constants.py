@@ -6,6 +6,45 @@
 API_VERSION = "v1beta"
 DEFAULT_TIMEOUT = 300  # 秒
 MAX_RETRIES = 3  # 最大重试次数
+DEFAULT_MODELS_TIMEOUT = 5  # 获取模型列表超时（秒）
+DEFAULT_FILES_TIMEOUT = 5  # Files API 请求超时（秒）
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"  # 客户端声明愿意等待时长的请求头
+CLIENT_CLOSED_REQUEST_STATUS = 499  # 客户端在响应完成前断开连接时记录的状态码
+DEFAULT_ADAPTIVE_TIMEOUT_PERCENTILE = 99.0
+DEFAULT_ADAPTIVE_TIMEOUT_MULTIPLIER = 3.0
+DEFAULT_ADAPTIVE_TIMEOUT_MIN_SECONDS = 30.0  # 秒
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20  # 按百分位计算自适应超时所需的最少样本数
+
+# HTTP 连接池相关常量
+DEFAULT_HTTP_POOL_MAX_CONNECTIONS = 100
+DEFAULT_HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_HTTP_POOL_KEEPALIVE_EXPIRY = 30.0  # 秒
+DEFAULT_UPSTREAM_HTTP2_MAX_CONNECTIONS_PER_HOST = 10
+
+# Key 冷却相关常量
+DEFAULT_KEY_COOLDOWN_BASE_SECONDS = 10.0  # 秒
+DEFAULT_KEY_COOLDOWN_MAX_SECONDS = 600.0  # 秒
+DEFAULT_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS = 30  # 秒
+MIN_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS = 5  # 秒
+MAX_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS = 300  # 秒
+DEFAULT_KEY_AFFINITY_PREFIX_CONTENTS = 2  # 参与亲和哈希的 contents 条数
+DEFAULT_KEY_AFFINITY_LOAD_FACTOR = 1.25  # 单个 key 的负载上限为平均负载的倍数
+KEY_AFFINITY_VIRTUAL_NODES = 100  # 一致性哈希环上每个 key 的虚拟节点数
+KEY_STATE_REDIS_TIMEOUT = 2  # Redis 共享状态后端连接和单条命令的超时时间（秒）
+
+# 响应缓存相关常量
+DEFAULT_RESPONSE_CACHE_TTL_SECONDS = 3600  # 秒
+DEFAULT_RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 内存层容量（字节）
+DEFAULT_RESPONSE_CACHE_DISK_MAX_BYTES = 1024 * 1024 * 1024  # 磁盘层容量（字节）
+DEFAULT_RESPONSE_CACHE_REPLAY_CHUNK_SIZE = 0  # 回放时每块的字符数，0 表示每个 part 一块
+
+# 对冲请求相关常量
+DEFAULT_HEDGE_DELAY_PERCENTILE = 95.0
+DEFAULT_HEDGE_DEFAULT_DELAY_SECONDS = 10.0  # 延迟样本不足时使用（秒）
+DEFAULT_HEDGE_MIN_DELAY_SECONDS = 1.0  # 秒
+DEFAULT_HEDGE_BUDGET_PERCENT = 5.0  # 对冲请求最多占总请求的百分比
+HEDGE_MIN_LATENCY_SAMPLES = 20  # 按百分位计算延迟阈值所需的最少样本数
+DEFAULT_HEDGE_STREAM_TTFB_MS = 3000  # 流式请求等待首个事件的对冲阈值（毫秒）
 
 # 模型相关常量
 SUPPORTED_ROLES = ["user", "model", "system"]
@@ -36,6 +75,22 @@ DEFAULT_STREAM_MAX_DELAY = 0.024
 DEFAULT_STREAM_SHORT_TEXT_THRESHOLD = 10
 DEFAULT_STREAM_LONG_TEXT_THRESHOLD = 50
 DEFAULT_STREAM_CHUNK_SIZE = 5
+DEFAULT_STREAM_BATCH_UNIT = "grapheme"  # 流式输出的文本切分单位: grapheme 字素 / word 词
+DEFAULT_STREAM_BATCH_SIZE = 1  # 短文本每次输出的单位数
+DEFAULT_STREAM_PACING_TICK_MS = 20  # 流式输出节拍间隔（毫秒）
+
+# 日志异步批量写入相关常量
+DEFAULT_LOG_WRITE_BEHIND_QUEUE_SIZE = 10000  # 队列最多容纳的日志行数
+DEFAULT_LOG_WRITE_BEHIND_BATCH_SIZE = 500  # 每次 INSERT 的最大行数
+DEFAULT_LOG_WRITE_BEHIND_FLUSH_INTERVAL_MS = 200  # 定时写入间隔（毫秒）
+DEFAULT_LOG_WRITE_BEHIND_OVERFLOW_POLICY = "drop_oldest"  # 队列满时的处理策略
+LOG_WRITE_BEHIND_SHUTDOWN_TIMEOUT = 10  # 关闭时写入剩余日志的最长时间（秒）
+LOG_WRITE_BEHIND_MAX_RETRIES = 3  # 同一批日志连续写入失败的次数上限，达到后逐行写入并丢弃失败的行
+LOG_WRITE_BEHIND_BLOCK_TIMEOUT = 5  # block 策略下等待队列腾出空间的最长时间（秒），超时后丢弃该行
+
+# 请求统计汇总相关常量
+STATS_ROLLUP_MINUTE_RETENTION_HOURS = 25  # 分钟汇总保留时长（小时），更早的合并为小时汇总，需覆盖 24 小时统计窗口
+STATS_ROLLUP_SINCE_CACHE_SECONDS = 60  # 统计服务缓存汇总统计开始时间的时长（秒）
 
 # 正则表达式模式
 IMAGE_URL_PATTERN = r"!\[(.*?)\]\((.*?)\)"
@@ -26,6 +26,27 @@ def create_tables():
         raise
 
 
+def create_indexes():
+    """
+    为已存在的表补建模型中声明的索引（create_all 只在建表时创建索引），已存在的索引跳过
+    """
+    try:
+        inspector = inspect(engine)
+        table_names = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in table_names or not table.indexes:
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                logger.info(f"Creating index {index.name} on {table.name}")
+                index.create(engine)
+    except Exception as e:
+        logger.error(f"Failed to create database indexes: {str(e)}")
+        raise
+
+
 def import_env_to_settings():
     """
     将.env文件中的配置项导入到t_settings表中
@@ -69,6 +90,9 @@ def initialize_database():
     try:
         # 创建表
         create_tables()
+
+        # 补建索引
+        create_indexes()
         
         # 导入环境变量
         import_env_to_settings()
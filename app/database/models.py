@@ -2,7 +2,7 @@
 数据库模型模块
 """
 import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Boolean, BigInteger, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Boolean, BigInteger, Enum, Index, UniqueConstraint
 import enum
 
 from app.database.connection import Base
@@ -30,6 +30,11 @@ class ErrorLog(Base):
     错误日志表
     """
     __tablename__ = "t_error_logs"
+    __table_args__ = (
+        Index("ix_error_logs_request_time", "request_time"),
+        Index("ix_error_logs_key_time", "gemini_key", "request_time"),
+        Index("ix_error_logs_code_time", "error_code", "request_time"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     gemini_key = Column(String(100), nullable=True, comment="Gemini API密钥")
@@ -50,6 +55,11 @@ class RequestLog(Base):
     """
 
     __tablename__ = "t_request_log"
+    __table_args__ = (
+        Index("ix_request_log_request_time", "request_time"),
+        Index("ix_request_log_key_time", "api_key", "request_time"),
+        Index("ix_request_log_model_time", "model_name", "request_time"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     request_time = Column(DateTime, default=datetime.datetime.now, comment="请求时间")
@@ -127,3 +137,80 @@ class FileRecord(Base):
         if expiration_time.tzinfo is None:
             expiration_time = expiration_time.replace(tzinfo=datetime.timezone.utc)
         return datetime.datetime.now(datetime.timezone.utc) > expiration_time
+
+
+class KeyHealth(Base):
+    """
+    API Key 健康状态快照表，用于重启后恢复失败计数和冷却状态
+    """
+    __tablename__ = "t_key_health"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    api_key = Column(String(100), nullable=False, unique=True, comment="API密钥")
+    key_type = Column(String(20), nullable=False, default="gemini", comment="密钥类型: gemini/vertex")
+    state = Column(String(20), nullable=False, comment="健康状态: healthy/cooling/dead")
+    failure_count = Column(Integer, nullable=False, default=0, comment="失败次数")
+    cooldown_until = Column(DateTime, nullable=True, comment="冷却结束时间")
+    cooldown_level = Column(Integer, nullable=False, default=0, comment="连续冷却次数")
+    last_error = Column(Text, nullable=True, comment="最近一次错误")
+    updated_at = Column(DateTime, default=datetime.datetime.now, comment="更新时间")
+
+    def __repr__(self):
+        return f"<KeyHealth(key='{self.api_key[:4]}...', state='{self.state}', failures='{self.failure_count}')>"
+
+
+class SharedState(Base):
+    """
+    多 worker 共享状态表（轮询位置、key 冷却状态、上传会话等），field 为空表示普通键值
+    """
+    __tablename__ = "t_shared_state"
+    __table_args__ = (UniqueConstraint("name", "field", name="uq_shared_state_name_field"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(191), nullable=False, comment="键名")
+    field = Column(String(191), nullable=False, default="", comment="哈希字段名")
+    value = Column(Text, nullable=True, comment="值")
+    expires_at = Column(DateTime, nullable=True, comment="过期时间")
+
+    def __repr__(self):
+        return f"<SharedState(name='{self.name}', field='{self.field}')>"
+
+
+class RequestStatsMixin:
+    """
+    请求统计汇总表的公共字段，api_key/model_name 为空时存空字符串以便唯一约束生效
+    """
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, nullable=False, comment="时间桶起始时间")
+    api_key = Column(String(100), nullable=False, default="", comment="使用的API密钥")
+    model_name = Column(String(100), nullable=False, default="", comment="模型名称")
+    success_count = Column(Integer, nullable=False, default=0, comment="成功次数")
+    failure_count = Column(Integer, nullable=False, default=0, comment="失败次数")
+    latency_sum_ms = Column(BigInteger, nullable=False, default=0, comment="请求耗时总和(毫秒)")
+    latency_under_1s = Column(Integer, nullable=False, default=0, comment="耗时小于1秒的请求数")
+    latency_under_5s = Column(Integer, nullable=False, default=0, comment="耗时1~5秒的请求数")
+    latency_under_30s = Column(Integer, nullable=False, default=0, comment="耗时5~30秒的请求数")
+    latency_over_30s = Column(Integer, nullable=False, default=0, comment="耗时30秒以上的请求数")
+
+    def __repr__(self):
+        return f"<{type(self).__name__}(bucket='{self.bucket_start}', model='{self.model_name}', success='{self.success_count}', failure='{self.failure_count}')>"
+
+
+class RequestStatsMinute(RequestStatsMixin, Base):
+    """
+    请求统计分钟汇总表，写入请求日志时增量维护
+    """
+    __tablename__ = "t_request_stats_minute"
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "api_key", "model_name", name="uq_request_stats_minute_bucket"),
+    )
+
+
+class RequestStatsHour(RequestStatsMixin, Base):
+    """
+    请求统计小时汇总表，由定时任务将较早的分钟汇总合并而来
+    """
+    __tablename__ = "t_request_stats_hour"
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "api_key", "model_name", name="uq_request_stats_hour_bucket"),
+    )
@@ -0,0 +1,88 @@
+"""
+请求日志的时间桶汇总
+
+每行请求日志按 (时间桶, api_key, 模型) 归入一个汇总行，记录成功/失败次数、延迟总和与延迟分布。
+成功与否按状态码判断（2xx 为成功），与统计页面按原始日志统计的口径一致。
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# 延迟分布的上界（毫秒），最后一列统计超过最大上界的请求
+LATENCY_BUCKET_BOUNDS_MS = (1000, 5000, 30000)
+LATENCY_BUCKET_COLUMNS = (
+    "latency_under_1s",
+    "latency_under_5s",
+    "latency_under_30s",
+    "latency_over_30s",
+)
+COUNTER_COLUMNS = ("success_count", "failure_count", "latency_sum_ms") + LATENCY_BUCKET_COLUMNS
+
+RollupKey = Tuple[datetime, str, str]
+
+
+def floor_time(value: datetime, granularity: str) -> datetime:
+    """将时间向下取整到分钟（minute）或小时（hour）"""
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+
+def is_success_status(status_code: Optional[int]) -> bool:
+    return status_code is not None and 200 <= status_code < 300
+
+
+def empty_counters() -> Dict[str, int]:
+    return dict.fromkeys(COUNTER_COLUMNS, 0)
+
+
+def add_counters(target: Dict[str, int], source: Dict[str, Any]):
+    """将 source 中的计数累加到 target"""
+    for column in COUNTER_COLUMNS:
+        target[column] += source.get(column) or 0
+
+
+def _latency_column(latency_ms: int) -> str:
+    for bound, column in zip(LATENCY_BUCKET_BOUNDS_MS, LATENCY_BUCKET_COLUMNS):
+        if latency_ms < bound:
+            return column
+    return LATENCY_BUCKET_COLUMNS[-1]
+
+
+def aggregate_request_rows(
+    rows: Iterable[Dict[str, Any]], granularity: str = "minute"
+) -> Dict[RollupKey, Dict[str, int]]:
+    """将请求日志行按时间桶、key 和模型汇总"""
+    groups: Dict[RollupKey, Dict[str, int]] = {}
+    for row in rows:
+        key = (
+            floor_time(row["request_time"], granularity),
+            row.get("api_key") or "",
+            row.get("model_name") or "",
+        )
+        counters = groups.get(key)
+        if counters is None:
+            counters = groups[key] = empty_counters()
+        if is_success_status(row.get("status_code")):
+            counters["success_count"] += 1
+        else:
+            counters["failure_count"] += 1
+        latency_ms = row.get("latency_ms")
+        if latency_ms is not None:
+            counters["latency_sum_ms"] += latency_ms
+            counters[_latency_column(latency_ms)] += 1
+    return groups
+
+
+def rebucket_rollups(
+    rows: Iterable[Dict[str, Any]], granularity: str = "hour"
+) -> Dict[RollupKey, Dict[str, int]]:
+    """将较细粒度的汇总行合并到更粗的时间桶"""
+    groups: Dict[RollupKey, Dict[str, int]] = {}
+    for row in rows:
+        key = (floor_time(row["bucket_start"], granularity), row["api_key"], row["model_name"])
+        counters = groups.get(key)
+        if counters is None:
+            counters = groups[key] = empty_counters()
+        add_counters(counters, row)
+    return groups
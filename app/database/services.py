@@ -3,11 +3,36 @@
 """
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, timezone
-from sqlalchemy import func, desc, asc, select, insert, update, delete
+from sqlalchemy import and_, func, desc, asc, select, insert, update, delete
 import json
+from app.config.config import settings
+from app.core.constants import (
+    DEFAULT_LOG_WRITE_BEHIND_OVERFLOW_POLICY,
+    LOG_WRITE_BEHIND_BLOCK_TIMEOUT,
+    LOG_WRITE_BEHIND_MAX_RETRIES,
+    LOG_WRITE_BEHIND_SHUTDOWN_TIMEOUT,
+)
 from app.database.connection import database
-from app.database.models import Settings, ErrorLog, RequestLog, FileRecord, FileState
+from app.database.models import (
+    Settings,
+    ErrorLog,
+    RequestLog,
+    FileRecord,
+    FileState,
+    KeyHealth,
+    RequestStatsHour,
+    RequestStatsMinute,
+    SharedState,
+)
+from app.database.rollup import (
+    RollupKey,
+    aggregate_request_rows,
+    is_success_status,
+    rebucket_rollups,
+)
+from app.database.write_behind import OVERFLOW_POLICIES, WriteBehindQueue
 from app.log.logger import get_database_logger
+from app.service.stats.sliding_window import get_live_call_stats
 from app.utils.helpers import redact_key_for_logging
 
 logger = get_database_logger()
@@ -130,19 +155,21 @@ async def add_error_log(
         else:
             request_msg_json = None
         
-        # 插入错误日志
-        query = (
-            insert(ErrorLog)
-            .values(
-                gemini_key=gemini_key,
-                error_type=error_type,
-                error_log=error_log,
-                model_name=model_name,
-                error_code=error_code,
-                request_msg=request_msg_json,
-                request_time=datetime.now()
-            )
+        row = dict(
+            gemini_key=gemini_key,
+            error_type=error_type,
+            error_log=error_log,
+            model_name=model_name,
+            error_code=error_code,
+            request_msg=request_msg_json,
+            request_time=datetime.now()
         )
+        queue = get_log_queue()
+        if queue is not None:
+            return await queue.put("error", row)
+
+        # 插入错误日志
+        query = insert(ErrorLog).values(**row)
         await database.execute(query)
         logger.info(f"Added error log for key: {redact_key_for_logging(gemini_key)}")
         return True
@@ -412,10 +439,12 @@ async def add_request_log(
     Returns:
         bool: 是否添加成功
     """
+    if settings.LIVE_STATS_ENABLED:
+        get_live_call_stats().record(api_key, model_name, is_success_status(status_code))
     try:
         log_time = request_time if request_time else datetime.now()
 
-        query = insert(RequestLog).values(
+        row = dict(
             request_time=log_time,
             model_name=model_name,
             api_key=api_key,
@@ -423,13 +452,227 @@ async def add_request_log(
             status_code=status_code,
             latency_ms=latency_ms
         )
+        queue = get_log_queue()
+        if queue is not None:
+            return await queue.put("request", row)
+
+        query = insert(RequestLog).values(**row)
         await database.execute(query)
+        await record_request_stats([row])
         return True
     except Exception as e:
         logger.error(f"Failed to add request log: {str(e)}")
         return False
 
 
+# ==================== 请求统计汇总相关函数 ====================
+
+async def _increment_request_stats(table, groups: Dict[RollupKey, Dict[str, int]]) -> None:
+    """将汇总计数累加到汇总表，汇总行不存在时先插入"""
+    async with database.transaction():
+        for (bucket_start, api_key, model_name), counters in groups.items():
+            match = and_(
+                table.bucket_start == bucket_start,
+                table.api_key == api_key,
+                table.model_name == model_name,
+            )
+            existing = await database.fetch_one(select(table.id).where(match))
+            if existing is None:
+                try:
+                    await database.execute(
+                        insert(table).values(
+                            bucket_start=bucket_start,
+                            api_key=api_key,
+                            model_name=model_name,
+                            **counters,
+                        )
+                    )
+                    continue
+                except Exception:
+                    # 其他请求或 worker 同时插入了同一个时间桶，违反唯一约束，改为累加
+                    pass
+            await database.execute(
+                update(table)
+                .where(match)
+                .values({column: getattr(table, column) + value for column, value in counters.items() if value})
+            )
+
+
+# 汇总统计开始时间记录在共享状态表中，之后的请求都已计入汇总表
+_REQUEST_STATS_SINCE_STATE = "request_stats_since"
+# 当前进程是否已确认开始时间记录存在（True）或已清除（False），None 表示尚未确认
+_request_stats_since_marked: Optional[bool] = None
+
+
+async def _mark_request_stats_since(since: datetime) -> None:
+    """首次写入汇总时记录开始时间，已有记录时保留最早的记录"""
+    global _request_stats_since_marked
+    if _request_stats_since_marked:
+        return
+    match = and_(
+        SharedState.name == _REQUEST_STATS_SINCE_STATE, SharedState.field == ""
+    )
+    existing = await database.fetch_one(select(SharedState.id).where(match))
+    if existing is None:
+        try:
+            await database.execute(
+                insert(SharedState).values(
+                    name=_REQUEST_STATS_SINCE_STATE, field="", value=since.isoformat()
+                )
+            )
+        except Exception:
+            # 其他 worker 同时写入了开始时间，违反唯一约束
+            pass
+    _request_stats_since_marked = True
+
+
+async def _clear_request_stats_since() -> None:
+    """汇总统计关闭后清除开始时间，重新开启时汇总表中缺少关闭期间的请求"""
+    global _request_stats_since_marked
+    if _request_stats_since_marked is False:
+        return
+    try:
+        await database.execute(
+            delete(SharedState).where(SharedState.name == _REQUEST_STATS_SINCE_STATE)
+        )
+        _request_stats_since_marked = False
+    except Exception as e:
+        logger.error(f"Failed to clear request stats rollup start time: {str(e)}")
+
+
+async def get_request_stats_since() -> Optional[datetime]:
+    """
+    获取汇总统计的开始时间
+
+    Returns:
+        Optional[datetime]: 此后的请求都已计入汇总表，未开始汇总时返回 None
+    """
+    row = await database.fetch_one(
+        select(SharedState.value).where(
+            and_(SharedState.name == _REQUEST_STATS_SINCE_STATE, SharedState.field == "")
+        )
+    )
+    return datetime.fromisoformat(row["value"]) if row else None
+
+
+async def record_request_stats(rows: List[Dict[str, Any]]) -> None:
+    """
+    将请求日志累加到分钟汇总表，未启用汇总统计时直接返回
+
+    Args:
+        rows: 请求日志行，包含 request_time、api_key、model_name、status_code、latency_ms
+    """
+    if not settings.STATS_ROLLUP_ENABLED:
+        await _clear_request_stats_since()
+        return
+    if not rows:
+        return
+    try:
+        await _increment_request_stats(RequestStatsMinute, aggregate_request_rows(rows, "minute"))
+        await _mark_request_stats_since(min(row["request_time"] for row in rows))
+    except Exception as e:
+        # 请求日志已经写入，汇总失败不影响日志写入结果
+        logger.error(f"Failed to update request stats rollups: {str(e)}")
+
+
+async def compact_request_stats(before: datetime) -> int:
+    """
+    将 before 之前的分钟汇总合并到小时汇总表，并删除已合并的分钟汇总
+
+    Args:
+        before: 合并截止时间，应为整点
+
+    Returns:
+        int: 合并的分钟汇总行数
+    """
+    async with database.transaction():
+        rows = await database.fetch_all(
+            select(RequestStatsMinute).where(RequestStatsMinute.bucket_start < before)
+        )
+        if not rows:
+            return 0
+        await _increment_request_stats(
+            RequestStatsHour, rebucket_rollups([dict(row) for row in rows], "hour")
+        )
+        await database.execute(
+            delete(RequestStatsMinute).where(RequestStatsMinute.bucket_start < before)
+        )
+    return len(rows)
+
+
+# ==================== 日志异步批量写入 ====================
+
+_LOG_TABLES = {"request": RequestLog, "error": ErrorLog}
+_log_queue: Optional[WriteBehindQueue] = None
+
+
+async def _write_log_batch(table: str, rows: List[Dict[str, Any]]) -> None:
+    """以一条多行 INSERT 写入同一张日志表"""
+    await database.execute(insert(_LOG_TABLES[table]).values(rows))
+    if table == "request":
+        await record_request_stats(rows)
+
+
+def get_log_queue() -> Optional[WriteBehindQueue]:
+    """
+    获取日志写入队列
+
+    Returns:
+        Optional[WriteBehindQueue]: 未启用异步批量写入或队列已停止时返回 None，日志直接写入数据库
+    """
+    if _log_queue is not None and _log_queue.running:
+        return _log_queue
+    return None
+
+
+def start_log_queue() -> None:
+    """按配置创建日志写入队列并启动后台写入任务"""
+    global _log_queue
+    if not settings.LOG_WRITE_BEHIND_ENABLED or _log_queue is not None:
+        return
+    policy = settings.LOG_WRITE_BEHIND_OVERFLOW_POLICY.lower()
+    if policy not in OVERFLOW_POLICIES:
+        logger.warning(
+            f"Unknown LOG_WRITE_BEHIND_OVERFLOW_POLICY '{settings.LOG_WRITE_BEHIND_OVERFLOW_POLICY}', "
+            f"falling back to {DEFAULT_LOG_WRITE_BEHIND_OVERFLOW_POLICY}."
+        )
+        policy = DEFAULT_LOG_WRITE_BEHIND_OVERFLOW_POLICY
+    _log_queue = WriteBehindQueue(
+        _write_log_batch,
+        max_size=settings.LOG_WRITE_BEHIND_QUEUE_SIZE,
+        batch_size=settings.LOG_WRITE_BEHIND_BATCH_SIZE,
+        flush_interval=max(1, settings.LOG_WRITE_BEHIND_FLUSH_INTERVAL_MS) / 1000,
+        overflow_policy=policy,
+        logger=logger,
+        max_retries=LOG_WRITE_BEHIND_MAX_RETRIES,
+        block_timeout=LOG_WRITE_BEHIND_BLOCK_TIMEOUT,
+    )
+    _log_queue.start()
+    logger.info(f"Started write-behind log queue with overflow policy {policy}")
+
+
+async def stop_log_queue() -> None:
+    """停止日志写入队列并写入剩余日志，之后的日志直接写入数据库"""
+    global _log_queue
+    if _log_queue is None:
+        return
+    queue, _log_queue = _log_queue, None
+    await queue.stop(LOG_WRITE_BEHIND_SHUTDOWN_TIMEOUT)
+    logger.info(f"Write-behind log queue drained: {queue.metrics()}")
+
+
+def get_log_queue_metrics() -> Dict[str, Any]:
+    """
+    获取日志写入队列的运行指标
+
+    Returns:
+        Dict[str, Any]: 队列深度、已写入行数、丢弃行数、写入失败次数等
+    """
+    if _log_queue is None:
+        return {"enabled": settings.LOG_WRITE_BEHIND_ENABLED, "running": False}
+    return {"enabled": True, **_log_queue.metrics()}
+
+
 # ==================== 文件记录相关函数 ====================
 
 async def create_file_record(
@@ -689,3 +932,48 @@ async def get_file_api_key(name: str) -> Optional[str]:
     except Exception as e:
         logger.error(f"Failed to get file API key: {str(e)}")
         raise
+
+
+# ==================== Key 健康状态相关函数 ====================
+
+async def get_key_health_snapshot() -> List[Dict[str, Any]]:
+    """
+    获取已保存的 key 健康状态快照
+
+    Returns:
+        List[Dict[str, Any]]: 快照记录列表
+    """
+    try:
+        query = select(KeyHealth)
+        result = await database.fetch_all(query)
+        return [dict(row) for row in result]
+    except Exception as e:
+        logger.error(f"Failed to get key health snapshot: {str(e)}")
+        raise
+
+
+async def save_key_health_snapshot(records: List[Dict[str, Any]]) -> bool:
+    """
+    用新的快照整体替换已保存的 key 健康状态
+
+    Args:
+        records: 快照记录列表，每条记录包含 api_key、key_type、state、failure_count、
+            cooldown_until、cooldown_level、last_error
+
+    Returns:
+        bool: 是否保存成功
+    """
+    try:
+        now = datetime.now()
+        async with database.transaction():
+            await database.execute(delete(KeyHealth))
+            if records:
+                await database.execute(
+                    insert(KeyHealth).values(
+                        [{**record, "updated_at": now} for record in records]
+                    )
+                )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to save key health snapshot: {str(e)}")
+        return False
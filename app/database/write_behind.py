@@ -0,0 +1,211 @@
+"""
+请求日志与错误日志的异步批量写入
+
+请求路径上只把日志行放入有界内存队列，后台任务每隔 flush_interval 秒或积累到 batch_size 行时
+按表合并为多行 INSERT 写入数据库。数据库短暂不可用时，写入失败的行放回队首等待下次重试；
+同一批连续失败 max_retries 次后逐行写入，仍然失败的行丢弃并计数，避免一行坏数据或数据库长时间不可用时队列停滞。
+
+队列满时的处理策略：
+- drop_oldest：丢弃最早的一行，保留最新的日志（默认）
+- drop_newest：丢弃新写入的一行
+- block：等待后台任务腾出空间（反压），最多等待 block_timeout 秒，超时或队列停止后丢弃新写入的一行
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class WriteBehindQueue:
+    """有界的日志写入队列，由一个后台任务批量写入"""
+
+    def __init__(
+        self,
+        write_batch: Callable[[str, List[Dict[str, Any]]], Awaitable[None]],
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        overflow_policy: str = "drop_oldest",
+        logger=None,
+        max_retries: int = 3,
+        block_timeout: float = 5.0,
+    ):
+        """
+        参数:
+            write_batch: 写入函数，接收表名和同一张表的多行数据
+            max_size: 队列最多容纳的行数
+            batch_size: 每次 INSERT 的最大行数，队列积累到该行数时立即写入
+            flush_interval: 定时写入间隔（秒）
+            overflow_policy: 队列满时的处理策略
+            logger: 日志记录器
+            max_retries: 同一批连续写入失败的次数上限，达到后逐行写入
+            block_timeout: block 策略下等待队列腾出空间的最长时间（秒）
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self._write_batch = write_batch
+        self.max_size = max(1, max_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.logger = logger
+        self.max_retries = max(1, max_retries)
+        self.block_timeout = block_timeout
+        self._rows: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        # 队首这一批连续写入失败的次数
+        self._batch_failures = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.failed_rows = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._rows)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列深度、丢弃行数等运行指标"""
+        return {
+            "running": self.running,
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "overflow_policy": self.overflow_policy,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "failed_rows": self.failed_rows,
+        }
+
+    async def put(self, table: str, row: Dict[str, Any]) -> bool:
+        """放入一行日志，被丢弃时返回 False"""
+        if len(self._rows) >= self.max_size:
+            if self.overflow_policy == "block":
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.block_timeout
+                while len(self._rows) >= self.max_size and self.running:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    self._space.clear()
+                    try:
+                        await asyncio.wait_for(self._space.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if len(self._rows) >= self.max_size:
+                    self.dropped += 1
+                    return False
+            elif self.overflow_policy == "drop_newest":
+                self.dropped += 1
+                return False
+            else:
+                self._rows.popleft()
+                self.dropped += 1
+        self._rows.append((table, row))
+        if len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """停止后台任务并写入队列中剩余的日志，超时或写入失败的行计为丢弃"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._space.set()
+        await self._task
+        self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._rows:
+            if self.logger:
+                self.logger.warning(
+                    f"Dropped {len(self._rows)} queued log rows on shutdown"
+                )
+            self.dropped += len(self._rows)
+            self._rows.clear()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """写入队列中当前所有的行，写入失败时剩余的行放回队首并返回 False
+
+        同一批连续失败 max_retries 次后改为逐行写入，写入失败的行丢弃并计入 failed_rows。
+        """
+        while self._rows:
+            count = min(self.batch_size, len(self._rows))
+            batch = [self._rows.popleft() for _ in range(count)]
+            grouped: Dict[str, List[Dict[str, Any]]] = {}
+            for table, row in batch:
+                grouped.setdefault(table, []).append(row)
+            written_tables = set()
+            try:
+                for table, rows in grouped.items():
+                    await self._write_batch(table, rows)
+                    written_tables.add(table)
+                    self.written += len(rows)
+                self._batch_failures = 0
+            except Exception as e:
+                self.failed_flushes += 1
+                self._batch_failures += 1
+                remaining = [item for item in batch if item[0] not in written_tables]
+                if self._batch_failures < self.max_retries:
+                    if self.logger:
+                        self.logger.error(f"Failed to write {len(batch)} queued log rows: {e}")
+                    self._requeue(remaining)
+                    return False
+                if self.logger:
+                    self.logger.error(
+                        f"Failed to write {len(batch)} queued log rows {self._batch_failures} times, "
+                        f"writing them one by one: {e}"
+                    )
+                self._batch_failures = 0
+                await self._write_rows(remaining)
+            finally:
+                self._space.set()
+        return True
+
+    async def _write_rows(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """逐行写入，写入失败的行丢弃并计数"""
+        failed = 0
+        for table, row in items:
+            try:
+                await self._write_batch(table, [row])
+                self.written += 1
+            except Exception:
+                failed += 1
+        if failed:
+            self.failed_rows += failed
+            if self.logger:
+                self.logger.error(f"Dropped {failed} log rows that could not be written")
+
+    def _requeue(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """写入失败的行放回队首，超出容量时丢弃最早的行"""
+        self._rows.extendleft(reversed(items))
+        while len(self._rows) > self.max_size:
+            self._rows.popleft()
+            self.dropped += 1
@@ -2,6 +2,8 @@ from contextlib import asynccontextmanager
 from fastapi import HTTPException
 import logging
 
+from app.service.client.deadline import DeadlineExceeded
+
 @asynccontextmanager
 async def handle_route_errors(logger: logging.Logger, operation_name: str, success_message: str = None, failure_message: str = None):
     """
@@ -24,6 +26,11 @@ async def handle_route_errors(logger: logging.Logger, operation_name: str, succe
         # 如果已经是 HTTPException，直接重新抛出，保留原始状态码和详情
         logger.error(f"{failure_message or default_failure_msg}: {http_exc.detail} (Status: {http_exc.status_code})")
         raise http_exc
+    except DeadlineExceeded as e:
+        logger.error(f"{failure_message or default_failure_msg}: {str(e)}")
+        raise HTTPException(
+            status_code=504, detail=f"Request deadline exceeded during {operation_name}"
+        ) from e
     except Exception as e:
         # 对于其他所有异常，记录错误并抛出标准的 500 错误
         logger.error(f"{failure_message or default_failure_msg}: {str(e)}")
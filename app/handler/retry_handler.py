@@ -1,9 +1,12 @@
 
 from functools import wraps
-from typing import Callable, TypeVar
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException
 
 from app.config.config import settings
 from app.log.logger import get_retry_logger
+from app.service.client.deadline import deadline_expired, get_request_deadline
 from app.utils.helpers import redact_key_for_logging
 
 T = TypeVar("T")
@@ -16,10 +19,30 @@ class RetryHandler:
     def __init__(self, key_arg: str = "api_key"):
         self.key_arg = key_arg
 
+    @staticmethod
+    def _get_model(kwargs: dict) -> Optional[str]:
+        """从路由参数中获取目标模型，用于按模型余量切换 key"""
+        if kwargs.get("model_name"):
+            return kwargs["model_name"]
+        request = kwargs.get("request")
+        return getattr(request, "model", None)
+
+    @staticmethod
+    def _describe_error(error: Exception) -> str:
+        """还原被路由包装前的原始错误信息，用于判断失败类别"""
+        cause = error.__cause__ or error
+        if isinstance(cause, HTTPException):
+            return f"status code {cause.status_code}, {cause.detail}"
+        return str(cause)
+
     def __call__(self, func: Callable[..., T]) -> Callable[..., T]:
         @wraps(func)
         async def wrapper(*args, **kwargs) -> T:
             last_exception = None
+            deadline = get_request_deadline()
+            model = self._get_model(kwargs)
+            if deadline is not None and model:
+                deadline.tighten(settings.MODEL_REQUEST_DEADLINES.get(model))
 
             for attempt in range(settings.MAX_RETRIES):
                 retries = attempt + 1
@@ -31,11 +54,20 @@ class RetryHandler:
                         f"API call failed with error: {str(e)}. Attempt {retries} of {settings.MAX_RETRIES}"
                     )
 
+                    if deadline_expired():
+                        logger.error("Request deadline exceeded, no more retries.")
+                        break
+
                     # 从函数参数中获取 key_manager
                     key_manager = kwargs.get("key_manager")
                     if key_manager:
                         old_key = kwargs.get(self.key_arg)
-                        new_key = await key_manager.handle_api_failure(old_key, retries)
+                        new_key = await key_manager.handle_api_failure(
+                            old_key,
+                            retries,
+                            model,
+                            self._describe_error(e),
+                        )
                         if new_key:
                             kwargs[self.key_arg] = new_key
                             logger.info(f"Switched to new API key: {redact_key_for_logging(new_key)}")
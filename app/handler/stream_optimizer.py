@@ -1,16 +1,20 @@
 
-import asyncio
 import math
-from typing import Any, AsyncGenerator, Callable, List
+from typing import Any, AsyncGenerator, Callable, Optional
 
 from app.config.config import settings
 from app.core.constants import (
+    DEFAULT_STREAM_BATCH_SIZE,
+    DEFAULT_STREAM_BATCH_UNIT,
     DEFAULT_STREAM_CHUNK_SIZE,
     DEFAULT_STREAM_LONG_TEXT_THRESHOLD,
     DEFAULT_STREAM_MAX_DELAY,
     DEFAULT_STREAM_MIN_DELAY,
+    DEFAULT_STREAM_PACING_TICK_MS,
     DEFAULT_STREAM_SHORT_TEXT_THRESHOLD,
 )
+from app.handler.stream_pacing import StreamPacer, get_pacing_ticker, pace_units
+from app.handler.stream_render import build_chunk_renderer, split_text_units
 from app.log.logger import get_gemini_logger, get_openai_logger
 
 logger_openai = get_openai_logger()
@@ -21,6 +25,8 @@ class StreamOptimizer:
     """流式输出优化器
 
     提供流式输出优化功能，包括智能延迟调整和长文本分块输出。
+    响应块模板只序列化一次，每段文本直接拼接到模板中输出。
+    输出节奏由事件循环共享的节拍器驱动，每个节拍把额度内的文本合并为一个响应块。
     """
 
     def __init__(
@@ -31,6 +37,9 @@ class StreamOptimizer:
         short_text_threshold: int = DEFAULT_STREAM_SHORT_TEXT_THRESHOLD,
         long_text_threshold: int = DEFAULT_STREAM_LONG_TEXT_THRESHOLD,
         chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+        batch_unit: str = DEFAULT_STREAM_BATCH_UNIT,
+        batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+        pacing_tick_ms: int = DEFAULT_STREAM_PACING_TICK_MS,
     ):
         """初始化流式输出优化器
 
@@ -40,7 +49,10 @@ class StreamOptimizer:
             max_delay: 最大延迟时间（秒）
             short_text_threshold: 短文本阈值（字符数）
             long_text_threshold: 长文本阈值（字符数）
-            chunk_size: 长文本分块大小（字符数）
+            chunk_size: 长文本分块大小（单位数）
+            batch_unit: 文本切分单位，grapheme 按字素，word 按词
+            batch_size: 短文本每次输出的单位数
+            pacing_tick_ms: 节拍间隔（毫秒）
         """
         self.logger = logger
         self.min_delay = min_delay
@@ -48,6 +60,9 @@ class StreamOptimizer:
         self.short_text_threshold = short_text_threshold
         self.long_text_threshold = long_text_threshold
         self.chunk_size = chunk_size
+        self.batch_unit = batch_unit
+        self.batch_size = batch_size
+        self.tick_interval = max(1, pacing_tick_ms) / 1000
 
     def calculate_delay(self, text_length: int) -> float:
         """根据文本长度计算延迟时间
@@ -72,24 +87,17 @@ class StreamOptimizer:
             )
             return self.max_delay - ratio * (self.max_delay - self.min_delay)
 
-    def split_text_into_chunks(self, text: str) -> List[str]:
-        """将文本分割成小块
-
-        参数:
-            text: 要分割的文本
-
-        返回:
-            文本块列表
-        """
-        return [
-            text[i : i + self.chunk_size] for i in range(0, len(text), self.chunk_size)
-        ]
+    def create_pacer(self) -> StreamPacer:
+        """为一个流创建速率状态，同一个流的每段文本共用"""
+        return StreamPacer()
 
     async def optimize_stream_output(
         self,
         text: str,
         create_response_chunk: Callable[[str], Any],
         format_chunk: Callable[[Any], str],
+        pacer: Optional[StreamPacer] = None,
+        final: bool = False,
     ) -> AsyncGenerator[str, None]:
         """优化流式输出
 
@@ -97,6 +105,8 @@ class StreamOptimizer:
             text: 要输出的文本
             create_response_chunk: 创建响应块的函数，接收文本，返回响应块
             format_chunk: 格式化响应块的函数，接收响应块，返回格式化后的字符串
+            pacer: 流的速率状态，上游到达快于输出时提高速率
+            final: 是否为流的最后一段文本，是则立即整体输出
 
         返回:
             异步生成器，生成格式化后的响应块
@@ -104,23 +114,28 @@ class StreamOptimizer:
         if not text:
             return
 
-        # 计算智能延迟时间
+        # 响应块模板只构造和序列化一次
+        render_chunk = build_chunk_renderer(create_response_chunk, format_chunk)
+
         delay = self.calculate_delay(len(text))
+        if final or delay <= 0:
+            # 流已结束或未配置延迟，剩余文本不再等待
+            yield render_chunk(text)
+            return
 
-        # 根据文本长度决定输出方式
-        if len(text) >= self.long_text_threshold:
-            # 长文本：分块输出
-            chunks = self.split_text_into_chunks(text)
-            for chunk_text in chunks:
-                chunk_response = create_response_chunk(chunk_text)
-                yield format_chunk(chunk_response)
-                await asyncio.sleep(delay)
-        else:
-            # 短文本：逐字符输出
-            for char in text:
-                char_chunk = create_response_chunk(char)
-                yield format_chunk(char_chunk)
-                await asyncio.sleep(delay)
+        # 长文本按 chunk_size、短文本按 batch_size 个单位为一步，每步间隔为智能延迟
+        step = self.chunk_size if len(text) >= self.long_text_threshold else self.batch_size
+        rate = max(1, step) / delay
+        if pacer is not None:
+            rate *= pacer.on_arrival(self.tick_interval)
+
+        units = split_text_units(text, self.batch_unit)
+        ticker = get_pacing_ticker(self.tick_interval)
+        async for chunk_text in pace_units(units, rate, ticker, step):
+            yield render_chunk(chunk_text)
+
+        if pacer is not None:
+            pacer.on_output_done()
 
 
 # 创建默认的优化器实例，可以直接导入使用
@@ -131,6 +146,9 @@ openai_optimizer = StreamOptimizer(
     short_text_threshold=settings.STREAM_SHORT_TEXT_THRESHOLD,
     long_text_threshold=settings.STREAM_LONG_TEXT_THRESHOLD,
     chunk_size=settings.STREAM_CHUNK_SIZE,
+    batch_unit=settings.STREAM_BATCH_UNIT,
+    batch_size=settings.STREAM_BATCH_SIZE,
+    pacing_tick_ms=settings.STREAM_PACING_TICK_MS,
 )
 
 gemini_optimizer = StreamOptimizer(
@@ -140,4 +158,7 @@ gemini_optimizer = StreamOptimizer(
     short_text_threshold=settings.STREAM_SHORT_TEXT_THRESHOLD,
     long_text_threshold=settings.STREAM_LONG_TEXT_THRESHOLD,
     chunk_size=settings.STREAM_CHUNK_SIZE,
+    batch_unit=settings.STREAM_BATCH_UNIT,
+    batch_size=settings.STREAM_BATCH_SIZE,
+    pacing_tick_ms=settings.STREAM_PACING_TICK_MS,
 )
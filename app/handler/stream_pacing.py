@@ -0,0 +1,120 @@
+"""
+流式输出节奏控制
+
+每个事件循环只有一个节拍器，所有正在平滑输出的流都在同一个节拍上被唤醒，
+而不是每输出一个字符就各自 asyncio.sleep 一次。每个流按目标速率累积输出额度，
+每个节拍把额度内的文本合并成一个事件输出；上游到达比输出快时提高速率，流结束时立即输出剩余文本。
+"""
+
+import asyncio
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class PacingTicker:
+    """事件循环内共享的节拍器，只在有流等待时运行"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._tick: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self._waiters = 0
+
+    async def wait(self):
+        """等待下一个节拍"""
+        loop = asyncio.get_running_loop()
+        if self._tick is None:
+            self._tick = loop.create_future()
+        tick = self._tick
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        self._waiters += 1
+        try:
+            # 单个等待者被取消时不能取消共享的节拍
+            await asyncio.shield(tick)
+        finally:
+            self._waiters -= 1
+
+    async def _run(self):
+        while self._waiters or self._tick is not None:
+            await asyncio.sleep(self.interval)
+            tick, self._tick = self._tick, None
+            if tick is not None and not tick.done():
+                tick.set_result(None)
+
+
+_tickers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[float, PacingTicker]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_pacing_ticker(interval: float) -> PacingTicker:
+    """获取当前事件循环中指定间隔的节拍器"""
+    loop = asyncio.get_running_loop()
+    tickers = _tickers.setdefault(loop, {})
+    ticker = tickers.get(interval)
+    if ticker is None:
+        ticker = tickers[interval] = PacingTicker(interval)
+    return ticker
+
+
+class StreamPacer:
+    """单个流的速率状态
+
+    上一段文本输出完后，如果下一段几乎立刻到达，说明上游数据已经在等待，输出成了瓶颈，
+    速率加倍；下一段需要等待时速率逐步回落到基础速率。
+    """
+
+    def __init__(self, max_boost: float = 16.0):
+        self.max_boost = max_boost
+        self.boost = 1.0
+        self._output_done_at: Optional[float] = None
+
+    def on_arrival(self, interval: float) -> float:
+        """一段上游文本到达时调用，返回速率倍数"""
+        if self._output_done_at is not None:
+            waited = asyncio.get_running_loop().time() - self._output_done_at
+            if waited < interval:
+                self.boost = min(self.max_boost, self.boost * 2)
+            else:
+                self.boost = max(1.0, self.boost / 2)
+        return self.boost
+
+    def on_output_done(self):
+        """一段文本全部输出后调用"""
+        self._output_done_at = asyncio.get_running_loop().time()
+
+
+async def pace_units(
+    units: List[str],
+    rate: float,
+    ticker: PacingTicker,
+    min_batch: int = 1,
+) -> AsyncIterator[str]:
+    """按 rate（单位/秒）输出文本单位
+
+    第一个批次立即输出，之后每个节拍输出累积额度内的单位，合并为一段；
+    额度不足 min_batch 个单位时等到下一个节拍（剩余单位不足时直接输出剩余部分）。
+    """
+    loop = asyncio.get_running_loop()
+    index = 0
+    credit = float(max(1, min_batch))
+    last = loop.time()
+    while index < len(units):
+        count = min(int(credit), len(units) - index)
+        if count >= min(min_batch, len(units) - index) and count > 0:
+            credit -= count
+            yield "".join(units[index : index + count])
+            index += count
+            if index >= len(units):
+                return
+        await ticker.wait()
+        now = loop.time()
+        credit += (now - last) * rate
+        last = now
+
+
+def has_finish_reason(chunk: Dict[str, Any]) -> bool:
+    """Gemini 响应块是否带有 finishReason，即流的最后一段文本"""
+    candidates = chunk.get("candidates") or []
+    return bool(candidates and candidates[0].get("finishReason"))
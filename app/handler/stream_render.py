@@ -0,0 +1,83 @@
+"""
+流式输出的文本切分与响应块渲染
+
+- 按字素（用户看到的一个字符，包括组合符号、emoji 序列）或按词切分文本，避免把一个字符拆成两半输出
+- 响应块模板只序列化一次：用占位文本生成完整的 SSE 事件，之后每段文本只需 JSON 转义并拼接到模板中，
+  输出一段文本的开销与文本长度成正比，与响应块的大小无关
+"""
+
+import json
+import re
+import unicodedata
+from typing import Any, Callable, List
+
+# 不会出现在模型输出中的占位文本，用于在序列化后的模板中定位文本位置
+_TEXT_PLACEHOLDER = "\x00stream-text\x00"
+_TEXT_MARKER = json.dumps(_TEXT_PLACEHOLDER)
+
+_ZWJ = 0x200D
+_CJK = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+# 中日韩字符各自成词，其他文本按空白分词，空白附在前一个词后面
+_WORD_PATTERN = re.compile(rf"[{_CJK}]\s*|[^\s{_CJK}]+\s*|\s+")
+
+
+def _is_regional_indicator(code: int) -> bool:
+    return 0x1F1E6 <= code <= 0x1F1FF
+
+
+def _extends_previous(char: str, previous: str) -> bool:
+    """char 是否与前一个字素属于同一个字素"""
+    code = ord(char)
+    if unicodedata.combining(char) or code == _ZWJ:
+        return True
+    if 0xFE00 <= code <= 0xFE0F or 0x1F3FB <= code <= 0x1F3FF:
+        # 变体选择符与肤色修饰符
+        return True
+    if ord(previous[-1]) == _ZWJ:
+        return True
+    if char == "\n" and previous == "\r":
+        return True
+    return (
+        _is_regional_indicator(code)
+        and len(previous) == 1
+        and _is_regional_indicator(ord(previous))
+    )
+
+
+def split_graphemes(text: str) -> List[str]:
+    """按字素切分文本（近似实现，覆盖组合符号、emoji 序列、国旗与 CRLF）"""
+    units: List[str] = []
+    for char in text:
+        if units and _extends_previous(char, units[-1]):
+            units[-1] += char
+        else:
+            units.append(char)
+    return units
+
+
+def split_words(text: str) -> List[str]:
+    """按词切分文本，中日韩字符每个字单独成词"""
+    return _WORD_PATTERN.findall(text)
+
+
+def split_text_units(text: str, unit: str) -> List[str]:
+    """按配置的单位切分文本，unit 为 word 时按词，否则按字素"""
+    if unit == "word":
+        return split_words(text)
+    return split_graphemes(text)
+
+
+def build_chunk_renderer(
+    create_response_chunk: Callable[[str], Any],
+    format_chunk: Callable[[Any], str],
+) -> Callable[[str], str]:
+    """返回将一段文本渲染为完整 SSE 事件的函数
+
+    用占位文本调用一次 create_response_chunk 和 format_chunk 得到模板；模板中找不到唯一的占位文本时
+    （例如响应块里没有文本字段），退回到每段文本都完整构造和序列化响应块。
+    """
+    rendered = format_chunk(create_response_chunk(_TEXT_PLACEHOLDER))
+    prefix, marker, suffix = rendered.partition(_TEXT_MARKER)
+    if not marker or _TEXT_MARKER in suffix:
+        return lambda text: format_chunk(create_response_chunk(text))
+    return lambda text: prefix + json.dumps(text) + suffix
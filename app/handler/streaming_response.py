@@ -0,0 +1,61 @@
+"""
+感知客户端断开的流式响应
+
+StreamingResponse 在部分 ASGI 服务器下只有在下一次写入失败时才发现客户端已经断开，
+期间生成器仍在读取上游、占用 key 的进行中名额。这里在输出的同时监听 http.disconnect，
+客户端一断开就取消生成器所在的任务：取消会沿生成器链传到正在等待的上游读取，
+各层的 finally 关闭 httpx 流、释放进行中名额并写入请求日志。
+"""
+
+import asyncio
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+def _consume_result(task: asyncio.Task):
+    """外层被取消时不再等待流任务，取走其结果避免未检索异常的警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+class DisconnectAwareStreamingResponse(StreamingResponse):
+    """客户端断开连接时立即取消流式生成器"""
+
+    async def _wait_for_disconnect(self, receive: Receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await super().__call__(scope, receive, send)
+            return
+
+        # 使用独立的 asyncio 任务，取消只发生一次，生成器的 finally 中仍可以写日志
+        stream_task = asyncio.ensure_future(self.stream_response(send))
+        disconnect_task = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait(
+                {stream_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+        except asyncio.CancelledError:
+            disconnect_task.cancel()
+            stream_task.cancel()
+            stream_task.add_done_callback(_consume_result)
+            raise
+
+        if not stream_task.done():
+            stream_task.cancel()
+            await asyncio.gather(stream_task, return_exceptions=True)
+            return
+        disconnect_task.cancel()
+        try:
+            stream_task.result()
+        except OSError:
+            raise ClientDisconnect()
+
+        if self.background is not None:
+            await self.background()
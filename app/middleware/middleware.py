@@ -9,9 +9,11 @@ from starlette.middleware.base import BaseHTTPMiddleware
 
 # from app.middleware.request_logging_middleware import RequestLoggingMiddleware
 from app.middleware.smart_routing_middleware import SmartRoutingMiddleware
-from app.core.constants import API_VERSION
+from app.config.config import settings
+from app.core.constants import API_VERSION, REQUEST_TIMEOUT_HEADER
 from app.core.security import verify_auth_token
 from app.log.logger import get_middleware_logger
+from app.service.client.deadline import parse_timeout_header, start_request_deadline
 
 logger = get_middleware_logger()
 
@@ -47,6 +49,17 @@ class AuthMiddleware(BaseHTTPMiddleware):
         return response
 
 
+class DeadlineMiddleware(BaseHTTPMiddleware):
+    """
+    截止时间中间件，为每个请求创建截止时间，取默认配置与客户端 X-Request-Timeout 头中较短的一个
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        deadline = start_request_deadline(settings.REQUEST_DEADLINE_SECONDS)
+        deadline.tighten(parse_timeout_header(request.headers.get(REQUEST_TIMEOUT_HEADER)))
+        return await call_next(request)
+
+
 def setup_middlewares(app: FastAPI) -> None:
     """
     设置应用程序的中间件
@@ -60,6 +73,9 @@ def setup_middlewares(app: FastAPI) -> None:
     # 添加认证中间件
     app.add_middleware(AuthMiddleware)
 
+    # 添加截止时间中间件
+    app.add_middleware(DeadlineMiddleware)
+
     # 添加请求日志中间件（可选，默认注释掉）
     # app.add_middleware(RequestLoggingMiddleware)
 
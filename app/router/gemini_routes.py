@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse
 from copy import deepcopy
 import asyncio
 from app.config.config import settings
@@ -12,6 +14,7 @@ from app.service.tts.native.tts_routes import get_tts_chat_service
 from app.service.model.model_service import ModelService
 from app.handler.retry_handler import RetryHandler
 from app.handler.error_handler import handle_route_errors
+from app.handler.streaming_response import DisconnectAwareStreamingResponse
 from app.core.constants import API_VERSION
 from app.utils.helpers import redact_key_for_logging
 
@@ -28,9 +31,11 @@ async def get_key_manager():
     return await get_key_manager_instance()
 
 
-async def get_next_working_key(key_manager: KeyManager = Depends(get_key_manager)):
-    """获取下一个可用的API密钥"""
-    return await key_manager.get_next_working_key()
+async def get_next_working_key(
+    model_name: str, key_manager: KeyManager = Depends(get_key_manager)
+):
+    """获取下一个可用的API密钥，启用限流时按目标模型的余量选择"""
+    return await key_manager.get_next_working_key(model_name)
 
 
 async def get_chat_service(key_manager: KeyManager = Depends(get_key_manager)):
@@ -104,7 +109,8 @@ async def generate_content(
     _=Depends(security_service.verify_key_or_goog_api_key),
     api_key: str = Depends(get_next_working_key),
     key_manager: KeyManager = Depends(get_key_manager),
-    chat_service: GeminiChatService = Depends(get_chat_service)
+    chat_service: GeminiChatService = Depends(get_chat_service),
+    cache_control: Optional[str] = Header(None),
 ):
     """处理 Gemini 非流式内容生成请求。"""
     operation_name = "gemini_generate_content"
@@ -149,7 +155,8 @@ async def generate_content(
         response = await chat_service.generate_content(
             model=model_name,
             request=request,
-            api_key=api_key
+            api_key=api_key,
+            cache_control=cache_control,
         )
         return response
 
@@ -163,7 +170,8 @@ async def stream_generate_content(
     _=Depends(security_service.verify_key_or_goog_api_key),
     api_key: str = Depends(get_next_working_key),
     key_manager: KeyManager = Depends(get_key_manager),
-    chat_service: GeminiChatService = Depends(get_chat_service)
+    chat_service: GeminiChatService = Depends(get_chat_service),
+    cache_control: Optional[str] = Header(None),
 ):
     """处理 Gemini 流式内容生成请求。"""
     operation_name = "gemini_stream_generate_content"
@@ -178,9 +186,10 @@ async def stream_generate_content(
         response_stream = chat_service.stream_generate_content(
             model=model_name,
             request=request,
-            api_key=api_key
+            api_key=api_key,
+            cache_control=cache_control,
         )
-        return StreamingResponse(response_stream, media_type="text/event-stream")
+        return DisconnectAwareStreamingResponse(response_stream, media_type="text/event-stream")
 
 
 @router.post("/models/{model_name}:countTokens")
@@ -346,10 +355,9 @@ async def verify_key(api_key: str, chat_service: GeminiChatService = Depends(get
     except Exception as e:
         logger.error(f"Key verification failed: {str(e)}")
         
-        async with key_manager.failure_count_lock:
-            if api_key in key_manager.key_failure_counts:
-                key_manager.key_failure_counts[api_key] += 1
-                logger.warning(f"Verification exception for key: {redact_key_for_logging(api_key)}, incrementing failure count")
+        if api_key in key_manager.key_failure_counts:
+            await key_manager.increment_key_failure_count(api_key)
+            logger.warning(f"Verification exception for key: {redact_key_for_logging(api_key)}, incrementing failure count")
         
         return JSONResponse({"status": "invalid", "error": str(e)})
 
@@ -391,13 +399,11 @@ async def verify_selected_keys(
         except Exception as e:
             error_message = str(e)
             logger.warning(f"Key verification failed for {redact_key_for_logging(api_key)}: {error_message}")
-            async with key_manager.failure_count_lock:
-                if api_key in key_manager.key_failure_counts:
-                    key_manager.key_failure_counts[api_key] += 1
-                    logger.warning(f"Bulk verification exception for key: {redact_key_for_logging(api_key)}, incrementing failure count")
-                else:
-                     key_manager.key_failure_counts[api_key] = 1
-                     logger.warning(f"Bulk verification exception for key: {redact_key_for_logging(api_key)}, initializing failure count to 1")
+            new_count = await key_manager.increment_key_failure_count(api_key)
+            if new_count > 1:
+                logger.warning(f"Bulk verification exception for key: {redact_key_for_logging(api_key)}, incrementing failure count")
+            else:
+                logger.warning(f"Bulk verification exception for key: {redact_key_for_logging(api_key)}, initializing failure count to 1")
             failed_keys[api_key] = error_message
             return api_key, "invalid", error_message
 
@@ -1,5 +1,4 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Request
 
 from app.config.config import settings
 from app.core.security import SecurityService
@@ -10,10 +9,11 @@ from app.domain.openai_models import (
 )
 from app.handler.retry_handler import RetryHandler
 from app.handler.error_handler import handle_route_errors
+from app.handler.streaming_response import DisconnectAwareStreamingResponse
 from app.log.logger import get_openai_compatible_logger
 from app.service.key.key_manager import KeyManager, get_key_manager_instance
 from app.service.openai_compatiable.openai_compatiable_service import OpenAICompatiableService
-from app.utils.helpers import redact_key_for_logging
+from app.utils.helpers import get_request_model, redact_key_for_logging
 
 
 router = APIRouter()
@@ -26,9 +26,13 @@ async def get_key_manager():
 
 
 async def get_next_working_key_wrapper(
+    request: Request,
     key_manager: KeyManager = Depends(get_key_manager),
 ):
-    return await key_manager.get_next_working_key()
+    model = None
+    if settings.KEY_RATE_LIMIT_ENABLED:
+        model = await get_request_model(request)
+    return await key_manager.get_next_working_key(model)
 
 
 async def get_openai_service(key_manager: KeyManager = Depends(get_key_manager)):
@@ -78,7 +82,7 @@ async def chat_completion(
         else:
             response = await openai_service.create_chat_completion(request, current_api_key)
             if request.stream:
-                return StreamingResponse(response, media_type="text/event-stream")
+                return DisconnectAwareStreamingResponse(response, media_type="text/event-stream")
             return response
 
 
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 
 from app.config.config import settings
 from app.core.security import SecurityService
@@ -11,6 +12,7 @@ from app.domain.openai_models import (
 )
 from app.handler.retry_handler import RetryHandler
 from app.handler.error_handler import handle_route_errors
+from app.handler.streaming_response import DisconnectAwareStreamingResponse
 from app.log.logger import get_openai_logger
 from app.service.chat.openai_chat_service import OpenAIChatService
 from app.service.embedding.embedding_service import EmbeddingService
@@ -18,7 +20,7 @@ from app.service.image.image_create_service import ImageCreateService
 from app.service.tts.tts_service import TTSService
 from app.service.key.key_manager import KeyManager, get_key_manager_instance
 from app.service.model.model_service import ModelService
-from app.utils.helpers import redact_key_for_logging
+from app.utils.helpers import get_request_model, redact_key_for_logging
 
 router = APIRouter()
 logger = get_openai_logger()
@@ -35,9 +37,13 @@ async def get_key_manager():
 
 
 async def get_next_working_key_wrapper(
+    request: Request,
     key_manager: KeyManager = Depends(get_key_manager),
 ):
-    return await key_manager.get_next_working_key()
+    model = None
+    if settings.KEY_RATE_LIMIT_ENABLED:
+        model = await get_request_model(request)
+    return await key_manager.get_next_working_key(model)
 
 
 async def get_openai_chat_service(key_manager: KeyManager = Depends(get_key_manager)):
@@ -74,6 +80,7 @@ async def chat_completion(
     api_key: str = Depends(get_next_working_key_wrapper),
     key_manager: KeyManager = Depends(get_key_manager),
     chat_service: OpenAIChatService = Depends(get_openai_chat_service),
+    cache_control: Optional[str] = Header(None),
 ):
     """处理 OpenAI 聊天补全请求，支持流式响应和特定模型切换。"""
     operation_name = "chat_completion"
@@ -95,12 +102,14 @@ async def chat_completion(
         if is_image_chat:
             response = await chat_service.create_image_chat_completion(request, current_api_key)
             if request.stream:
-                return StreamingResponse(response, media_type="text/event-stream")
+                return DisconnectAwareStreamingResponse(response, media_type="text/event-stream")
             return response
         else:
-            response = await chat_service.create_chat_completion(request, current_api_key)
+            response = await chat_service.create_chat_completion(
+                request, current_api_key, cache_control
+            )
             if request.stream:
-                return StreamingResponse(response, media_type="text/event-stream")
+                return DisconnectAwareStreamingResponse(response, media_type="text/event-stream")
             return response
 
 
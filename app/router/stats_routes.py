@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from starlette import status
+from app.config.config import settings
 from app.core.security import verify_auth_token
+from app.database.services import get_log_queue_metrics
+from app.service.client.http_client_registry import get_http_client_registry
 from app.service.stats.stats_service import StatsService
 from app.log.logger import get_stats_logger
 from app.utils.helpers import redact_key_for_logging
@@ -53,4 +56,44 @@ async def get_key_usage_details(key: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取密钥使用详情时出错: {e}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/upstream-connections",
+            summary="获取上游连接池统计",
+            description="返回每个共享 HTTP 客户端的连接数、协议版本以及每个连接上的活跃流数量。")
+async def get_upstream_connections():
+    """
+    Returns connection and per-connection stream counts for the pooled upstream HTTP clients.
+    """
+    try:
+        clients = get_http_client_registry().get_connection_stats()
+        return {
+            "http2_enabled": settings.UPSTREAM_HTTP2_ENABLED,
+            "client_count": len(clients),
+            "connection_count": sum(c["connection_count"] for c in clients),
+            "active_streams": sum(c["active_streams"] for c in clients),
+            "clients": clients,
+        }
+    except Exception as e:
+        logger.error(f"Error fetching upstream connection stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取上游连接统计时出错: {e}"
+        )
+
+
+@router.get("/log-queue",
+            summary="获取日志写入队列统计",
+            description="返回请求/错误日志异步批量写入队列的深度、已写入行数、丢弃行数和写入失败次数。")
+async def get_log_queue_stats():
+    """
+    Returns depth and drop counters of the write-behind request/error log queue.
+    """
+    try:
+        return get_log_queue_metrics()
+    except Exception as e:
+        logger.error(f"Error fetching log queue stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取日志队列统计时出错: {e}"
+        )
@@ -1,5 +1,4 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
 from copy import deepcopy
 from app.config.config import settings
 from app.log.logger import get_vertex_express_logger
@@ -10,6 +9,7 @@ from app.service.key.key_manager import KeyManager, get_key_manager_instance
 from app.service.model.model_service import ModelService
 from app.handler.retry_handler import RetryHandler
 from app.handler.error_handler import handle_route_errors
+from app.handler.streaming_response import DisconnectAwareStreamingResponse
 from app.core.constants import API_VERSION
 from app.utils.helpers import redact_key_for_logging
 
@@ -144,4 +144,4 @@ async def stream_generate_content(
             request=request,
             api_key=api_key
         )
-        return StreamingResponse(response_stream, media_type="text/event-stream")
\ No newline at end of file
+        return DisconnectAwareStreamingResponse(response_stream, media_type="text/event-stream")
\ No newline at end of file
@@ -2,12 +2,22 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.config.config import settings
+from app.core.constants import (
+    MAX_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS,
+    MIN_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS,
+)
 from app.domain.gemini_models import GeminiContent, GeminiRequest
 from app.log.logger import Logger
 from app.service.chat.gemini_chat_service import GeminiChatService
 from app.service.error_log.error_log_service import delete_old_error_logs
-from app.service.key.key_manager import get_key_manager_instance
-from app.service.request_log.request_log_service import delete_old_request_logs_task
+from app.service.key.key_manager import (
+    get_key_manager_instance,
+    persist_key_health_snapshot,
+)
+from app.service.request_log.request_log_service import (
+    compact_request_stats_task,
+    delete_old_request_logs_task,
+)
 from app.service.files.files_service import get_files_service
 from app.utils.helpers import redact_key_for_logging
 
@@ -75,22 +85,19 @@ async def check_failed_keys():
                 logger.warning(
                     f"Key {log_key} verification failed: {str(e)}. Incrementing failure count."
                 )
-                # 直接操作计数器，需要加锁
-                async with key_manager.failure_count_lock:
-                    # 再次检查 key 是否存在且失败次数未达上限
-                    if (
-                        key in key_manager.key_failure_counts
-                        and key_manager.key_failure_counts[key]
-                        < key_manager.MAX_FAILURES
-                    ):
-                        key_manager.key_failure_counts[key] += 1
-                        logger.info(
-                            f"Failure count for key {log_key} incremented to {key_manager.key_failure_counts[key]}."
-                        )
-                    elif key in key_manager.key_failure_counts:
-                        logger.warning(
-                            f"Key {log_key} reached MAX_FAILURES ({key_manager.MAX_FAILURES}). Not incrementing further."
-                        )
+                # 再次检查 key 是否存在且失败次数未达上限
+                current_count = key_manager.key_failure_counts.get(key)
+                if current_count is None:
+                    continue
+                if current_count < key_manager.MAX_FAILURES:
+                    new_count = await key_manager.increment_key_failure_count(key)
+                    logger.info(
+                        f"Failure count for key {log_key} incremented to {new_count}."
+                    )
+                else:
+                    logger.warning(
+                        f"Key {log_key} reached MAX_FAILURES ({key_manager.MAX_FAILURES}). Not incrementing further."
+                    )
 
     except Exception as e:
         logger.error(
@@ -118,6 +125,19 @@ async def cleanup_expired_files():
         )
 
 
+async def persist_key_health():
+    """
+    定时将 key 健康状态快照写入数据库
+    """
+    try:
+        await persist_key_health_snapshot()
+    except Exception as e:
+        logger.error(
+            f"An error occurred while persisting key health snapshot: {str(e)}",
+            exc_info=True,
+        )
+
+
 def setup_scheduler():
     """设置并启动 APScheduler"""
     scheduler = AsyncIOScheduler(timezone=str(settings.TIMEZONE))  # 从配置读取时区
@@ -157,6 +177,17 @@ def setup_scheduler():
         f"Auto-delete request logs job scheduled to run daily at 3:05 AM, if enabled and AUTO_DELETE_REQUEST_LOGS_DAYS is set to {settings.AUTO_DELETE_REQUEST_LOGS_DAYS} days."
     )
     
+    # 每小时将较早的分钟汇总合并为小时汇总
+    if settings.STATS_ROLLUP_ENABLED:
+        scheduler.add_job(
+            compact_request_stats_task,
+            "cron",
+            minute=10,
+            id="compact_request_stats_job",
+            name="Compact Request Stats Rollups",
+        )
+        logger.info("Request stats rollup compaction job scheduled to run hourly at minute 10.")
+
     # 新增：添加文件过期清理的定时任务，每小时执行一次
     if getattr(settings, 'FILES_CLEANUP_ENABLED', True):
         cleanup_interval = getattr(settings, 'FILES_CLEANUP_INTERVAL_HOURS', 1)
@@ -171,6 +202,26 @@ def setup_scheduler():
             f"File cleanup job scheduled to run every {cleanup_interval} hour(s)."
         )
 
+    # 添加 key 健康状态快照任务，写入间隔限制在合理范围内
+    if settings.KEY_HEALTH_PERSIST_ENABLED:
+        snapshot_interval = max(
+            MIN_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS,
+            min(
+                settings.KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS,
+                MAX_KEY_HEALTH_SNAPSHOT_INTERVAL_SECONDS,
+            ),
+        )
+        scheduler.add_job(
+            persist_key_health,
+            "interval",
+            seconds=snapshot_interval,
+            id="persist_key_health_job",
+            name="Persist Key Health Snapshot",
+        )
+        logger.info(
+            f"Key health snapshot job scheduled to run every {snapshot_interval} second(s)."
+        )
+
     scheduler.start()
     logger.info("Scheduler started with all jobs.")
     return scheduler
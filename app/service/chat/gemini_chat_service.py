@@ -1,17 +1,39 @@
 # app/services/chat_service.py
 
+import asyncio
 import json
 import re
 import datetime
 import time
-from typing import Any, AsyncGenerator, Dict, List
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
 from app.config.config import settings
-from app.core.constants import GEMINI_2_FLASH_EXP_SAFETY_SETTINGS
+from app.core.constants import CLIENT_CLOSED_REQUEST_STATUS, GEMINI_2_FLASH_EXP_SAFETY_SETTINGS, HEDGE_MIN_LATENCY_SAMPLES
 from app.domain.gemini_models import GeminiRequest
 from app.handler.response_handler import GeminiResponseHandler
 from app.handler.stream_optimizer import gemini_optimizer
+from app.handler.stream_pacing import has_finish_reason
 from app.log.logger import get_gemini_logger
 from app.service.client.api_client import GeminiApiClient
+from app.service.client.deadline import deadline_expired
+from app.service.chat.hedging import (
+    get_hedge_budget,
+    get_latency_tracker,
+    hedge_stream,
+    run_hedged,
+)
+from app.service.chat.response_cache import (
+    lookup_cached_response,
+    replay_response_chunks,
+    store_cached_response,
+)
+from app.service.chat.sse_passthrough import SsePassthrough
+from app.service.chat.stream_resume import StreamProgress, build_resume_payload
+from app.service.chat.single_flight import (
+    compute_request_hash,
+    get_single_flight,
+    is_deterministic,
+)
+from app.service.key.affinity import compute_affinity_hash
 from app.service.key.key_manager import KeyManager
 from app.database.services import add_error_log, add_request_log, get_file_api_key
 from app.utils.helpers import redact_key_for_logging
@@ -263,6 +285,42 @@ class GeminiChatService:
         self.key_manager = key_manager
         self.response_handler = GeminiResponseHandler()
 
+    async def _get_affinity_key(
+        self, model: str, payload: Dict[str, Any], api_key: str
+    ) -> str:
+        """开启 key 亲和时按请求前缀选择首选 key，没有合适的 key 时沿用传入的 key
+
+        传入的 key 已由路由依赖记录过一次请求，改用亲和 key 时归还其额度。
+        """
+        if not settings.KEY_AFFINITY_ENABLED or not self.key_manager:
+            return api_key
+        affinity_hash = compute_affinity_hash(
+            payload, settings.KEY_AFFINITY_PREFIX_CONTENTS
+        )
+        if affinity_hash is None:
+            return api_key
+        affinity_key = await self.key_manager.get_affinity_key(
+            affinity_hash, model, charged_key=api_key
+        )
+        return affinity_key or api_key
+
+    async def _release_request(self, model: str, api_key: str):
+        """请求最终没有发往上游时，归还路由依赖为 key 记录的请求额度"""
+        if self.key_manager:
+            await self.key_manager.release_request(api_key, model)
+
+    async def _coalesce(
+        self, operation: str, model: str, payload: Dict[str, Any], call, api_key: str
+    ):
+        """开启请求合并时，相同的并发请求只调用一次上游并共享结果
+
+        直接共享已有结果的请求没有使用 api_key，归还它的请求额度。
+        """
+        request_hash = compute_request_hash(operation, model, payload)
+        return await get_single_flight(settings.SINGLE_FLIGHT_WINDOW_SECONDS).do(
+            request_hash, call, lambda: self._release_request(model, api_key)
+        )
+
     def _extract_text_from_response(self, response: Dict[str, Any]) -> str:
         """从响应中提取文本内容"""
         if not response.get("candidates"):
@@ -288,9 +346,15 @@ class GeminiChatService:
         return response_copy
 
     async def generate_content(
-        self, model: str, request: GeminiRequest, api_key: str
+        self,
+        model: str,
+        request: GeminiRequest,
+        api_key: str,
+        cache_control: Optional[str] = None,
     ) -> Dict[str, Any]:
         """生成内容"""
+        # 路由依赖已为该 key 记录过一次请求，没有发往上游时需要归还
+        charged_key = api_key
         # 檢查並獲取文件專用的 API key（如果有文件）
         file_names = _extract_file_references(request.model_dump().get("contents", []))
         if file_names:
@@ -303,6 +367,40 @@ class GeminiChatService:
                 logger.warning(f"No API key found for file {file_names[0]}, using default key: {redact_key_for_logging(api_key)}")
         
         payload = _build_payload(model, request)
+        cached_response, cache_key = await lookup_cached_response(
+            model, payload, cache_control
+        )
+        if cached_response is not None:
+            logger.info(f"Response cache hit for model {model}")
+            await self._release_request(model, charged_key)
+            return self.response_handler.handle_response(
+                cached_response, model, stream=False
+            )
+        if not file_names:
+            # 亲和 key 替换路由 key 时额度随之转移
+            api_key = charged_key = await self._get_affinity_key(
+                model, payload, api_key
+            )
+        if settings.SINGLE_FLIGHT_ENABLED and (
+            is_deterministic(payload) or not settings.SINGLE_FLIGHT_DETERMINISTIC_ONLY
+        ):
+            return await self._coalesce(
+                "generateContent",
+                model,
+                payload,
+                lambda: self._generate_content(model, payload, api_key, cache_key),
+                charged_key,
+            )
+        return await self._generate_content(model, payload, api_key, cache_key)
+
+    async def _generate_content(
+        self,
+        model: str,
+        payload: Dict[str, Any],
+        api_key: str,
+        cache_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """调用上游生成内容并记录请求日志"""
         start_time = time.perf_counter()
         request_datetime = datetime.datetime.now()
         is_success = False
@@ -310,9 +408,14 @@ class GeminiChatService:
         response = None
 
         try:
-            response = await self.api_client.generate_content(payload, model, api_key)
+            response, api_key = await self._call_generate_content(model, payload, api_key)
             is_success = True
             status_code = 200
+            if settings.HEDGE_ENABLED or settings.ADAPTIVE_TIMEOUT_ENABLED:
+                get_latency_tracker().record(model, time.perf_counter() - start_time)
+            if self.key_manager:
+                await self.key_manager.record_success(api_key, model, response.get("usageMetadata"))
+            await store_cached_response(cache_key, response)
             return self.response_handler.handle_response(response, model, stream=False)
         except Exception as e:
             is_success = False
@@ -345,12 +448,176 @@ class GeminiChatService:
                 request_time=request_datetime
             )
 
+    def _get_hedge_delay(self, model: str) -> float:
+        """对冲延迟：样本足够时取近期延迟的 HEDGE_DELAY_PERCENTILE 百分位，否则使用默认值"""
+        tracker = get_latency_tracker()
+        if tracker.sample_count(model) < HEDGE_MIN_LATENCY_SAMPLES:
+            return settings.HEDGE_DEFAULT_DELAY_SECONDS
+        return max(
+            settings.HEDGE_MIN_DELAY_SECONDS,
+            tracker.percentile(model, settings.HEDGE_DELAY_PERCENTILE),
+        )
+
+    async def _call_generate_content(
+        self, model: str, payload: Dict[str, Any], api_key: str
+    ) -> Tuple[Dict[str, Any], str]:
+        """调用上游 generateContent，返回 (响应, 实际使用的 key)
+
+        开启对冲时，超过延迟阈值仍未返回则在预算内用另一个健康 key 发起备份请求，
+        先成功的结果胜出，另一个请求被取消。
+        """
+        primary = self.api_client.generate_content(payload, model, api_key)
+        if not settings.HEDGE_ENABLED or not self.key_manager:
+            return await primary, api_key
+
+        budget = get_hedge_budget(settings.HEDGE_BUDGET_PERCENT / 100.0)
+        budget.record_request()
+        backup_keys = []
+
+        async def start_backup():
+            if not budget.try_spend():
+                return None
+            backup_key = await self.key_manager.get_alternate_key(api_key, model)
+            if not backup_key:
+                budget.refund()
+                return None
+            logger.info(
+                f"No response from key {redact_key_for_logging(api_key)} yet, "
+                f"hedging with key {redact_key_for_logging(backup_key)}"
+            )
+            backup_keys.append(backup_key)
+            return self._hedge_generate_content(model, payload, backup_key)
+
+        async def on_primary_error(error: BaseException):
+            await self._record_hedge_failure(model, payload, api_key, str(error))
+
+        response, winner = await run_hedged(
+            primary, self._get_hedge_delay(model), start_backup, on_primary_error
+        )
+        return response, backup_keys[0] if winner else api_key
+
+    def _open_stream(
+        self,
+        model: str,
+        payload: Dict[str, Any],
+        api_key: str,
+        on_commit: Callable[[str], None],
+        raw: bool = False,
+    ) -> AsyncGenerator[Any, None]:
+        """打开上游流，raw 为 True 时返回原始字节块，否则返回解析后的 SSE 事件
+
+        开启首字节对冲时，HEDGE_STREAM_TTFB_MS 内仍未收到第一个事件则在预算内用另一个 key
+        再打开一个流，先收到事件的流胜出，on_commit 以最终使用的 key 调用。
+        """
+        stream = (
+            self.api_client.stream_generate_content_raw
+            if raw
+            else self.api_client.stream_generate_content
+        )
+        if not settings.HEDGE_STREAM_ENABLED or not self.key_manager:
+            return stream(payload, model, api_key)
+
+        budget = get_hedge_budget(settings.HEDGE_BUDGET_PERCENT / 100.0)
+        budget.record_request()
+
+        async def pick_backup_key() -> Optional[str]:
+            if not budget.try_spend():
+                return None
+            backup_key = await self.key_manager.get_alternate_key(api_key, model)
+            if not backup_key:
+                budget.refund()
+                return None
+            logger.info(
+                f"No stream event from key {redact_key_for_logging(api_key)} yet, "
+                f"hedging with key {redact_key_for_logging(backup_key)}"
+            )
+            return backup_key
+
+        async def on_error(key: str, error: BaseException):
+            await self._record_hedge_failure(model, payload, key, str(error))
+
+        return hedge_stream(
+            lambda key: stream(payload, model, key),
+            api_key,
+            settings.HEDGE_STREAM_TTFB_MS / 1000.0,
+            pick_backup_key,
+            on_commit,
+            on_error,
+        )
+
+    def _can_pass_through(self, model: str, payload: Dict[str, Any]) -> bool:
+        """流式响应是否可以直接转发上游字节，需要改写响应内容的功能生效时不能直通"""
+        if not settings.STREAM_PASSTHROUGH_ENABLED:
+            return False
+        if settings.STREAM_OPTIMIZER_ENABLED or settings.STREAM_RESUME_ENABLED:
+            return False
+        if settings.SHOW_SEARCH_LINK and model.endswith("-search"):
+            return False
+        # 图片需要上传后替换为链接，代码执行结果需要格式化
+        modalities = payload.get("generationConfig", {}).get("responseModalities") or []
+        if model.endswith("-image") or any(str(m).upper() == "IMAGE" for m in modalities):
+            return False
+        return not any(
+            "codeExecution" in tool or "code_execution" in tool
+            for tool in payload.get("tools") or []
+        )
+
+    async def _hedge_generate_content(
+        self, model: str, payload: Dict[str, Any], api_key: str
+    ) -> Dict[str, Any]:
+        """发送对冲请求，失败时自行记录，不进入重试流程"""
+        try:
+            return await self.api_client.generate_content(payload, model, api_key)
+        except Exception as e:
+            await self._record_hedge_failure(model, payload, api_key, str(e))
+            raise
+
+    async def _record_hedge_failure(
+        self, model: str, payload: Dict[str, Any], api_key: str, error_log_msg: str
+    ):
+        """记录对冲过程中被另一个请求取代的失败请求"""
+        logger.warning(f"Hedged API call failed with error: {error_log_msg}")
+        match = re.search(r"status code (\d+)", error_log_msg)
+        status_code = int(match.group(1)) if match else 500
+        await self.key_manager.record_failure(api_key, error_log_msg)
+        await add_error_log(
+            gemini_key=api_key,
+            model_name=model,
+            error_type="gemini-chat-hedge",
+            error_log=error_log_msg,
+            error_code=status_code,
+            request_msg=payload
+        )
+        await add_request_log(
+            model_name=model,
+            api_key=api_key,
+            is_success=False,
+            status_code=status_code,
+            latency_ms=None,
+            request_time=datetime.datetime.now()
+        )
+
     async def count_tokens(
         self, model: str, request: GeminiRequest, api_key: str
     ) -> Dict[str, Any]:
         """计算token数量"""
         # countTokens API只需要contents
         payload = {"contents": _filter_empty_parts(request.model_dump().get("contents", []))}
+        if settings.SINGLE_FLIGHT_ENABLED:
+            # token 计数结果与采样参数无关，总是可以合并
+            return await self._coalesce(
+                "countTokens",
+                model,
+                payload,
+                lambda: self._count_tokens(model, payload, api_key),
+                api_key,
+            )
+        return await self._count_tokens(model, payload, api_key)
+
+    async def _count_tokens(
+        self, model: str, payload: Dict[str, Any], api_key: str
+    ) -> Dict[str, Any]:
+        """调用上游计算token数量并记录请求日志"""
         start_time = time.perf_counter()
         request_datetime = datetime.datetime.now()
         is_success = False
@@ -394,9 +661,15 @@ class GeminiChatService:
             )
 
     async def stream_generate_content(
-        self, model: str, request: GeminiRequest, api_key: str
+        self,
+        model: str,
+        request: GeminiRequest,
+        api_key: str,
+        cache_control: Optional[str] = None,
     ) -> AsyncGenerator[str, None]:
         """流式生成内容"""
+        # 路由依赖已为该 key 记录过一次请求，命中缓存时需要归还
+        charged_key = api_key
         # 檢查並獲取文件專用的 API key（如果有文件）
         file_names = _extract_file_references(request.model_dump().get("contents", []))
         if file_names:
@@ -411,25 +684,68 @@ class GeminiChatService:
         retries = 0
         max_retries = settings.MAX_RETRIES
         payload = _build_payload(model, request)
+        cached_response, _ = await lookup_cached_response(model, payload, cache_control)
+        if cached_response is not None:
+            logger.info(f"Replaying cached response as stream for model {model}")
+            await self._release_request(model, charged_key)
+            async for chunk in replay_response_chunks(
+                cached_response,
+                settings.RESPONSE_CACHE_REPLAY_CHUNK_SIZE,
+                settings.RESPONSE_CACHE_REPLAY_DELAY_SECONDS,
+            ):
+                response_data = self.response_handler.handle_response(
+                    chunk, model, stream=True
+                )
+                yield "data: " + json.dumps(response_data) + "\n\n"
+            return
+        if not file_names:
+            api_key = await self._get_affinity_key(model, payload, api_key)
         is_success = False
         status_code = None
         final_api_key = api_key
 
+        def commit_key(key: str):
+            # 首字节对冲可能改用备份 key
+            nonlocal current_attempt_key, final_api_key
+            current_attempt_key = final_api_key = key
+
+        progress = StreamProgress()
+        pacer = gemini_optimizer.create_pacer()
+        pass_through = self._can_pass_through(model, payload)
         while retries < max_retries:
             request_datetime = datetime.datetime.now()
             start_time = time.perf_counter()
             current_attempt_key = api_key
             final_api_key = current_attempt_key
+            usage_metadata = None
+            attempt_payload = payload
+            if progress.can_resume:
+                # 已输出部分文本后中断，让模型从中断处继续生成
+                attempt_payload = build_resume_payload(payload, progress.text)
+                logger.info(
+                    f"Resuming stream for model {model} after {len(progress.text)} characters"
+                )
             try:
-                async for line in self.api_client.stream_generate_content(
-                    payload, model, current_attempt_key
-                ):
-                    # print(line)
-                    if line.startswith("data:"):
-                        line = line[6:]
+                if pass_through:
+                    relay = SsePassthrough()
+                    async for data in relay.relay(
+                        self._open_stream(
+                            model, attempt_payload, current_attempt_key, commit_key, raw=True
+                        )
+                    ):
+                        yield data
+                    usage_metadata = relay.usage_metadata()
+                else:
+                    async for event in self._open_stream(
+                        model, attempt_payload, current_attempt_key, commit_key
+                    ):
+                        chunk = event.json()
+                        usage_metadata = chunk.get("usageMetadata") or usage_metadata
                         response_data = self.response_handler.handle_response(
-                            json.loads(line), model, stream=True
+                            chunk, model, stream=True
                         )
+                        if settings.STREAM_RESUME_ENABLED:
+                            progress.record(chunk)
                         text = self._extract_text_from_response(response_data)
                         # 如果有文本内容，且开启了流式输出优化器，则使用流式输出优化器处理
                         if text and settings.STREAM_OPTIMIZER_ENABLED:
@@ -440,6 +756,8 @@ class GeminiChatService:
                                 text,
                                 lambda t: self._create_char_response(response_data, t),
                                 lambda c: "data: " + json.dumps(c) + "\n\n",
+                                pacer=pacer,
+                                final=has_finish_reason(chunk),
                             ):
                                 yield optimized_chunk
                         else:
@@ -448,7 +766,14 @@ class GeminiChatService:
                 logger.info("Streaming completed successfully")
                 is_success = True
                 status_code = 200
+                await self.key_manager.record_success(current_attempt_key, model, usage_metadata)
                 break
+            except asyncio.CancelledError:
+                # 客户端断开连接，上游流随取消一同关闭，不计为 key 失败
+                logger.info(f"Client disconnected, cancelled streaming for model {model}")
+                is_success = False
+                status_code = CLIENT_CLOSED_REQUEST_STATUS
+                raise
             except Exception as e:
                 retries += 1
                 is_success = False
@@ -471,7 +796,19 @@ class GeminiChatService:
                     request_msg=payload
                 )
 
-                api_key = await self.key_manager.handle_api_failure(current_attempt_key, retries)
+                if deadline_expired():
+                    logger.error("Request deadline exceeded, ceasing retries for streaming.")
+                    break
+
+                if progress.emitted and not progress.can_resume:
+                    # 重新开始会让客户端收到重复内容，只记录失败，不再申请新 key
+                    await self.key_manager.record_failure(current_attempt_key, error_log_msg)
+                    logger.error("Stream failed after emitting non-text content, cannot resume.")
+                    break
+
+                api_key = await self.key_manager.handle_api_failure(
+                    current_attempt_key, retries, model, error_log_msg
+                )
                 if api_key:
                     logger.info(f"Switched to new API key: {redact_key_for_logging(api_key)}")
                 else:
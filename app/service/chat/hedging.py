@@ -0,0 +1,176 @@
+"""
+对冲请求（hedged requests）
+
+非流式请求超过延迟阈值仍未返回时，用另一个健康 key 发送相同的请求，
+取先成功返回的结果并取消另一个。延迟阈值取该模型近期延迟的指定百分位，
+对冲预算限制备份请求占总请求的比例，避免上游变慢时流量翻倍。
+流式请求按首个事件到达时间（TTFB）对冲，选定一个流后才向客户端输出。
+"""
+
+import asyncio
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from app.service.client.latency import LatencyTracker, get_latency_tracker  # noqa: F401
+
+
+class HedgeBudget:
+    """对冲预算：每个请求存入 ratio 个令牌，每次对冲消耗 1 个令牌，最多累积 max_tokens 个"""
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = 0.0
+
+    def record_request(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        # 容忍累加比例时的浮点误差
+        if self.tokens < 1.0 - 1e-9:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def refund(self):
+        """归还未实际使用的对冲令牌"""
+        self.tokens = min(self.max_tokens, self.tokens + 1.0)
+
+
+async def run_hedged(
+    primary: Awaitable[Any],
+    delay: float,
+    start_backup: Callable[[], Awaitable[Optional[Awaitable[Any]]]],
+    on_primary_error: Optional[Callable[[BaseException], Awaitable[None]]] = None,
+) -> Tuple[Any, int]:
+    """执行主请求，超过 delay 秒未完成时通过 start_backup 发起备份请求
+
+    start_backup 返回备份请求的 awaitable，返回 None 表示不发起对冲。
+    先成功的结果胜出，另一个请求被取消；两者都失败时抛出主请求的异常。
+    主请求失败但备份请求成功时，主请求的异常交给 on_primary_error 处理。
+
+    Returns:
+        (结果, 胜出请求的序号)，0 为主请求，1 为备份请求
+    """
+    primary_task = asyncio.ensure_future(primary)
+    tasks = [primary_task]
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result(), 0
+        backup = await start_backup()
+        if backup is None:
+            return await primary_task, 0
+        tasks.append(asyncio.ensure_future(backup))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    winner = tasks.index(task)
+                    if winner == 1 and primary_task.done() and on_primary_error:
+                        if not primary_task.cancelled() and primary_task.exception():
+                            await on_primary_error(primary_task.exception())
+                    return task.result(), winner
+        return primary_task.result(), 0
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def _is_event(item: Any) -> bool:
+    """SSE 事件、以 data: 开头的文本行，或包含 data: 的原始字节块"""
+    if isinstance(item, bytes):
+        return b"data:" in item
+    if isinstance(item, str):
+        return item.startswith("data:")
+    return True
+
+
+async def _read_until_first_event(stream: AsyncIterator[Any]) -> List[Any]:
+    """读取流直到第一个事件，返回已读取的行（或直通模式下的字节块）"""
+    lines = []
+    async for line in stream:
+        lines.append(line)
+        if _is_event(line):
+            break
+    return lines
+
+
+async def hedge_stream(
+    open_stream: Callable[[str], AsyncGenerator[Any, None]],
+    api_key: str,
+    delay: float,
+    pick_backup_key: Callable[[], Awaitable[Optional[str]]],
+    on_commit: Optional[Callable[[str], None]] = None,
+    on_error: Optional[Callable[[str, BaseException], Awaitable[None]]] = None,
+) -> AsyncGenerator[Any, None]:
+    """首字节对冲：主流超过 delay 秒仍未收到第一个 data: 行时，用另一个 key 再打开一个流
+
+    先收到第一个事件的流胜出，另一个流在向客户端输出任何内容之前被取消并关闭。
+    on_commit 在选定流后以该流的 key 调用。两个流都在首个事件前失败时抛出主流的异常，
+    其余在首个事件前失败的流交给 on_error 处理。
+    """
+    keys = [api_key]
+    streams = [open_stream(api_key)]
+    tasks = [asyncio.ensure_future(_read_until_first_event(streams[0]))]
+    winner = None
+    try:
+        done, _ = await asyncio.wait({tasks[0]}, timeout=delay)
+        if not done:
+            backup_key = await pick_backup_key()
+            if backup_key:
+                keys.append(backup_key)
+                streams.append(open_stream(backup_key))
+                tasks.append(asyncio.ensure_future(_read_until_first_event(streams[1])))
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    winner = tasks.index(task)
+                    break
+        for index, task in enumerate(tasks):
+            if index == winner or (winner is None and index == 0):
+                continue
+            if task.done() and not task.cancelled() and task.exception() and on_error:
+                await on_error(keys[index], task.exception())
+        if winner is None:
+            raise tasks[0].exception()
+    finally:
+        for index, task in enumerate(tasks):
+            if index == winner:
+                continue
+            if not task.done():
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await streams[index].aclose()
+
+    if on_commit:
+        on_commit(keys[winner])
+    try:
+        for line in tasks[winner].result():
+            yield line
+        async for line in streams[winner]:
+            yield line
+    finally:
+        # 调用方提前关闭时同时关闭胜出的流
+        await streams[winner].aclose()
+
+
+_hedge_budget = HedgeBudget(0.0)
+
+
+def get_hedge_budget(ratio: float) -> HedgeBudget:
+    """获取全局对冲预算，比例配置变化时直接生效"""
+    _hedge_budget.ratio = ratio
+    return _hedge_budget
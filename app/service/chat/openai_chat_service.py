@@ -6,10 +6,10 @@ import json
 import re
 import time
 from copy import deepcopy
-from typing import Any, AsyncGenerator, Dict, List, Optional, Union
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Union
 
 from app.config.config import settings
-from app.core.constants import GEMINI_2_FLASH_EXP_SAFETY_SETTINGS
+from app.core.constants import CLIENT_CLOSED_REQUEST_STATUS, GEMINI_2_FLASH_EXP_SAFETY_SETTINGS
 from app.database.services import (
     add_error_log,
     add_request_log,
@@ -18,10 +18,20 @@ from app.domain.openai_models import ChatRequest, ImageGenerationRequest
 from app.handler.message_converter import OpenAIMessageConverter
 from app.handler.response_handler import OpenAIResponseHandler
 from app.handler.stream_optimizer import openai_optimizer
+from app.handler.stream_pacing import has_finish_reason
 from app.log.logger import get_openai_logger
+from app.service.chat.hedging import get_hedge_budget, hedge_stream
+from app.service.chat.response_cache import (
+    lookup_cached_response,
+    replay_response_chunks,
+    store_cached_response,
+)
+from app.service.chat.stream_resume import StreamProgress, build_resume_payload
 from app.service.client.api_client import GeminiApiClient
+from app.service.client.deadline import deadline_expired
 from app.service.image.image_create_service import ImageCreateService
 from app.service.key.key_manager import KeyManager
+from app.utils.helpers import redact_key_for_logging
 
 logger = get_openai_logger()
 
@@ -261,6 +271,7 @@ class OpenAIChatService:
         self,
         request: ChatRequest,
         api_key: str,
+        cache_control: Optional[str] = None,
     ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
         """创建聊天完成"""
         messages, instruction = self.message_converter.convert(request.messages)
@@ -268,13 +279,36 @@ class OpenAIChatService:
         payload = _build_payload(request, messages, instruction)
 
         if request.stream:
-            return self._handle_stream_completion(request.model, payload, api_key)
-        return await self._handle_normal_completion(request.model, payload, api_key)
+            return self._handle_stream_completion(
+                request.model, payload, api_key, cache_control
+            )
+        return await self._handle_normal_completion(
+            request.model, payload, api_key, cache_control
+        )
 
     async def _handle_normal_completion(
-        self, model: str, payload: Dict[str, Any], api_key: str
+        self,
+        model: str,
+        payload: Dict[str, Any],
+        api_key: str,
+        cache_control: Optional[str] = None,
     ) -> Dict[str, Any]:
         """处理普通聊天完成"""
+        cached_response, cache_key = await lookup_cached_response(
+            model, payload, cache_control
+        )
+        if cached_response is not None:
+            logger.info(f"Response cache hit for model {model}")
+            if self.key_manager:
+                # 没有发往上游，归还路由依赖为该 key 记录的请求额度
+                await self.key_manager.release_request(api_key, model)
+            return self.response_handler.handle_response(
+                cached_response,
+                model,
+                stream=False,
+                finish_reason="stop",
+                usage_metadata=cached_response.get("usageMetadata", {}),
+            )
         start_time = time.perf_counter()
         request_datetime = datetime.datetime.now()
         is_success = False
@@ -286,6 +320,9 @@ class OpenAIChatService:
             usage_metadata = response.get("usageMetadata", {})
             is_success = True
             status_code = 200
+            if self.key_manager:
+                await self.key_manager.record_success(api_key, model, usage_metadata)
+            await store_cached_response(cache_key, response)
             
             # 尝试处理响应，捕获可能的响应处理异常
             try:
@@ -358,41 +395,32 @@ class OpenAIChatService:
         logger.info(
             f"Fake streaming enabled for model: {model}. Calling non-streaming endpoint."
         )
-        keep_sending_empty_data = True
-
-        async def send_empty_data_locally() -> AsyncGenerator[str, None]:
-            """定期发送空数据以保持连接"""
-            while keep_sending_empty_data:
-                await asyncio.sleep(settings.FAKE_STREAM_EMPTY_DATA_INTERVAL_SECONDS)
-                if keep_sending_empty_data:
-                    empty_chunk = self.response_handler.handle_response({}, model, stream=True, finish_reason='stop', usage_metadata=None)
-                    yield f"data: {json.dumps(empty_chunk)}\n\n"
-                    logger.debug("Sent empty data chunk for fake stream heartbeat.")
-
-        empty_data_generator = send_empty_data_locally()
         api_response_task = asyncio.create_task(
             self.api_client.generate_content(payload, model, api_key)
         )
 
         try:
-            while not api_response_task.done():
-                try:
-                    next_empty_chunk = await asyncio.wait_for(
-                        empty_data_generator.__anext__(), timeout=0.1
-                    )
-                    yield next_empty_chunk
-                except asyncio.TimeoutError:
-                    pass
-                except (
-                    StopAsyncIteration
-                ):
+            # 等待上游响应期间定期发送空数据以保持连接
+            while True:
+                done, _ = await asyncio.wait(
+                    {api_response_task},
+                    timeout=settings.FAKE_STREAM_EMPTY_DATA_INTERVAL_SECONDS,
+                )
+                if done:
                     break
+                empty_chunk = self.response_handler.handle_response({}, model, stream=True, finish_reason='stop', usage_metadata=None)
+                yield f"data: {json.dumps(empty_chunk)}\n\n"
+                logger.debug("Sent empty data chunk for fake stream heartbeat.")
 
-            response = await api_response_task
+            response = api_response_task.result()
         finally:
-            keep_sending_empty_data = False
+            # 客户端断开或出错时取消仍在进行的上游请求，释放 key 的进行中名额
+            if not api_response_task.done():
+                api_response_task.cancel()
 
         if response and response.get("candidates"):
+            if self.key_manager:
+                await self.key_manager.record_success(api_key, model, response.get("usageMetadata"))
             response = self.response_handler.handle_response(response, model, stream=True, finish_reason='stop', usage_metadata=response.get("usageMetadata", {}))
             yield f"data: {json.dumps(response)}\n\n"
             logger.info(f"Sent full response content for fake stream: {model}")
@@ -411,69 +439,188 @@ class OpenAIChatService:
             error_chunk = self.response_handler.handle_response({}, model, stream=True, finish_reason='stop', usage_metadata=None)
             yield f"data: {json.dumps(error_chunk)}\n\n"
 
+    def _open_stream(
+        self,
+        model: str,
+        payload: Dict[str, Any],
+        api_key: str,
+        on_commit: Callable[[str], None],
+    ) -> AsyncGenerator[str, None]:
+        """打开上游流
+
+        开启首字节对冲时，HEDGE_STREAM_TTFB_MS 内仍未收到第一个事件则在预算内用另一个 key
+        再打开一个流，先收到事件的流胜出，on_commit 以最终使用的 key 调用。
+        """
+        if not settings.HEDGE_STREAM_ENABLED or not self.key_manager:
+            return self.api_client.stream_generate_content(payload, model, api_key)
+
+        budget = get_hedge_budget(settings.HEDGE_BUDGET_PERCENT / 100.0)
+        budget.record_request()
+
+        async def pick_backup_key() -> Optional[str]:
+            if not budget.try_spend():
+                return None
+            backup_key = await self.key_manager.get_alternate_key(api_key, model)
+            if not backup_key:
+                budget.refund()
+                return None
+            logger.info(
+                f"No stream event from key {redact_key_for_logging(api_key)} yet, "
+                f"hedging with key {redact_key_for_logging(backup_key)}"
+            )
+            return backup_key
+
+        async def on_error(key: str, error: BaseException):
+            error_log_msg = str(error)
+            logger.warning(f"Hedged stream failed with error: {error_log_msg}")
+            match = re.search(r"status code (\d+)", error_log_msg)
+            status_code = int(match.group(1)) if match else 500
+            await self.key_manager.record_failure(key, error_log_msg)
+            await add_error_log(
+                gemini_key=key,
+                model_name=model,
+                error_type="openai-chat-hedge",
+                error_log=error_log_msg,
+                error_code=status_code,
+                request_msg=payload,
+            )
+
+        return hedge_stream(
+            lambda key: self.api_client.stream_generate_content(payload, model, key),
+            api_key,
+            settings.HEDGE_STREAM_TTFB_MS / 1000.0,
+            pick_backup_key,
+            on_commit,
+            on_error,
+        )
+
     async def _real_stream_logic_impl(
-        self, model: str, payload: Dict[str, Any], api_key: str
+        self,
+        model: str,
+        payload: Dict[str, Any],
+        api_key: str,
+        on_commit: Optional[Callable[[str], None]] = None,
+        progress: Optional[StreamProgress] = None,
     ) -> AsyncGenerator[str, None]:
-        """处理真实流式 (real stream) 的核心逻辑"""
+        """处理真实流式 (real stream) 的核心逻辑，给出 progress 时记录已输出的内容以便续传"""
         tool_call_flag = False
         usage_metadata = None
-        async for line in self.api_client.stream_generate_content(
-            payload, model, api_key
-        ):
-            if line.startswith("data:"):
-                chunk_str = line[6:]
-                if not chunk_str or chunk_str.isspace():
+        pacer = openai_optimizer.create_pacer()
+
+        def commit_key(key: str):
+            nonlocal api_key
+            api_key = key
+            if on_commit:
+                on_commit(key)
+
+        async for event in self._open_stream(model, payload, api_key, commit_key):
+            try:
+                chunk = event.json()
+                usage_metadata = chunk.get("usageMetadata", {})
+            except ValueError:
+                if event.text.isspace():
                     logger.debug(
                         f"Received empty data line for model {model}, skipping."
                     )
-                    continue
-                try:
-                    chunk = json.loads(chunk_str)
-                    usage_metadata = chunk.get("usageMetadata", {})
-                except json.JSONDecodeError:
+                else:
                     logger.error(
-                        f"Failed to decode JSON from stream for model {model}: {chunk_str}"
+                        f"Failed to decode JSON from stream for model {model}: {event.text}"
                     )
-                    continue
-                openai_chunk = self.response_handler.handle_response(
-                    chunk, model, stream=True, finish_reason=None, usage_metadata=usage_metadata
-                )
-                if openai_chunk:
-                    text = self._extract_text_from_openai_chunk(openai_chunk)
-                    if text and settings.STREAM_OPTIMIZER_ENABLED:
-                        async for (
-                            optimized_chunk_data
-                        ) in openai_optimizer.optimize_stream_output(
-                            text,
-                            lambda t: self._create_char_openai_chunk(openai_chunk, t),
-                            lambda c: f"data: {json.dumps(c)}\n\n",
-                        ):
-                            yield optimized_chunk_data
-                    else:
-                        if openai_chunk.get("choices") and openai_chunk["choices"][0].get("delta", {}).get("tool_calls"):
-                            tool_call_flag = True
+                continue
+            openai_chunk = self.response_handler.handle_response(
+                chunk, model, stream=True, finish_reason=None, usage_metadata=usage_metadata
+            )
+            if progress is not None:
+                progress.record(chunk)
+            if openai_chunk:
+                text = self._extract_text_from_openai_chunk(openai_chunk)
+                if text and settings.STREAM_OPTIMIZER_ENABLED:
+                    async for (
+                        optimized_chunk_data
+                    ) in openai_optimizer.optimize_stream_output(
+                        text,
+                        lambda t: self._create_char_openai_chunk(openai_chunk, t),
+                        lambda c: f"data: {json.dumps(c)}\n\n",
+                        pacer=pacer,
+                        final=has_finish_reason(chunk),
+                    ):
+                        yield optimized_chunk_data
+                else:
+                    if openai_chunk.get("choices") and openai_chunk["choices"][0].get("delta", {}).get("tool_calls"):
+                        tool_call_flag = True
 
-                        yield f"data: {json.dumps(openai_chunk)}\n\n"
+                    yield f"data: {json.dumps(openai_chunk)}\n\n"
 
+        if self.key_manager:
+            await self.key_manager.record_success(api_key, model, usage_metadata)
         if tool_call_flag:
             yield f"data: {json.dumps(self.response_handler.handle_response({}, model, stream=True, finish_reason='tool_calls', usage_metadata=usage_metadata))}\n\n"
         else:
             yield f"data: {json.dumps(self.response_handler.handle_response({}, model, stream=True, finish_reason='stop', usage_metadata=usage_metadata))}\n\n"
 
+    async def _replay_cached_stream(
+        self, model: str, response: Dict[str, Any]
+    ) -> AsyncGenerator[str, None]:
+        """将缓存的完整响应按 OpenAI 流式格式回放"""
+        tool_call_flag = False
+        usage_metadata = response.get("usageMetadata", {})
+        async for chunk in replay_response_chunks(
+            response,
+            settings.RESPONSE_CACHE_REPLAY_CHUNK_SIZE,
+            settings.RESPONSE_CACHE_REPLAY_DELAY_SECONDS,
+        ):
+            openai_chunk = self.response_handler.handle_response(
+                chunk, model, stream=True, finish_reason=None, usage_metadata=usage_metadata
+            )
+            if not openai_chunk:
+                continue
+            if openai_chunk.get("choices") and openai_chunk["choices"][0].get("delta", {}).get("tool_calls"):
+                tool_call_flag = True
+            yield f"data: {json.dumps(openai_chunk)}\n\n"
+        finish_reason = "tool_calls" if tool_call_flag else "stop"
+        yield f"data: {json.dumps(self.response_handler.handle_response({}, model, stream=True, finish_reason=finish_reason, usage_metadata=usage_metadata))}\n\n"
+
     async def _handle_stream_completion(
-        self, model: str, payload: Dict[str, Any], api_key: str
+        self,
+        model: str,
+        payload: Dict[str, Any],
+        api_key: str,
+        cache_control: Optional[str] = None,
     ) -> AsyncGenerator[str, None]:
         """处理流式聊天完成，添加重试逻辑和假流式支持"""
+        cached_response, _ = await lookup_cached_response(model, payload, cache_control)
+        if cached_response is not None:
+            logger.info(f"Replaying cached response as stream for model {model}")
+            if self.key_manager:
+                await self.key_manager.release_request(api_key, model)
+            async for chunk_data in self._replay_cached_stream(model, cached_response):
+                yield chunk_data
+            yield "data: [DONE]\n\n"
+            return
+
         retries = 0
         max_retries = settings.MAX_RETRIES
         is_success = False
         status_code = None
         final_api_key = api_key
 
+        def commit_key(key: str):
+            # 首字节对冲可能改用备份 key
+            nonlocal current_attempt_key
+            current_attempt_key = key
+
+        progress = StreamProgress() if settings.STREAM_RESUME_ENABLED else None
         while retries < max_retries:
             start_time = time.perf_counter()
             request_datetime = datetime.datetime.now()
             current_attempt_key = final_api_key
+            attempt_payload = payload
+            if progress is not None and progress.can_resume:
+                # 已输出部分文本后中断，让模型从中断处继续生成
+                attempt_payload = build_resume_payload(payload, progress.text)
+                logger.info(
+                    f"Resuming stream for model {model} after {len(progress.text)} characters"
+                )
 
             try:
                 stream_generator = None
@@ -489,7 +636,7 @@ class OpenAIChatService:
                         f"Using real stream logic for model: {model}, Attempt: {retries + 1}"
                     )
                     stream_generator = self._real_stream_logic_impl(
-                        model, payload, current_attempt_key
+                        model, attempt_payload, current_attempt_key, commit_key, progress
                     )
 
                 async for chunk_data in stream_generator:
@@ -503,6 +650,12 @@ class OpenAIChatService:
                 status_code = 200
                 break
 
+            except asyncio.CancelledError:
+                # 客户端断开连接，上游流随取消一同关闭，不计为 key 失败
+                logger.info(f"Client disconnected, cancelled streaming for model {model}")
+                is_success = False
+                status_code = CLIENT_CLOSED_REQUEST_STATUS
+                raise
             except Exception as e:
                 retries += 1
                 is_success = False
@@ -529,9 +682,24 @@ class OpenAIChatService:
                     request_msg=payload,
                 )
 
+                if deadline_expired():
+                    logger.error(
+                        f"Request deadline exceeded, ceasing attempts for streaming model {model}."
+                    )
+                    break
+
                 if self.key_manager:
+                    if progress is not None and progress.emitted and not progress.can_resume:
+                        # 重新开始会让客户端收到重复内容，只记录失败，不再申请新 key
+                        await self.key_manager.record_failure(
+                            current_attempt_key, error_log_msg
+                        )
+                        logger.error(
+                            f"Stream for model {model} failed after emitting non-text content, cannot resume."
+                        )
+                        break
                     new_api_key = await self.key_manager.handle_api_failure(
-                        current_attempt_key, retries
+                        current_attempt_key, retries, model, error_log_msg
                     )
                     if new_api_key and new_api_key != current_attempt_key:
                         final_api_key = new_api_key
@@ -0,0 +1,308 @@
+"""
+确定性请求的响应缓存
+
+缓存上游返回的原始 generateContent 响应，键为操作类型、模型和最终 payload 的规范化哈希。
+命中后仍经过响应处理器转换，因此输出格式相关的配置修改后无需清空缓存。
+- 内存层：LRU + TTL，按字节数限制容量
+- 磁盘层（可选）：SQLite 文件，进程重启后仍可命中
+请求可通过 Cache-Control 头跳过缓存：no-cache 不读缓存但写入新结果，no-store 既不读也不写。
+流式请求命中缓存时，将完整响应拆成块按 SSE 格式回放，无需请求上游。
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from app.config.config import settings
+from app.service.chat.single_flight import compute_request_hash, is_deterministic
+
+
+def parse_cache_control(header: Optional[str]) -> Tuple[bool, bool]:
+    """解析请求的 Cache-Control 头，返回 (是否读取缓存, 是否写入缓存)"""
+    if not header:
+        return True, True
+    directives = {}
+    for part in header.split(","):
+        name, _, value = part.strip().partition("=")
+        directives[name.strip().lower()] = value.strip().strip('"')
+    if "no-store" in directives:
+        return False, False
+    if "no-cache" in directives or directives.get("max-age") == "0":
+        return False, True
+    return True, True
+
+
+def split_response_for_replay(
+    response: Dict[str, Any], chunk_size: int = 0
+) -> List[Dict[str, Any]]:
+    """将完整的 generateContent 响应拆成流式响应块
+
+    每个 part 单独成块，文本 part 按 chunk_size 个字符再拆分（0 表示不拆分）。
+    finishReason 等候选信息和 usageMetadata 放在最后一块，与上游流式响应一致。
+    有多个候选时无法按块对齐，整体作为一块返回。
+    """
+    candidates = response.get("candidates") or []
+    if len(candidates) != 1:
+        return [response]
+    candidate = candidates[0]
+    content = candidate.get("content") or {}
+    role = content.get("role", "model")
+    index = candidate.get("index", 0)
+    common = {k: v for k, v in response.items() if k not in ("candidates", "usageMetadata")}
+
+    pieces = []
+    for part in content.get("parts") or []:
+        text = part.get("text")
+        if isinstance(text, str) and chunk_size > 0 and len(text) > chunk_size:
+            pieces.extend(
+                dict(part, text=text[i : i + chunk_size])
+                for i in range(0, len(text), chunk_size)
+            )
+        else:
+            pieces.append(part)
+
+    chunks = [
+        dict(common, candidates=[{"content": {"role": role, "parts": [piece]}, "index": index}])
+        for piece in pieces
+    ] or [dict(common, candidates=[{"content": {"role": role, "parts": []}, "index": index}])]
+    last_candidate = chunks[-1]["candidates"][0]
+    for key, value in candidate.items():
+        if key not in ("content", "index"):
+            last_candidate[key] = value
+    if "usageMetadata" in response:
+        chunks[-1]["usageMetadata"] = response["usageMetadata"]
+    return chunks
+
+
+async def replay_response_chunks(
+    response: Dict[str, Any], chunk_size: int = 0, delay: float = 0.0
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """按块回放缓存的响应，delay 为相邻两块之间的间隔（秒）"""
+    for i, chunk in enumerate(split_response_for_replay(response, chunk_size)):
+        if i and delay > 0:
+            await asyncio.sleep(delay)
+        yield chunk
+
+
+class CacheTier(ABC):
+    """缓存层接口，值为序列化后的字节串"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryCacheTier(CacheTier):
+    """按字节数限制容量的 LRU 内存缓存"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.size_bytes -= len(value)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if key in self._entries:
+            self._remove(key)
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = (value, time.time() + ttl)
+        self.size_bytes += len(value)
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+
+class SqliteCacheTier(CacheTier):
+    """基于 SQLite 文件的磁盘缓存，按最近访问时间淘汰超出容量的条目"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_response_cache_accessed_at "
+                "ON response_cache (accessed_at)"
+            )
+            self._conn.commit()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM response_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM response_cache"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM response_cache ORDER BY accessed_at"
+                ).fetchall()
+                evicted = []
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM response_cache WHERE key = ?", evicted)
+            self._conn.commit()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """内存层 + 可选磁盘层的两级响应缓存"""
+
+    def __init__(
+        self, memory: MemoryCacheTier, disk: Optional[CacheTier] = None, ttl: float = 3600
+    ):
+        self.memory = memory
+        self.disk = disk
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的响应，每次返回新的副本"""
+        value = await self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await self.disk.get(key)
+            if value is not None:
+                await self.memory.set(key, value, self.ttl)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, key: str, response: Dict[str, Any]):
+        value = json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        await self.memory.set(key, value, self.ttl)
+        if self.disk is not None:
+            await self.disk.set(key, value, self.ttl)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取按配置创建的响应缓存，未启用时返回 None"""
+    global _response_cache
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        disk = None
+        if settings.RESPONSE_CACHE_DISK_PATH:
+            disk = SqliteCacheTier(
+                settings.RESPONSE_CACHE_DISK_PATH, settings.RESPONSE_CACHE_DISK_MAX_BYTES
+            )
+        _response_cache = ResponseCache(
+            MemoryCacheTier(settings.RESPONSE_CACHE_MAX_BYTES),
+            disk,
+            settings.RESPONSE_CACHE_TTL_SECONDS,
+        )
+    return _response_cache
+
+
+def close_response_cache():
+    """关闭响应缓存的磁盘层，供应用关闭时调用"""
+    global _response_cache
+    if _response_cache is not None:
+        _response_cache.close()
+        _response_cache = None
+
+
+async def lookup_cached_response(
+    model: str, payload: Dict[str, Any], cache_control: Optional[str] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """查找 generateContent 请求的缓存响应
+
+    Returns:
+        (命中的原始响应, 上游成功后需要写入的缓存键)，不适用缓存时均为 None
+    """
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return None, None
+    if settings.RESPONSE_CACHE_DETERMINISTIC_ONLY and not is_deterministic(payload):
+        return None, None
+    read_cache, write_cache = parse_cache_control(cache_control)
+    cache_key = compute_request_hash("generateContent", model, payload)
+    if read_cache:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached, None
+    return None, cache_key if write_cache else None
+
+
+async def store_cached_response(cache_key: Optional[str], response: Dict[str, Any]):
+    """写入上游返回的原始响应"""
+    response_cache = get_response_cache()
+    if cache_key and response_cache is not None:
+        await response_cache.set(cache_key, response)
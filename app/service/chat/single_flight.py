@@ -0,0 +1,99 @@
+"""
+相同请求合并（single-flight）
+
+多个完全相同的非流式请求同时到达时，只有第一个请求真正发往上游，
+其余请求等待并共享它的结果。第一个请求失败或被取消时，等待中的请求各自独立重新请求，
+避免把失败记到并未使用的 key 上。
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# 首个请求失败时放入 future 的标记
+_FAILED = object()
+
+
+def compute_request_hash(operation: str, model: str, payload: Dict[str, Any]) -> str:
+    """根据操作类型、模型和规范化后的 payload 计算请求哈希"""
+    canonical = json.dumps(
+        payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    digest = hashlib.sha256()
+    digest.update(f"{operation}\n{model}\n".encode("utf-8"))
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_deterministic(payload: Dict[str, Any]) -> bool:
+    """temperature 显式为 0 的请求输出可复用"""
+    generation_config = payload.get("generationConfig") or {}
+    return generation_config.get("temperature") == 0
+
+
+class SingleFlight:
+    """按请求哈希合并进行中的相同调用
+
+    Args:
+        window_seconds: 首个请求完成后结果继续共享的时长，0 表示只合并进行中的请求
+    """
+
+    def __init__(self, window_seconds: float = 0.0):
+        self.window_seconds = window_seconds
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        on_join: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Any:
+        """执行 func，相同 key 的并发调用只执行一次并共享结果
+
+        on_join 在调用直接共享了已有结果、自身没有执行 func 时调用。
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            result = await asyncio.shield(future)
+            if result is not _FAILED:
+                if on_join is not None:
+                    await on_join()
+                return result
+            return await func()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except BaseException:
+            self._forget(key, future)
+            future.set_result(_FAILED)
+            raise
+        future.set_result(result)
+        if self.window_seconds > 0:
+            loop.call_later(self.window_seconds, self._forget, key, future)
+        else:
+            self._forget(key, future)
+        return result
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight(window_seconds: float) -> SingleFlight:
+    """获取全局请求合并器，窗口配置变化时直接生效"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight(window_seconds)
+    _single_flight.window_seconds = window_seconds
+    return _single_flight
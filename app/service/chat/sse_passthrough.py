@@ -0,0 +1,66 @@
+"""
+原生 Gemini 流式响应的直通转发
+
+不需要改写响应内容时，上游 SSE 字节流按完整事件边界原样转发给客户端，不做 JSON 解析和序列化。
+只保留最后一个事件的字节，在流结束时解析一次以读取 usageMetadata 用于用量统计。
+按事件边界转发保证重试时客户端不会收到被截断的半个事件。
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+def _event_end(data: bytes) -> int:
+    """返回最后一个完整事件结束的位置，没有完整事件时返回 -1"""
+    lf = data.rfind(b"\n\n")
+    crlf = data.rfind(b"\r\n\r\n")
+    return max(lf + 2 if lf >= 0 else -1, crlf + 4 if crlf >= 0 else -1)
+
+
+class SsePassthrough:
+    """按事件边界转发 SSE 字节流，并记录最后一个事件"""
+
+    def __init__(self):
+        self._pending = b""
+        self.last_event = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        """输入上游字节块，返回其中可以转发的完整事件（可能为空）"""
+        data = self._pending + chunk if self._pending else chunk
+        end = _event_end(data)
+        if end < 0:
+            self._pending = data
+            return b""
+        complete, self._pending = data[:end], data[end:]
+        # JSON 字符串中的换行会被转义，行首的 data: 一定是事件开始
+        start = complete.rfind(b"\ndata:") + 1
+        if start > 0 or complete.startswith(b"data:"):
+            self.last_event = complete[start:]
+        return complete
+
+    def flush(self) -> bytes:
+        """返回流结束时剩余的不完整数据"""
+        rest, self._pending = self._pending, b""
+        if rest.lstrip().startswith(b"data:"):
+            self.last_event = rest.lstrip()
+        return rest
+
+    async def relay(self, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """转发整个上游流"""
+        async for chunk in stream:
+            data = self.feed(chunk)
+            if data:
+                yield data
+        rest = self.flush()
+        if rest:
+            yield rest
+
+    def usage_metadata(self) -> Optional[Dict[str, Any]]:
+        """解析最后一个事件中的 usageMetadata"""
+        event = self.last_event.strip()
+        if not event.startswith(b"data:"):
+            return None
+        try:
+            return json.loads(event[5:]).get("usageMetadata")
+        except (ValueError, AttributeError):
+            return None
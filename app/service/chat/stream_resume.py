@@ -0,0 +1,60 @@
+"""
+流式请求的断点续传
+
+上游 SSE 连接在已输出部分内容后中断时，重试不再从头生成，而是把已输出的文本作为 model 轮次
+追加到请求末尾，让模型在另一个 key 上接着生成，客户端看到的是一条连续的流。
+只有已输出的内容全部是普通文本时才能续传；输出过函数调用、图片等内容后中断则无法续传。
+"""
+
+from typing import Any, Dict, List
+
+
+class StreamProgress:
+    """记录流式响应中已经发送给客户端的内容"""
+
+    def __init__(self):
+        self._texts: List[str] = []
+        self.emitted = False
+        self.resumable = True
+
+    def record(self, chunk: Dict[str, Any]):
+        """记录一个已输出的上游响应块"""
+        candidates = chunk.get("candidates") or []
+        if not candidates:
+            return
+        self.emitted = True
+        if len(candidates) > 1:
+            self.resumable = False
+            return
+        content = candidates[0].get("content") or {}
+        for part in content.get("parts") or []:
+            if part.get("thought"):
+                # 思考摘要不属于回答正文，续传时不需要
+                continue
+            text = part.get("text")
+            if isinstance(text, str):
+                self._texts.append(text)
+            else:
+                self.resumable = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._texts)
+
+    @property
+    def can_resume(self) -> bool:
+        """已有文本输出且全部是普通文本"""
+        return self.resumable and bool(self._texts)
+
+
+def build_resume_payload(payload: Dict[str, Any], partial_text: str) -> Dict[str, Any]:
+    """在请求末尾追加已生成的文本，让模型从中断处继续生成"""
+    contents = list(payload.get("contents") or [])
+    if contents and contents[-1].get("role") == "model":
+        # 请求本身以 model 轮次结尾（预填充），续传文本接在它后面
+        last = dict(contents[-1])
+        last["parts"] = list(last.get("parts") or []) + [{"text": partial_text}]
+        contents[-1] = last
+    else:
+        contents.append({"role": "model", "parts": [{"text": partial_text}]})
+    return dict(payload, contents=contents)
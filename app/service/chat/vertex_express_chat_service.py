@@ -1,15 +1,17 @@
 # app/services/chat_service.py
 
+import asyncio
 import json
 import re
 import datetime
 import time
 from typing import Any, AsyncGenerator, Dict, List
 from app.config.config import settings
-from app.core.constants import GEMINI_2_FLASH_EXP_SAFETY_SETTINGS
+from app.core.constants import CLIENT_CLOSED_REQUEST_STATUS, GEMINI_2_FLASH_EXP_SAFETY_SETTINGS
 from app.domain.gemini_models import GeminiRequest
 from app.handler.response_handler import GeminiResponseHandler
 from app.handler.stream_optimizer import gemini_optimizer
+from app.handler.stream_pacing import has_finish_reason
 from app.log.logger import get_gemini_logger
 from app.service.client.api_client import GeminiApiClient
 from app.service.key.key_manager import KeyManager
@@ -282,6 +284,7 @@ class GeminiChatService:
         is_success = False
         status_code = None
         final_api_key = api_key
+        pacer = gemini_optimizer.create_pacer()
 
         while retries < max_retries:
             request_datetime = datetime.datetime.now()
@@ -289,34 +292,40 @@ class GeminiChatService:
             current_attempt_key = api_key
             final_api_key = current_attempt_key # Update final key used
             try:
-                async for line in self.api_client.stream_generate_content(
+                async for event in self.api_client.stream_generate_content(
                     payload, model, current_attempt_key
                 ):
-                    # print(line)
-                    if line.startswith("data:"):
-                        line = line[6:]
-                        response_data = self.response_handler.handle_response(
-                            json.loads(line), model, stream=True
-                        )
-                        text = self._extract_text_from_response(response_data)
-                        # 如果有文本内容，且开启了流式输出优化器，则使用流式输出优化器处理
-                        if text and settings.STREAM_OPTIMIZER_ENABLED:
-                            # 使用流式输出优化器处理文本输出
-                            async for (
-                                optimized_chunk
-                            ) in gemini_optimizer.optimize_stream_output(
-                                text,
-                                lambda t: self._create_char_response(response_data, t),
-                                lambda c: "data: " + json.dumps(c) + "\n\n",
-                            ):
-                                yield optimized_chunk
-                        else:
-                            # 如果没有文本内容（如工具调用等），整块输出
-                            yield "data: " + json.dumps(response_data) + "\n\n"
+                    chunk = event.json()
+                    response_data = self.response_handler.handle_response(
+                        chunk, model, stream=True
+                    )
+                    text = self._extract_text_from_response(response_data)
+                    # 如果有文本内容，且开启了流式输出优化器，则使用流式输出优化器处理
+                    if text and settings.STREAM_OPTIMIZER_ENABLED:
+                        # 使用流式输出优化器处理文本输出
+                        async for (
+                            optimized_chunk
+                        ) in gemini_optimizer.optimize_stream_output(
+                            text,
+                            lambda t: self._create_char_response(response_data, t),
+                            lambda c: "data: " + json.dumps(c) + "\n\n",
+                            pacer=pacer,
+                            final=has_finish_reason(chunk),
+                        ):
+                            yield optimized_chunk
+                    else:
+                        # 如果没有文本内容（如工具调用等），整块输出
+                        yield "data: " + json.dumps(response_data) + "\n\n"
                 logger.info("Streaming completed successfully")
                 is_success = True
                 status_code = 200
                 break
+            except asyncio.CancelledError:
+                # 客户端断开连接，上游流随取消一同关闭，不计为 key 失败
+                logger.info(f"Client disconnected, cancelled streaming for model {model}")
+                is_success = False
+                status_code = CLIENT_CLOSED_REQUEST_STATUS
+                raise
             except Exception as e:
                 retries += 1
                 is_success = False
@@ -3,12 +3,58 @@
 from typing import Dict, Any, AsyncGenerator, Optional
 import httpx
 import random
+from urllib.parse import urlparse
 from abc import ABC, abstractmethod
 from app.config.config import settings
 from app.log.logger import get_api_client_logger
-from app.core.constants import DEFAULT_TIMEOUT
+from app.core.constants import (
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+    DEFAULT_MODELS_TIMEOUT,
+    DEFAULT_TIMEOUT,
+)
+from app.service.client.deadline import (
+    DeadlineExceeded,
+    compute_attempt_timeout,
+    deadline_expired,
+    iterate_with_deadline,
+)
+from app.service.client.http_client_registry import get_http_client
+from app.service.client.latency import get_latency_tracker
+from app.service.client.sse import SseEvent, iter_sse_events
+from app.service.key.inflight import get_inflight_tracker
 
 logger = get_api_client_logger()
+_inflight = get_inflight_tracker()
+
+
+def _select_proxy(api_key: str) -> Optional[str]:
+    """根据配置为指定 API key 选择代理"""
+    if not settings.PROXIES:
+        return None
+    if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
+        return settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
+    return random.choice(settings.PROXIES)
+
+
+def _attempt_timeout(timeout: float, model: Optional[str] = None) -> httpx.Timeout:
+    """单次上游调用的超时
+
+    开启自适应超时且给出模型时，按该模型近期延迟的百分位收紧；结果不超过当前请求剩余的时间预算。
+    """
+    latency = None
+    if model and settings.ADAPTIVE_TIMEOUT_ENABLED:
+        tracker = get_latency_tracker()
+        if tracker.sample_count(model) >= ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            latency = tracker.percentile(model, settings.ADAPTIVE_TIMEOUT_PERCENTILE)
+    return httpx.Timeout(
+        compute_attempt_timeout(
+            timeout,
+            latency,
+            settings.ADAPTIVE_TIMEOUT_MULTIPLIER,
+            settings.ADAPTIVE_TIMEOUT_MIN_SECONDS,
+        )
+    )
+
 
 class ApiClient(ABC):
     """API客户端基类"""
@@ -18,7 +64,7 @@ class ApiClient(ABC):
         pass
 
     @abstractmethod
-    async def stream_generate_content(self, payload: Dict[str, Any], model: str, api_key: str) -> AsyncGenerator[str, None]:
+    async def stream_generate_content(self, payload: Dict[str, Any], model: str, api_key: str) -> AsyncGenerator[SseEvent, None]:
         pass
 
 
@@ -28,6 +74,7 @@ class GeminiApiClient(ApiClient):
     def __init__(self, base_url: str, timeout: int = DEFAULT_TIMEOUT):
         self.base_url = base_url
         self.timeout = timeout
+        self.upstream_host = urlparse(base_url).netloc
 
     def _get_real_model(self, model: str) -> str:
         if model.endswith("-search"):
@@ -49,117 +96,141 @@ class GeminiApiClient(ApiClient):
 
     async def get_models(self, api_key: str) -> Optional[Dict[str, Any]]:
         """获取可用的 Gemini 模型列表"""
-        timeout = httpx.Timeout(timeout=5)
-        
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers()
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/models?key={api_key}&pageSize=1000"
-            try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                logger.error(f"获取模型列表失败: {e.response.status_code}")
-                logger.error(e.response.text)
-                return None
-            except httpx.RequestError as e:
-                logger.error(f"请求模型列表失败: {e}")
-                return None
-            
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/models?key={api_key}&pageSize=1000"
+        try:
+            response = await client.get(url, headers=headers, timeout=DEFAULT_MODELS_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"获取模型列表失败: {e.response.status_code}")
+            logger.error(e.response.text)
+            return None
+        except httpx.RequestError as e:
+            logger.error(f"请求模型列表失败: {e}")
+            return None
+
     async def generate_content(self, payload: Dict[str, Any], model: str, api_key: str) -> Dict[str, Any]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
+        timeout = _attempt_timeout(self.timeout, model)
         model = self._get_real_model(model)
-        
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
-            
+
         headers = self._prepare_headers()
-        
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/models/{model}:generateContent?key={api_key}"
-            
-            try:
-                response = await client.post(url, json=payload, headers=headers)
-                
-                if response.status_code != 200:
-                    error_content = response.text
-                    logger.error(f"API call failed - Status: {response.status_code}, Content: {error_content}")
-                    raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
-                
-                response_data = response.json()
-                
-                # 检查响应结构的基本信息
-                if not response_data.get("candidates"):
-                    logger.warning("No candidates found in API response")
-                
-                return response_data
-                
-            except httpx.TimeoutException as e:
-                logger.error(f"Request timeout: {e}")
-                raise Exception(f"Request timeout: {e}")
-            except httpx.RequestError as e:
-                logger.error(f"Request error: {e}")
-                raise Exception(f"Request error: {e}")
-            except Exception as e:
-                logger.error(f"Unexpected error: {e}")
-                raise
-
-    async def stream_generate_content(self, payload: Dict[str, Any], model: str, api_key: str) -> AsyncGenerator[str, None]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/models/{model}:generateContent?key={api_key}"
+
+        try:
+            with _inflight.track(api_key):
+                response = await client.post(url, json=payload, headers=headers, timeout=timeout)
+
+            if response.status_code != 200:
+                error_content = response.text
+                logger.error(f"API call failed - Status: {response.status_code}, Content: {error_content}")
+                raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
+
+            response_data = response.json()
+
+            # 检查响应结构的基本信息
+            if not response_data.get("candidates"):
+                logger.warning("No candidates found in API response")
+
+            return response_data
+
+        except httpx.TimeoutException as e:
+            logger.error(f"Request timeout: {e}")
+            if deadline_expired():
+                raise DeadlineExceeded() from e
+            raise Exception(f"Request timeout: {e}")
+        except httpx.RequestError as e:
+            logger.error(f"Request error: {e}")
+            raise Exception(f"Request error: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            raise
+
+    async def stream_generate_content(self, payload: Dict[str, Any], model: str, api_key: str) -> AsyncGenerator[SseEvent, None]:
+        """流式生成内容，返回解析后的 SSE 事件"""
+        # 流式响应的总时长无法由延迟样本估计，只受请求截止时间限制
+        timeout = _attempt_timeout(self.timeout)
         model = self._get_real_model(model)
-        
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers()
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
-            async with client.stream(method="POST", url=url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_content = await response.aread()
-                    error_msg = error_content.decode("utf-8")
-                    raise Exception(f"API call failed with status code {response.status_code}, {error_msg}")
-                async for line in response.aiter_lines():
-                    yield line
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
+        try:
+            with _inflight.track(api_key):
+                async with client.stream(
+                    method="POST", url=url, json=payload, headers=headers, timeout=timeout
+                ) as response:
+                    if response.status_code != 200:
+                        error_content = await response.aread()
+                        error_msg = error_content.decode("utf-8")
+                        raise Exception(f"API call failed with status code {response.status_code}, {error_msg}")
+                    async for event in iter_sse_events(
+                        iterate_with_deadline(response.aiter_bytes())
+                    ):
+                        yield event
+        except httpx.TimeoutException as e:
+            if deadline_expired():
+                raise DeadlineExceeded() from e
+            raise
+
+    async def stream_generate_content_raw(self, payload: Dict[str, Any], model: str, api_key: str) -> AsyncGenerator[bytes, None]:
+        """流式生成内容，直接返回上游 SSE 字节块，不做解码和分行"""
+        timeout = _attempt_timeout(self.timeout)
+        model = self._get_real_model(model)
+
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
+            logger.info(f"Using proxy for getting models: {proxy_to_use}")
+
+        headers = self._prepare_headers()
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
+        try:
+            with _inflight.track(api_key):
+                async with client.stream(
+                    method="POST", url=url, json=payload, headers=headers, timeout=timeout
+                ) as response:
+                    if response.status_code != 200:
+                        error_content = await response.aread()
+                        error_msg = error_content.decode("utf-8")
+                        raise Exception(f"API call failed with status code {response.status_code}, {error_msg}")
+                    async for chunk in iterate_with_deadline(response.aiter_bytes()):
+                        yield chunk
+        except httpx.TimeoutException as e:
+            if deadline_expired():
+                raise DeadlineExceeded() from e
+            raise
 
     async def count_tokens(self, payload: Dict[str, Any], model: str, api_key: str) -> Dict[str, Any]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
+        timeout = _attempt_timeout(self.timeout)
         model = self._get_real_model(model)
 
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for counting tokens: {proxy_to_use}")
 
         headers = self._prepare_headers()
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/models/{model}:countTokens?key={api_key}"
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                error_content = response.text
-                raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
-            return response.json()
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/models/{model}:countTokens?key={api_key}"
+        response = await client.post(url, json=payload, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            error_content = response.text
+            raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
+        return response.json()
 
 
 class OpenaiApiClient(ApiClient):
@@ -168,7 +239,8 @@ class OpenaiApiClient(ApiClient):
     def __init__(self, base_url: str, timeout: int = DEFAULT_TIMEOUT):
         self.base_url = base_url
         self.timeout = timeout
-        
+        self.upstream_host = urlparse(base_url).netloc
+
     def _prepare_headers(self, api_key: str) -> Dict[str, str]:
         headers = {"Authorization": f"Bearer {api_key}"}
         if settings.CUSTOM_HEADERS:
@@ -177,106 +249,92 @@ class OpenaiApiClient(ApiClient):
         return headers
 
     async def get_models(self, api_key: str) -> Dict[str, Any]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
-
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers(api_key)
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/openai/models"
-            response = await client.get(url, headers=headers)
-            if response.status_code != 200:
-                error_content = response.text
-                raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
-            return response.json()
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/openai/models"
+        response = await client.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code != 200:
+            error_content = response.text
+            raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
+        return response.json()
 
     async def generate_content(self, payload: Dict[str, Any], api_key: str) -> Dict[str, Any]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
         logger.info(f"settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY: {settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY}")
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers(api_key)
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/openai/chat/completions"
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                error_content = response.text
-                raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
-            return response.json()
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/openai/chat/completions"
+        timeout = _attempt_timeout(self.timeout, payload.get("model"))
+        with _inflight.track(api_key):
+            response = await client.post(url, json=payload, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            error_content = response.text
+            raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
+        return response.json()
 
-    async def stream_generate_content(self, payload: Dict[str, Any], api_key: str) -> AsyncGenerator[str, None]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+    async def stream_generate_content(self, payload: Dict[str, Any], api_key: str) -> AsyncGenerator[SseEvent, None]:
+        """流式聊天补全，返回解析后的 SSE 事件"""
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers(api_key)
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/openai/chat/completions"
-            async with client.stream(method="POST", url=url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_content = await response.aread()
-                    error_msg = error_content.decode("utf-8")
-                    raise Exception(f"API call failed with status code {response.status_code}, {error_msg}")
-                async for line in response.aiter_lines():
-                    yield line
-    
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/openai/chat/completions"
+        timeout = _attempt_timeout(self.timeout)
+        try:
+            with _inflight.track(api_key):
+                async with client.stream(
+                    method="POST", url=url, json=payload, headers=headers, timeout=timeout
+                ) as response:
+                    if response.status_code != 200:
+                        error_content = await response.aread()
+                        error_msg = error_content.decode("utf-8")
+                        raise Exception(f"API call failed with status code {response.status_code}, {error_msg}")
+                    async for event in iter_sse_events(
+                        iterate_with_deadline(response.aiter_bytes())
+                    ):
+                        yield event
+        except httpx.TimeoutException as e:
+            if deadline_expired():
+                raise DeadlineExceeded() from e
+            raise
+
     async def create_embeddings(self, input: str, model: str, api_key: str) -> Dict[str, Any]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
-        
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers(api_key)
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/openai/embeddings"
-            payload = {
-                "input": input,
-                "model": model,
-            }
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                error_content = response.text
-                raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
-            return response.json()
-                    
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/openai/embeddings"
+        payload = {
+            "input": input,
+            "model": model,
+        }
+        response = await client.post(url, json=payload, headers=headers, timeout=self.timeout)
+        if response.status_code != 200:
+            error_content = response.text
+            raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
+        return response.json()
+
     async def generate_images(self, payload: Dict[str, Any], api_key: str) -> Dict[str, Any]:
-        timeout = httpx.Timeout(self.timeout, read=self.timeout)
-
-        proxy_to_use = None
-        if settings.PROXIES:
-            if settings.PROXIES_USE_CONSISTENCY_HASH_BY_API_KEY:
-                proxy_to_use = settings.PROXIES[hash(api_key) % len(settings.PROXIES)]
-            else:
-                proxy_to_use = random.choice(settings.PROXIES)
+        proxy_to_use = _select_proxy(api_key)
+        if proxy_to_use:
             logger.info(f"Using proxy for getting models: {proxy_to_use}")
 
         headers = self._prepare_headers(api_key)
-        async with httpx.AsyncClient(timeout=timeout, proxy=proxy_to_use) as client:
-            url = f"{self.base_url}/openai/images/generations"
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                error_content = response.text
-                raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
-            return response.json()
\ No newline at end of file
+        client = await get_http_client(proxy_to_use, self.upstream_host)
+        url = f"{self.base_url}/openai/images/generations"
+        response = await client.post(url, json=payload, headers=headers, timeout=self.timeout)
+        if response.status_code != 200:
+            error_content = response.text
+            raise Exception(f"API call failed with status code {response.status_code}, {error_content}")
+        return response.json()
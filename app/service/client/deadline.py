@@ -0,0 +1,129 @@
+"""
+请求截止时间与自适应超时
+
+中间件在请求进入时根据客户端请求头和默认配置创建截止时间，放入上下文变量；
+路由的重试处理器再按目标模型的配置收紧截止时间。每次上游调用只获得剩余的时间预算，
+截止时间到达后不再重试，请求不会比调用方愿意等待的时间更长。
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import AsyncIterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """请求截止时间已到"""
+
+    def __init__(self):
+        super().__init__("Request deadline exceeded, status code 504")
+
+
+class Deadline:
+    """单个请求的截止时间，timeout 为空或不大于 0 时表示不限制"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.expires_at: Optional[float] = None
+        self.tighten(timeout)
+
+    def tighten(self, timeout: Optional[float]):
+        """将截止时间收紧到从现在起 timeout 秒以内，不会放宽已有的截止时间"""
+        if not timeout or timeout <= 0:
+            return
+        expires_at = time.monotonic() + timeout
+        if self.expires_at is None or expires_at < self.expires_at:
+            self.expires_at = expires_at
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，不限制时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def start_request_deadline(timeout: Optional[float] = None) -> Deadline:
+    """为当前请求创建截止时间，之后在同一上下文中的调用都受它约束"""
+    deadline = Deadline(timeout)
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def get_request_deadline() -> Optional[Deadline]:
+    """获取当前请求的截止时间，不在请求上下文中时返回 None"""
+    return _current_deadline.get()
+
+
+def deadline_expired() -> bool:
+    """当前请求的截止时间是否已到"""
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.expired
+
+
+def parse_timeout_header(value: Optional[str]) -> Optional[float]:
+    """解析客户端的超时请求头，支持秒数（如 30、1.5）以及带 ms/s 后缀的写法"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    scale = 1.0
+    if value.endswith("ms"):
+        value, scale = value[:-2], 0.001
+    elif value.endswith("s"):
+        value = value[:-1]
+    try:
+        timeout = float(value) * scale
+    except ValueError:
+        return None
+    return timeout if timeout > 0 else None
+
+
+def compute_attempt_timeout(
+    base_timeout: float,
+    latency: Optional[float] = None,
+    multiplier: float = 1.0,
+    min_timeout: float = 0.0,
+) -> float:
+    """计算单次上游调用的超时
+
+    latency 为该模型近期延迟的百分位，给出时超时取 latency * multiplier（不低于 min_timeout、
+    不超过 base_timeout）。结果再受当前请求剩余时间限制，截止时间已到时抛出 DeadlineExceeded。
+    """
+    timeout = base_timeout
+    if latency is not None:
+        timeout = min(base_timeout, max(min_timeout, latency * multiplier))
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        remaining = deadline.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded()
+            timeout = min(timeout, remaining)
+    return timeout
+
+
+async def iterate_with_deadline(iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+    """迭代上游流，当前请求的截止时间到达时中断并抛出 DeadlineExceeded"""
+    deadline = _current_deadline.get()
+    if deadline is None or deadline.expires_at is None:
+        async for item in iterator:
+            yield item
+        return
+    iterator = iterator.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), deadline.remaining())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+        yield item
@@ -0,0 +1,192 @@
+"""
+上游 HTTP 客户端注册表
+
+按代理复用长连接的 httpx.AsyncClient，避免每次请求都重新进行 TCP/TLS 握手。
+启用 HTTP/2 时按上游主机拆分连接池，使并发流在少量连接上多路复用，每个主机一份连接预算。
+超时不参与客户端的划分，由调用方在每次请求时通过 timeout 参数传入。
+客户端的生命周期由应用的 lifespan 管理，关闭时统一释放连接。
+"""
+
+import asyncio
+import importlib.util
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config.config import settings
+from app.core.constants import DEFAULT_TIMEOUT
+from app.log.logger import get_api_client_logger
+
+logger = get_api_client_logger()
+
+ClientKey = Tuple[Optional[str], Optional[str], bool]
+
+_REQUEST_COUNT_PATTERN = re.compile(r"Request Count: (\d+)")
+
+
+def _is_http2_available() -> bool:
+    """检查是否安装了 HTTP/2 所需的 h2 依赖"""
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClientRegistry:
+    """共享的 httpx.AsyncClient 注册表"""
+
+    def __init__(self):
+        self._clients: Dict[ClientKey, httpx.AsyncClient] = {}
+        self._lock = asyncio.Lock()
+        self._http2_unavailable_logged = False
+
+    def _use_http2(self) -> bool:
+        if not settings.UPSTREAM_HTTP2_ENABLED:
+            return False
+        if _is_http2_available():
+            return True
+        if not self._http2_unavailable_logged:
+            logger.warning(
+                "UPSTREAM_HTTP2_ENABLED is set but the 'h2' package is not installed. Falling back to HTTP/1.1."
+            )
+            self._http2_unavailable_logged = True
+        return False
+
+    @staticmethod
+    def _build_limits(http2: bool) -> httpx.Limits:
+        if http2:
+            # HTTP/2 下每个连接承载多个并发流，连接数按每个上游主机的预算限制
+            max_connections = settings.UPSTREAM_HTTP2_MAX_CONNECTIONS_PER_HOST
+            return httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            )
+        return httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+        )
+
+    async def get_client(
+        self,
+        proxy: Optional[str] = None,
+        host: Optional[str] = None,
+    ) -> httpx.AsyncClient:
+        """获取指定代理的共享客户端，不存在时创建
+
+        客户端只带默认超时 DEFAULT_TIMEOUT，调用方应在每次请求时传入 timeout。
+
+        Args:
+            proxy: 代理地址
+            host: 上游主机，仅在启用 HTTP/2 时用于按主机拆分连接池
+        """
+        http2 = self._use_http2()
+        key = (proxy, host if http2 else None, http2)
+        client = self._clients.get(key)
+        if client is not None and not client.is_closed:
+            return client
+
+        async with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(DEFAULT_TIMEOUT),
+                    proxy=proxy,
+                    limits=self._build_limits(http2),
+                    http2=http2,
+                )
+                self._clients[key] = client
+                logger.info(
+                    f"Created pooled HTTP client (proxy={proxy}, host={key[1]}, http2={http2}). Total clients: {len(self._clients)}"
+                )
+            return client
+
+    @staticmethod
+    def _iter_pools(client: httpx.AsyncClient):
+        """遍历客户端底层的 httpcore 连接池（包括代理挂载的传输）"""
+        transports = [getattr(client, "_transport", None)]
+        transports.extend(getattr(client, "_mounts", {}).values())
+        for transport in transports:
+            pool = getattr(transport, "_pool", None)
+            if pool is not None:
+                yield pool
+
+    @staticmethod
+    def _describe_connection(connection: Any) -> Dict[str, Any]:
+        info = connection.info()
+        http_version = "HTTP/2" if "HTTP/2" in info else (
+            "HTTP/1.1" if "HTTP/1.1" in info else "UNKNOWN"
+        )
+        match = _REQUEST_COUNT_PATTERN.search(info)
+        request_count = int(match.group(1)) if match else 0
+        if http_version == "HTTP/2":
+            # HTTP/2 连接的 Request Count 即当前打开的流数量
+            active_streams = request_count
+        else:
+            active_streams = 1 if "ACTIVE" in info else 0
+        return {
+            "info": info,
+            "http_version": http_version,
+            "active_streams": active_streams,
+        }
+
+    def get_connection_stats(self) -> List[Dict[str, Any]]:
+        """获取每个共享客户端的连接及流数量统计"""
+        stats = []
+        for (proxy, host, http2), client in list(self._clients.items()):
+            if client.is_closed:
+                continue
+            connections = []
+            for pool in self._iter_pools(client):
+                connections.extend(
+                    self._describe_connection(conn) for conn in pool.connections
+                )
+            stats.append(
+                {
+                    "proxy": proxy,
+                    "host": host,
+                    "http2": http2,
+                    "connection_count": len(connections),
+                    "active_streams": sum(c["active_streams"] for c in connections),
+                    "connections": connections,
+                }
+            )
+        return stats
+
+    async def close_all(self):
+        """关闭所有共享客户端"""
+        async with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing pooled HTTP client: {e}")
+        if clients:
+            logger.info(f"Closed {len(clients)} pooled HTTP clients.")
+
+
+_registry_instance: Optional[HttpClientRegistry] = None
+
+
+def get_http_client_registry() -> HttpClientRegistry:
+    """获取 HTTP 客户端注册表单例"""
+    global _registry_instance
+    if _registry_instance is None:
+        _registry_instance = HttpClientRegistry()
+    return _registry_instance
+
+
+async def get_http_client(
+    proxy: Optional[str] = None,
+    host: Optional[str] = None,
+) -> httpx.AsyncClient:
+    """获取共享的 httpx.AsyncClient，超时需在每次请求时传入"""
+    return await get_http_client_registry().get_client(proxy, host)
+
+
+async def close_http_clients():
+    """关闭并清空所有共享客户端，供应用关闭时调用"""
+    global _registry_instance
+    if _registry_instance is not None:
+        await _registry_instance.close_all()
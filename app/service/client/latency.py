@@ -0,0 +1,43 @@
+"""
+上游请求延迟记录
+
+按模型记录最近若干次成功请求的延迟，供对冲请求的延迟阈值和自适应超时使用。
+"""
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """按模型记录最近若干次成功请求的延迟"""
+
+    def __init__(self, window_size: int = 200):
+        self.window_size = window_size
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, latency: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = deque(maxlen=self.window_size)
+            self._samples[model] = samples
+        samples.append(latency)
+
+    def sample_count(self, model: str) -> int:
+        return len(self._samples.get(model, ()))
+
+    def percentile(self, model: str, percent: float) -> Optional[float]:
+        """返回最近延迟的百分位数（最近秩法），没有样本时返回 None"""
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(0, min(len(ordered) - 1, int(len(ordered) * percent / 100.0 + 0.5) - 1))
+        return ordered[rank]
+
+
+_latency_tracker = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """获取全局延迟记录器"""
+    return _latency_tracker
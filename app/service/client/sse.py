@@ -0,0 +1,143 @@
+"""
+字节级 SSE 事件解析
+
+直接在上游返回的字节块上按行切分，不先解码为字符串：
+- 支持 \\n 与 \\r\\n 换行、以冒号开头的注释行、event:/id: 字段以及多行 data: 事件
+- 只有一行 data 的事件（Gemini/OpenAI 的常见情况）以 memoryview 切片返回，不复制数据
+- 安装了 orjson 时直接从 memoryview 解码 JSON，否则退回标准库 json
+"""
+
+import json
+from typing import Any, AsyncIterator, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库
+    orjson = None
+
+_LF = 0x0A
+_CR = 0x0D
+_COLON = 0x3A
+_SPACE = 0x20
+
+
+def loads(data: Union[bytes, memoryview, str]) -> Any:
+    """解析 JSON，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+class SseEvent:
+    """一个 SSE 事件"""
+
+    __slots__ = ("data", "event", "id")
+
+    def __init__(
+        self,
+        data: Union[bytes, memoryview],
+        event: Optional[str] = None,
+        id: Optional[str] = None,
+    ):
+        self.data = data
+        self.event = event
+        self.id = id
+
+    def json(self) -> Any:
+        """将 data 解析为 JSON"""
+        return loads(self.data)
+
+    @property
+    def text(self) -> str:
+        return bytes(self.data).decode("utf-8", errors="replace")
+
+    @property
+    def is_done(self) -> bool:
+        """OpenAI 格式的流结束标记"""
+        return self.data == b"[DONE]"
+
+    def encode(self) -> bytes:
+        """重新编码为只含 data 字段的 SSE 事件"""
+        data = bytes(self.data)
+        if b"\n" not in data:
+            return b"data: " + data + b"\n\n"
+        return b"".join(b"data: " + line + b"\n" for line in data.split(b"\n")) + b"\n"
+
+    def __repr__(self) -> str:
+        return f"SseEvent(data={bytes(self.data)!r}, event={self.event!r}, id={self.id!r})"
+
+
+class SseParser:
+    """增量 SSE 解析器，每次输入一个字节块，返回其中已完整的事件"""
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: List[memoryview] = []
+        self._event: Optional[str] = None
+        self._id: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[SseEvent]:
+        buf = self._buffer + chunk if self._buffer else chunk
+        view = memoryview(buf)
+        events: List[SseEvent] = []
+        pos = 0
+        while True:
+            end = buf.find(b"\n", pos)
+            if end < 0:
+                break
+            line_end = end - 1 if end > pos and buf[end - 1] == _CR else end
+            self._process_line(buf, view, pos, line_end, events)
+            pos = end + 1
+        self._buffer = buf[pos:]
+        return events
+
+    def flush(self) -> List[SseEvent]:
+        """流结束时处理剩余数据，最后一个事件缺少结尾空行时仍然返回"""
+        events: List[SseEvent] = []
+        buf, self._buffer = self._buffer, b""
+        if buf:
+            line_end = len(buf) - 1 if buf[-1] == _CR else len(buf)
+            self._process_line(buf, memoryview(buf), 0, line_end, events)
+        self._dispatch(events)
+        return events
+
+    def _process_line(
+        self, buf: bytes, view: memoryview, start: int, end: int, events: List[SseEvent]
+    ):
+        if start == end:
+            self._dispatch(events)
+            return
+        if buf[start] == _COLON:
+            return
+        colon = buf.find(b":", start, end)
+        if colon < 0:
+            field, value_start = buf[start:end], end
+        else:
+            field, value_start = buf[start:colon], colon + 1
+            if value_start < end and buf[value_start] == _SPACE:
+                value_start += 1
+        if field == b"data":
+            self._data.append(view[value_start:end])
+        elif field == b"event":
+            self._event = buf[value_start:end].decode("utf-8", errors="replace")
+        elif field == b"id":
+            self._id = buf[value_start:end].decode("utf-8", errors="replace")
+
+    def _dispatch(self, events: List[SseEvent]):
+        if self._data:
+            data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+            events.append(SseEvent(data, self._event, self._id))
+            self._data = []
+        self._event = None
+
+
+async def iter_sse_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[SseEvent]:
+    """将字节块流解析为 SSE 事件流"""
+    parser = SseParser()
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            yield event
+    for event in parser.flush():
+        yield event
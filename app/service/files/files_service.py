@@ -2,12 +2,11 @@
 文件管理服务
 """
 import json
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, Tuple
-from httpx import AsyncClient
-import asyncio
 
 from app.config.config import settings
+from app.core.constants import DEFAULT_FILES_TIMEOUT
 from app.database import services as db_services
 from app.database.models import FileState
 from app.domain.file_models import FileMetadata, ListFilesResponse
@@ -15,13 +14,14 @@ from fastapi import HTTPException
 from app.log.logger import get_files_logger
 from app.utils.helpers import redact_key_for_logging
 from app.service.client.api_client import GeminiApiClient
-from app.service.key.key_manager import get_key_manager_instance
+from app.service.client.http_client_registry import get_http_client
+from app.service.key.key_manager import get_key_manager_instance, get_key_state_backend
 
 logger = get_files_logger()
 
-# 全局上傳會話存儲
-_upload_sessions: Dict[str, Dict[str, Any]] = {}
-_upload_sessions_lock = asyncio.Lock()
+# 上傳會話存儲在 key 狀態共享後端中，多個 worker 之間共享
+_UPLOAD_SESSION_PREFIX = "upload_session:"
+_UPLOAD_SESSION_TTL_SECONDS = 3600  # 會話超過1小時過期
 
 
 class FilesService:
@@ -67,159 +67,147 @@ class FilesService:
                 raise HTTPException(status_code=503, detail="No available API keys")
             
             # 转发请求到真实的 Gemini API
-            async with AsyncClient() as client:
-                # 准备请求头
-                forward_headers = {
-                    "X-Goog-Upload-Protocol": headers.get("x-goog-upload-protocol", "resumable"),
-                    "X-Goog-Upload-Command": headers.get("x-goog-upload-command", "start"),
-                    "Content-Type": headers.get("content-type", "application/json"),
-                }
-                
-                # 添加其他必要的头
-                if "x-goog-upload-header-content-length" in headers:
-                    forward_headers["X-Goog-Upload-Header-Content-Length"] = headers["x-goog-upload-header-content-length"]
-                if "x-goog-upload-header-content-type" in headers:
-                    forward_headers["X-Goog-Upload-Header-Content-Type"] = headers["x-goog-upload-header-content-type"]
+            client = await get_http_client()
+            # 准备请求头
+            forward_headers = {
+                "X-Goog-Upload-Protocol": headers.get("x-goog-upload-protocol", "resumable"),
+                "X-Goog-Upload-Command": headers.get("x-goog-upload-command", "start"),
+                "Content-Type": headers.get("content-type", "application/json"),
+            }
+            
+            # 添加其他必要的头
+            if "x-goog-upload-header-content-length" in headers:
+                forward_headers["X-Goog-Upload-Header-Content-Length"] = headers["x-goog-upload-header-content-length"]
+            if "x-goog-upload-header-content-type" in headers:
+                forward_headers["X-Goog-Upload-Header-Content-Type"] = headers["x-goog-upload-header-content-type"]
+            
+            # 发送请求
+            response = await client.post(
+                "https://generativelanguage.googleapis.com/upload/v1beta/files",
+                headers=forward_headers,
+                content=body,
+                params={"key": api_key},
+                timeout=DEFAULT_FILES_TIMEOUT
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Upload initialization failed: {response.status_code} - {response.text}")
+                raise HTTPException(status_code=response.status_code, detail="Upload initialization failed")
+            
+            # 获取上传 URL
+            upload_url = response.headers.get("x-goog-upload-url")
+            if not upload_url:
+                raise HTTPException(status_code=500, detail="No upload URL in response")
+            
+            logger.info(f"Original upload URL from Google: {upload_url}")
                 
-                # 发送请求
-                response = await client.post(
-                    "https://generativelanguage.googleapis.com/upload/v1beta/files",
-                    headers=forward_headers,
-                    content=body,
-                    params={"key": api_key}
+            
+            # 儲存上傳資訊到 headers 中，供後續使用
+            # 不在這裡創建數據庫記錄，等到上傳完成後再創建
+            logger.info(f"Upload initialized with API key: {redact_key_for_logging(api_key)}")
+            
+            # 解析响应 - 初始化响应可能是空的
+            response_data = {}
+            
+            # 從請求體中解析文件信息（如果有）
+            display_name = ""
+            if body:
+                try:
+                    request_data = json.loads(body)
+                    display_name = request_data.get("displayName", "")
+                except Exception:
+                    pass
+            # 從 upload URL 中提取 upload_id
+            import urllib.parse
+            parsed_url = urllib.parse.urlparse(upload_url)
+            query_params = urllib.parse.parse_qs(parsed_url.query)
+            upload_id = query_params.get('upload_id', [None])[0]
+            
+            if upload_id:
+                # 儲存上傳會話信息，使用 upload_id 作為 key
+                session = {
+                    "api_key": api_key,
+                    "user_token": user_token,
+                    "display_name": display_name,
+                    "mime_type": headers.get("x-goog-upload-header-content-type", "application/octet-stream"),
+                    "size_bytes": int(headers.get("x-goog-upload-header-content-length", "0")),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "upload_url": upload_url
+                }
+                # 過期的會話由共享後端按 TTL 自動清理
+                await get_key_state_backend().set(
+                    _UPLOAD_SESSION_PREFIX + upload_id,
+                    json.dumps(session),
+                    ttl=_UPLOAD_SESSION_TTL_SECONDS,
                 )
+                logger.info(f"Stored upload session for upload_id={upload_id}: api_key={redact_key_for_logging(api_key)}")
+            else:
+                logger.warning(f"No upload_id found in upload URL: {upload_url}")
+            
+            # 替換 Google 的 URL 為我們的代理 URL
+            proxy_upload_url = upload_url
+            if request_host:
+                # 原始: https://generativelanguage.googleapis.com/upload/v1beta/files?key=AIzaSyDc...&upload_id=xxx&upload_protocol=resumable
+                # 替換為: http://request-host/upload/v1beta/files?key=sk-123456&upload_id=xxx&upload_protocol=resumable
                 
-                if response.status_code != 200:
-                    logger.error(f"Upload initialization failed: {response.status_code} - {response.text}")
-                    raise HTTPException(status_code=response.status_code, detail="Upload initialization failed")
-                
-                # 获取上传 URL
-                upload_url = response.headers.get("x-goog-upload-url")
-                if not upload_url:
-                    raise HTTPException(status_code=500, detail="No upload URL in response")
-                
-                logger.info(f"Original upload URL from Google: {upload_url}")
-                    
-                
-                # 儲存上傳資訊到 headers 中，供後續使用
-                # 不在這裡創建數據庫記錄，等到上傳完成後再創建
-                logger.info(f"Upload initialized with API key: {redact_key_for_logging(api_key)}")
-                
-                # 解析响应 - 初始化响应可能是空的
-                response_data = {}
-                
-                # 從請求體中解析文件信息（如果有）
-                display_name = ""
-                if body:
-                    try:
-                        request_data = json.loads(body)
-                        display_name = request_data.get("displayName", "")
-                    except Exception:
-                        pass
-                # 從 upload URL 中提取 upload_id
-                import urllib.parse
-                parsed_url = urllib.parse.urlparse(upload_url)
-                query_params = urllib.parse.parse_qs(parsed_url.query)
-                upload_id = query_params.get('upload_id', [None])[0]
-                
-                if upload_id:
-                    # 儲存上傳會話信息，使用 upload_id 作為 key
-                    async with _upload_sessions_lock:
-                        _upload_sessions[upload_id] = {
-                            "api_key": api_key,
-                            "user_token": user_token,
-                            "display_name": display_name,
-                            "mime_type": headers.get("x-goog-upload-header-content-type", "application/octet-stream"),
-                            "size_bytes": int(headers.get("x-goog-upload-header-content-length", "0")),
-                            "created_at": datetime.now(timezone.utc),
-                            "upload_url": upload_url
-                        }
-                        logger.info(f"Stored upload session for upload_id={upload_id}: api_key={redact_key_for_logging(api_key)}")
-                        logger.debug(f"Total active sessions: {len(_upload_sessions)}")
-                else:
-                    logger.warning(f"No upload_id found in upload URL: {upload_url}")
-                
-                # 定期清理過期的會話（超過1小時）
-                asyncio.create_task(self._cleanup_expired_sessions())
+                # 先替換域名
+                proxy_upload_url = upload_url.replace(
+                    "https://generativelanguage.googleapis.com",
+                    request_host.rstrip('/')
+                )
                 
-                # 替換 Google 的 URL 為我們的代理 URL
-                proxy_upload_url = upload_url
-                if request_host:
-                    # 原始: https://generativelanguage.googleapis.com/upload/v1beta/files?key=AIzaSyDc...&upload_id=xxx&upload_protocol=resumable
-                    # 替換為: http://request-host/upload/v1beta/files?key=sk-123456&upload_id=xxx&upload_protocol=resumable
-                    
-                    # 先替換域名
-                    proxy_upload_url = upload_url.replace(
-                        "https://generativelanguage.googleapis.com",
-                        request_host.rstrip('/')
+                # 再替換 key 參數
+                import re
+                # 匹配 key=xxx 參數
+                key_pattern = r'(\?|&)key=([^&]+)'
+                match = re.search(key_pattern, proxy_upload_url)
+                if match:
+                    # 替換為我們的 token
+                    proxy_upload_url = proxy_upload_url.replace(
+                        f"{match.group(1)}key={match.group(2)}",
+                        f"{match.group(1)}key={user_token}"
                     )
-                    
-                    # 再替換 key 參數
-                    import re
-                    # 匹配 key=xxx 參數
-                    key_pattern = r'(\?|&)key=([^&]+)'
-                    match = re.search(key_pattern, proxy_upload_url)
-                    if match:
-                        # 替換為我們的 token
-                        proxy_upload_url = proxy_upload_url.replace(
-                            f"{match.group(1)}key={match.group(2)}",
-                            f"{match.group(1)}key={user_token}"
-                        )
-                    
-                    logger.info(f"Replaced upload URL: {upload_url} -> {proxy_upload_url}")
-                
-                return response_data, {
-                    "X-Goog-Upload-URL": proxy_upload_url,
-                    "X-Goog-Upload-Status": "active"
-                }
                 
+                logger.info(f"Replaced upload URL: {upload_url} -> {proxy_upload_url}")
+            
+            return response_data, {
+                "X-Goog-Upload-URL": proxy_upload_url,
+                "X-Goog-Upload-Status": "active"
+            }
+            
         except HTTPException:
             raise
         except Exception as e:
             logger.error(f"Failed to initialize upload: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
     
-    async def _cleanup_expired_sessions(self):
-        """清理過期的上傳會話"""
-        try:
-            async with _upload_sessions_lock:
-                now = datetime.now(timezone.utc)
-                expired_keys = []
-                for key, session in _upload_sessions.items():
-                    if now - session["created_at"] > timedelta(hours=1):
-                        expired_keys.append(key)
-                
-                for key in expired_keys:
-                    del _upload_sessions[key]
-                    
-                if expired_keys:
-                    logger.info(f"Cleaned up {len(expired_keys)} expired upload sessions")
-        except Exception as e:
-            logger.error(f"Error cleaning up upload sessions: {str(e)}")
+    async def _load_upload_session(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """從共享後端讀取上傳會話"""
+        value = await get_key_state_backend().get(_UPLOAD_SESSION_PREFIX + upload_id)
+        return json.loads(value) if value else None
     
     async def get_upload_session(self, key: str) -> Optional[Dict[str, Any]]:
         """獲取上傳會話信息（支持 upload_id 或完整 URL）"""
-        async with _upload_sessions_lock:
-            # 先嘗試直接查找
-            session = _upload_sessions.get(key)
-            if session:
-                logger.debug(f"Found session by direct key {redact_key_for_logging(key)}")
-                return session
-            
-            # 如果是 URL，嘗試提取 upload_id
-            if key.startswith("http"):
-                import urllib.parse
-                parsed_url = urllib.parse.urlparse(key)
-                query_params = urllib.parse.parse_qs(parsed_url.query)
-                upload_id = query_params.get('upload_id', [None])[0]
-                if upload_id:
-                    session = _upload_sessions.get(upload_id)
-                    if session:
-                        logger.debug(f"Found session by upload_id {upload_id} from URL")
-                        return session
-            
-            logger.debug(f"No session found for key: {redact_key_for_logging(key)}")
-            return None
+        # 先嘗試直接查找
+        session = await self._load_upload_session(key)
+        if session:
+            logger.debug(f"Found session by direct key {redact_key_for_logging(key)}")
+            return session
+        
+        # 如果是 URL，嘗試提取 upload_id
+        if key.startswith("http"):
+            import urllib.parse
+            parsed_url = urllib.parse.urlparse(key)
+            query_params = urllib.parse.parse_qs(parsed_url.query)
+            upload_id = query_params.get('upload_id', [None])[0]
+            if upload_id:
+                session = await self._load_upload_session(upload_id)
+                if session:
+                    logger.debug(f"Found session by upload_id {upload_id} from URL")
+                    return session
+        
+        logger.debug(f"No session found for key: {redact_key_for_logging(key)}")
+        return None
     
     async def get_file(self, file_name: str, user_token: str) -> FileMetadata:
         """
@@ -250,50 +238,51 @@ class FilesService:
             # 使用原始 API key 获取文件信息
             api_key = file_record["api_key"]
             
-            async with AsyncClient() as client:
-                response = await client.get(
-                    f"{settings.BASE_URL}/{file_name}",
-                    params={"key": api_key}
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Failed to get file: {response.status_code} - {response.text}")
-                    raise HTTPException(status_code=response.status_code, detail="Failed to get file")
-                
-                file_data = response.json()
-                
-                # 檢查並更新文件狀態
-                google_state = file_data.get("state", "PROCESSING")
-                if google_state != file_record.get("state", "").value if file_record.get("state") else None:
-                    logger.info(f"File state changed from {file_record.get('state')} to {google_state}")
-                    # 更新數據庫中的狀態
-                    if google_state == "ACTIVE":
-                        await db_services.update_file_record_state(
-                            file_name=file_name,
-                            state=FileState.ACTIVE,
-                            update_time=datetime.now(timezone.utc)
-                        )
-                    elif google_state == "FAILED":
-                        await db_services.update_file_record_state(
-                            file_name=file_name,
-                            state=FileState.FAILED,
-                            update_time=datetime.now(timezone.utc)
-                        )
-                
-                # 构建响应
-                return FileMetadata(
-                    name=file_data["name"],
-                    displayName=file_data.get("displayName"),
-                    mimeType=file_data["mimeType"],
-                    sizeBytes=str(file_data["sizeBytes"]),
-                    createTime=file_data["createTime"],
-                    updateTime=file_data["updateTime"],
-                    expirationTime=file_data["expirationTime"],
-                    sha256Hash=file_data.get("sha256Hash"),
-                    uri=file_data["uri"],
-                    state=google_state
-                )
-                
+            client = await get_http_client()
+            response = await client.get(
+                f"{settings.BASE_URL}/{file_name}",
+                params={"key": api_key},
+                timeout=DEFAULT_FILES_TIMEOUT
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to get file: {response.status_code} - {response.text}")
+                raise HTTPException(status_code=response.status_code, detail="Failed to get file")
+            
+            file_data = response.json()
+            
+            # 檢查並更新文件狀態
+            google_state = file_data.get("state", "PROCESSING")
+            if google_state != file_record.get("state", "").value if file_record.get("state") else None:
+                logger.info(f"File state changed from {file_record.get('state')} to {google_state}")
+                # 更新數據庫中的狀態
+                if google_state == "ACTIVE":
+                    await db_services.update_file_record_state(
+                        file_name=file_name,
+                        state=FileState.ACTIVE,
+                        update_time=datetime.now(timezone.utc)
+                    )
+                elif google_state == "FAILED":
+                    await db_services.update_file_record_state(
+                        file_name=file_name,
+                        state=FileState.FAILED,
+                        update_time=datetime.now(timezone.utc)
+                    )
+            
+            # 构建响应
+            return FileMetadata(
+                name=file_data["name"],
+                displayName=file_data.get("displayName"),
+                mimeType=file_data["mimeType"],
+                sizeBytes=str(file_data["sizeBytes"]),
+                createTime=file_data["createTime"],
+                updateTime=file_data["updateTime"],
+                expirationTime=file_data["expirationTime"],
+                sha256Hash=file_data.get("sha256Hash"),
+                uri=file_data["uri"],
+                state=google_state
+            )
+            
         except HTTPException:
             raise
         except Exception as e:
@@ -379,22 +368,23 @@ class FilesService:
             # 使用原始 API key 删除文件
             api_key = file_record["api_key"]
             
-            async with AsyncClient() as client:
-                response = await client.delete(
-                    f"{settings.BASE_URL}/{file_name}",
-                    params={"key": api_key}
-                )
-                
-                if response.status_code not in [200, 204]:
-                    logger.error(f"Failed to delete file: {response.status_code} - {response.text}")
-                    # 如果 API 删除失败，但文件已过期，仍然删除数据库记录
-                    expiration_time = datetime.fromisoformat(str(file_record["expiration_time"]))
-                    if expiration_time.tzinfo is None:
-                        expiration_time = expiration_time.replace(tzinfo=timezone.utc)
-                    if expiration_time <= datetime.now(timezone.utc):
-                        await db_services.delete_file_record(file_name)
-                        return True
-                    raise HTTPException(status_code=response.status_code, detail="Failed to delete file")
+            client = await get_http_client()
+            response = await client.delete(
+                f"{settings.BASE_URL}/{file_name}",
+                params={"key": api_key},
+                timeout=DEFAULT_FILES_TIMEOUT
+            )
+            
+            if response.status_code not in [200, 204]:
+                logger.error(f"Failed to delete file: {response.status_code} - {response.text}")
+                # 如果 API 删除失败，但文件已过期，仍然删除数据库记录
+                expiration_time = datetime.fromisoformat(str(file_record["expiration_time"]))
+                if expiration_time.tzinfo is None:
+                    expiration_time = expiration_time.replace(tzinfo=timezone.utc)
+                if expiration_time <= datetime.now(timezone.utc):
+                    await db_services.delete_file_record(file_name)
+                    return True
+                raise HTTPException(status_code=response.status_code, detail="Failed to delete file")
             
             # 删除数据库记录
             await db_services.delete_file_record(file_name)
@@ -418,35 +408,36 @@ class FilesService:
             str: 當前狀態
         """
         try:
-            async with AsyncClient() as client:
-                response = await client.get(
-                    f"{settings.BASE_URL}/{file_name}",
-                    params={"key": api_key}
+            client = await get_http_client()
+            response = await client.get(
+                f"{settings.BASE_URL}/{file_name}",
+                params={"key": api_key},
+                timeout=DEFAULT_FILES_TIMEOUT
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to check file state: {response.status_code}")
+                return "UNKNOWN"
+            
+            file_data = response.json()
+            google_state = file_data.get("state", "PROCESSING")
+            
+            # 更新數據庫狀態
+            if google_state == "ACTIVE":
+                await db_services.update_file_record_state(
+                    file_name=file_name,
+                    state=FileState.ACTIVE,
+                    update_time=datetime.now(timezone.utc)
                 )
-                
-                if response.status_code != 200:
-                    logger.error(f"Failed to check file state: {response.status_code}")
-                    return "UNKNOWN"
-                
-                file_data = response.json()
-                google_state = file_data.get("state", "PROCESSING")
-                
-                # 更新數據庫狀態
-                if google_state == "ACTIVE":
-                    await db_services.update_file_record_state(
-                        file_name=file_name,
-                        state=FileState.ACTIVE,
-                        update_time=datetime.now(timezone.utc)
-                    )
-                elif google_state == "FAILED":
-                    await db_services.update_file_record_state(
-                        file_name=file_name,
-                        state=FileState.FAILED,
-                        update_time=datetime.now(timezone.utc)
-                    )
-                
-                return google_state
-                
+            elif google_state == "FAILED":
+                await db_services.update_file_record_state(
+                    file_name=file_name,
+                    state=FileState.FAILED,
+                    update_time=datetime.now(timezone.utc)
+                )
+            
+            return google_state
+            
         except Exception as e:
             logger.error(f"Failed to check file state: {str(e)}")
             return "UNKNOWN"
@@ -471,11 +462,12 @@ class FilesService:
                     api_key = file_record["api_key"]
                     file_name = file_record["name"]
                     
-                    async with AsyncClient() as client:
-                        await client.delete(
-                            f"{settings.BASE_URL}/{file_name}",
-                            params={"key": api_key}
-                        )
+                    client = await get_http_client()
+                    await client.delete(
+                        f"{settings.BASE_URL}/{file_name}",
+                        params={"key": api_key},
+                        timeout=DEFAULT_FILES_TIMEOUT
+                    )
                 except Exception as e:
                     # 记录错误但继续处理其他文件
                     logger.error(f"Failed to delete file {file_record['name']} from API: {str(e)}")
@@ -0,0 +1,63 @@
+"""
+请求前缀到 key 的亲和映射
+
+同一会话的多轮请求通常共享相同的 systemInstruction 和开头几条 contents。
+对这段前缀做哈希，并通过一致性哈希环映射到固定的 key，
+让同一会话尽量落在同一个 key 上，以命中 Gemini 的隐式上下文缓存。
+key 增减时只有少量会话的映射会改变。
+"""
+
+import bisect
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def compute_affinity_hash(
+    payload: Dict[str, Any], prefix_contents: int
+) -> Optional[int]:
+    """根据 systemInstruction 和前 prefix_contents 条 contents 计算亲和哈希，没有可用前缀时返回 None"""
+    system_instruction = payload.get("systemInstruction")
+    contents = (payload.get("contents") or [])[: max(prefix_contents, 0)]
+    if not system_instruction and not contents:
+        return None
+    prefix = json.dumps(
+        {"systemInstruction": system_instruction, "contents": contents},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return _hash64(prefix.encode("utf-8"))
+
+
+class ConsistentHashRing:
+    """带虚拟节点的一致性哈希环"""
+
+    def __init__(self, keys: Iterable[str], virtual_nodes: int = 100):
+        points = sorted(
+            (_hash64(f"{key}#{i}".encode("utf-8")), key)
+            for key in dict.fromkeys(keys)
+            for i in range(virtual_nodes)
+        )
+        self._points: List[int] = [point for point, _ in points]
+        self._keys: List[str] = [key for _, key in points]
+        self._distinct = len(set(self._keys))
+
+    def walk(self, value: int) -> Iterator[str]:
+        """从哈希位置开始顺时针遍历环上的 key，每个 key 只返回一次"""
+        total = len(self._points)
+        start = bisect.bisect(self._points, value)
+        seen = set()
+        for offset in range(total):
+            key = self._keys[(start + offset) % total]
+            if key in seen:
+                continue
+            seen.add(key)
+            yield key
+            if len(seen) == self._distinct:
+                return
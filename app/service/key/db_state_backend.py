@@ -0,0 +1,110 @@
+"""
+基于数据库的 key 状态共享后端
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import Integer, and_, cast, delete, insert, or_, select, update
+
+from app.database.connection import database
+from app.database.models import SharedState
+from app.service.key.state_backend import KeyStateBackend
+
+
+class DatabaseStateBackend(KeyStateBackend):
+    """基于 t_shared_state 表的后端，普通键使用空字段名存储"""
+
+    _SCALAR_FIELD = ""
+
+    @staticmethod
+    def _not_expired():
+        return or_(SharedState.expires_at.is_(None), SharedState.expires_at > datetime.now())
+
+    @staticmethod
+    def _match(name: str, field: str):
+        return and_(SharedState.name == name, SharedState.field == field)
+
+    async def _insert_if_missing(self, name: str, field: str, value: str, expires_at: Optional[datetime]) -> bool:
+        """记录不存在时插入，返回是否插入成功"""
+        existing = await database.fetch_one(
+            select(SharedState.id).where(self._match(name, field))
+        )
+        if existing:
+            return False
+        try:
+            await database.execute(
+                insert(SharedState).values(
+                    name=name, field=field, value=value, expires_at=expires_at
+                )
+            )
+            return True
+        except Exception:
+            # 其他 worker 同时插入了同名记录，违反唯一约束
+            return False
+
+    async def _upsert(self, name: str, field: str, value: str, expires_at: Optional[datetime]):
+        if not await self._insert_if_missing(name, field, value, expires_at):
+            await database.execute(
+                update(SharedState)
+                .where(self._match(name, field))
+                .values(value=value, expires_at=expires_at)
+            )
+
+    async def get(self, name: str) -> Optional[str]:
+        row = await database.fetch_one(
+            select(SharedState.value).where(
+                and_(self._match(name, self._SCALAR_FIELD), self._not_expired())
+            )
+        )
+        return row["value"] if row else None
+
+    async def set(self, name: str, value: str, ttl: Optional[int] = None):
+        expires_at = datetime.now() + timedelta(seconds=ttl) if ttl else None
+        await self._upsert(name, self._SCALAR_FIELD, value, expires_at)
+        # 顺带清理过期记录，避免表无限增长
+        await database.execute(
+            delete(SharedState).where(
+                and_(
+                    SharedState.expires_at.is_not(None),
+                    SharedState.expires_at <= datetime.now(),
+                )
+            )
+        )
+
+    async def delete(self, name: str):
+        await database.execute(delete(SharedState).where(SharedState.name == name))
+
+    async def incr(self, name: str) -> int:
+        return await self.hincrby(name, self._SCALAR_FIELD)
+
+    async def hset(self, name: str, field: str, value: str):
+        await self._upsert(name, field, value, None)
+
+    async def hincrby(self, name: str, field: str, amount: int = 1) -> int:
+        match = self._match(name, field)
+        await self._insert_if_missing(name, field, "0", None)
+        async with database.transaction():
+            # 在数据库内自增，多个 worker 并发时不会丢失计数
+            await database.execute(
+                update(SharedState)
+                .where(match)
+                .values(value=cast(SharedState.value, Integer) + amount)
+            )
+            row = await database.fetch_one(select(SharedState.value).where(match))
+        return int(row["value"])
+
+    async def hdel(self, name: str, field: str):
+        await database.execute(delete(SharedState).where(self._match(name, field)))
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        rows = await database.fetch_all(
+            select(SharedState.field, SharedState.value).where(
+                and_(
+                    SharedState.name == name,
+                    SharedState.field != self._SCALAR_FIELD,
+                    self._not_expired(),
+                )
+            )
+        )
+        return {row["field"]: row["value"] for row in rows}
@@ -0,0 +1,68 @@
+"""
+按 key 统计正在进行中的上游请求数
+
+API 客户端在请求发出前 acquire、结束（包括流式响应读取完毕或中断）后 release，
+least_outstanding 选 key 策略据此选择当前负载最低的 key。
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+
+class InflightTracker:
+    """进行中请求计数器，仅在单个事件循环内使用，无需加锁"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._total = 0
+
+    def acquire(self, key: str):
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._total += 1
+
+    def release(self, key: str):
+        if key not in self._counts:
+            return
+        self._total -= 1
+        count = self._counts[key] - 1
+        if count > 0:
+            self._counts[key] = count
+        else:
+            self._counts.pop(key, None)
+
+    @contextmanager
+    def track(self, key: str) -> Iterator[None]:
+        """在上下文内将 key 计为一个进行中的请求"""
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def count(self, key: str) -> int:
+        return self._counts.get(key, 0)
+
+    @property
+    def total(self) -> int:
+        """所有 key 的进行中请求总数"""
+        return self._total
+
+    def least_loaded(self, keys: Iterable[str]) -> Optional[str]:
+        """返回进行中请求数最少的 key，数量相同时取顺序靠前的"""
+        best_key = None
+        best_count = 0
+        for key in keys:
+            count = self._counts.get(key, 0)
+            if best_key is None or count < best_count:
+                best_key, best_count = key, count
+                if count == 0:
+                    break
+        return best_key
+
+
+_inflight_tracker = InflightTracker()
+
+
+def get_inflight_tracker() -> InflightTracker:
+    """获取全局进行中请求计数器"""
+    return _inflight_tracker
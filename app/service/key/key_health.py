@@ -0,0 +1,74 @@
+"""
+key 健康状态与上游错误分类
+
+根据上游返回的状态码和错误内容判断失败原因，决定 key 的状态转换：
+- 客户端错误（请求本身有问题）不影响 key 的健康状态
+- 认证错误（key 无效、被吊销、无权限）直接判定为失效
+- 限流错误（429）进入冷却，冷却时间按连续次数指数退避，到期后自动恢复
+- 其他错误（5xx、超时、网络异常）进入冷却并累计失败次数，达到上限后判定为失效
+"""
+
+import re
+from enum import Enum
+from typing import Optional
+
+_STATUS_CODE_PATTERN = re.compile(r"status code (\d+)")
+
+# Google 对无效 key 也可能返回 400，需要根据错误内容区分
+_AUTH_ERROR_MARKERS = (
+    "API_KEY_INVALID",
+    "API key not valid",
+    "API key expired",
+    "API_KEY_SERVICE_BLOCKED",
+    "PERMISSION_DENIED",
+    "CONSUMER_SUSPENDED",
+)
+
+
+class KeyState(str, Enum):
+    HEALTHY = "healthy"
+    COOLING = "cooling"
+    DEAD = "dead"
+
+
+class ErrorClass(str, Enum):
+    CLIENT = "client"
+    AUTH = "auth"
+    RATE_LIMIT = "rate_limit"
+    TRANSIENT = "transient"
+
+
+def extract_status_code(error_message: Optional[str]) -> Optional[int]:
+    """从错误信息中提取上游状态码"""
+    if not error_message:
+        return None
+    match = _STATUS_CODE_PATTERN.search(error_message)
+    return int(match.group(1)) if match else None
+
+
+def classify_error(error_message: Optional[str]) -> ErrorClass:
+    """根据错误信息判断失败类别，无法识别时按临时错误处理"""
+    if not error_message:
+        return ErrorClass.TRANSIENT
+    if any(marker in error_message for marker in _AUTH_ERROR_MARKERS):
+        return ErrorClass.AUTH
+    status_code = extract_status_code(error_message)
+    if status_code is None:
+        return ErrorClass.TRANSIENT
+    if status_code in (401, 403):
+        return ErrorClass.AUTH
+    if status_code == 429:
+        return ErrorClass.RATE_LIMIT
+    if status_code == 408:
+        return ErrorClass.TRANSIENT
+    if 400 <= status_code < 500:
+        return ErrorClass.CLIENT
+    return ErrorClass.TRANSIENT
+
+
+def compute_cooldown(level: int, base_seconds: float, max_seconds: float) -> float:
+    """计算第 level 次连续冷却的时长（从 1 开始），按 2 的幂次增长并受上限约束"""
+    if level < 1:
+        level = 1
+    # 限制指数，避免连续失败次数过大时溢出
+    return min(base_seconds * (2 ** min(level - 1, 32)), max_seconds)
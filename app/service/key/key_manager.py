@@ -1,14 +1,87 @@
 import asyncio
+import datetime
+import heapq
+import json
+import math
+import time
 from itertools import cycle
-from typing import Dict, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from app.config.config import settings
+from app.core.constants import KEY_AFFINITY_VIRTUAL_NODES, KEY_STATE_REDIS_TIMEOUT
+from app.database.services import get_key_health_snapshot, save_key_health_snapshot
 from app.log.logger import get_key_manager_logger
+from app.service.key.key_health import (
+    ErrorClass,
+    KeyState,
+    classify_error,
+    compute_cooldown,
+)
+from app.service.key.affinity import ConsistentHashRing
+from app.service.key.inflight import get_inflight_tracker
+from app.service.key.key_ring import KeyRing
+from app.service.key.db_state_backend import DatabaseStateBackend
+from app.service.key.rate_limiter import KeyRateLimiter, RateLimits
+from app.service.key.state_backend import (
+    KeyStateBackend,
+    MemoryStateBackend,
+    RedisStateBackend,
+)
 from app.utils.helpers import redact_key_for_logging
 
 logger = get_key_manager_logger()
 
 
+def _get_model_rate_limits(model: str) -> RateLimits:
+    """获取指定模型的 (rpm, tpm, rpd) 限额，未单独配置的模型使用默认值"""
+    return (
+        int(settings.MODEL_RPM_LIMITS.get(model, settings.KEY_RPM_LIMIT)),
+        int(settings.MODEL_TPM_LIMITS.get(model, settings.KEY_TPM_LIMIT)),
+        int(settings.MODEL_RPD_LIMITS.get(model, settings.KEY_RPD_LIMIT)),
+    )
+
+
+# 限流状态与 KeyManager 实例解耦，重置 KeyManager 时保留已用额度
+_rate_limiter = KeyRateLimiter(_get_model_rate_limits)
+
+# 共享状态后端中使用的键名
+_SHARED_KEY_CURSOR = "key_cursor"
+# 冷却状态按 key 整体覆盖写入，失败计数单独存放并原子自增，多个 worker 同时记录失败时不会丢失
+_SHARED_KEY_HEALTH = "key_health"
+_SHARED_KEY_FAILURES = "key_failures"
+
+_state_backend: Optional[KeyStateBackend] = None
+
+
+def get_key_state_backend() -> KeyStateBackend:
+    """获取按 KEY_STATE_BACKEND 配置创建的共享状态后端单例"""
+    global _state_backend
+    if _state_backend is None:
+        backend_type = settings.KEY_STATE_BACKEND.lower()
+        if backend_type == "redis":
+            _state_backend = RedisStateBackend(
+                settings.KEY_STATE_REDIS_URL, timeout=KEY_STATE_REDIS_TIMEOUT
+            )
+        elif backend_type == "database":
+            _state_backend = DatabaseStateBackend()
+        else:
+            if backend_type != "memory":
+                logger.warning(
+                    f"Unknown KEY_STATE_BACKEND '{settings.KEY_STATE_BACKEND}', falling back to memory."
+                )
+            _state_backend = MemoryStateBackend()
+        logger.info(f"Using {type(_state_backend).__name__} for key state.")
+    return _state_backend
+
+
+async def close_key_state_backend():
+    """关闭共享状态后端，供应用关闭时调用"""
+    global _state_backend
+    if _state_backend is not None:
+        await _state_backend.close()
+        _state_backend = None
+
+
 class KeyManager:
     def __init__(self, api_keys: list, vertex_api_keys: list):
         self.api_keys = api_keys
@@ -25,6 +98,39 @@ class KeyManager:
         }
         self.MAX_FAILURES = settings.MAX_FAILURES
         self.paid_key = settings.PAID_KEY
+        self.key_ring = KeyRing(api_keys)
+        self.vertex_key_ring = KeyRing(vertex_api_keys)
+        self.rate_limiter = _rate_limiter
+        self.inflight = get_inflight_tracker()
+        # 一致性哈希环只依赖 key 列表，在创建实例时构建，选 key 时无需在锁内哈希所有虚拟节点
+        self._affinity_ring: Optional[ConsistentHashRing] = (
+            self._build_affinity_ring() if settings.KEY_AFFINITY_ENABLED else None
+        )
+        # 冷却状态：冷却结束时间（Unix 时间戳）、连续冷却次数、最近一次错误
+        self.key_cooldown_until: Dict[str, float] = {}
+        self.key_cooldown_levels: Dict[str, int] = {}
+        self.key_last_errors: Dict[str, str] = {}
+        self._cooldown_heap: List[Tuple[float, str]] = []
+        # 健康状态有变化但尚未写入数据库
+        self.health_dirty = False
+        self.state_backend = get_key_state_backend()
+        self._last_shared_sync = 0.0
+
+    def rebuild_key_rings(self):
+        """根据当前失败计数和冷却状态重建健康 key 轮转环"""
+        self.key_ring = KeyRing(self.api_keys)
+        self._cooldown_heap = []
+        for key in self.api_keys:
+            if self.key_failure_counts.get(key, 0) >= self.MAX_FAILURES:
+                self.key_ring.bench(key)
+            elif key in self.key_cooldown_until:
+                self.key_ring.bench(key)
+                self._cooldown_heap.append((self.key_cooldown_until[key], key))
+        heapq.heapify(self._cooldown_heap)
+        self.vertex_key_ring = KeyRing(self.vertex_api_keys)
+        for key in self.vertex_api_keys:
+            if self.vertex_key_failure_counts.get(key, 0) >= self.MAX_FAILURES:
+                self.vertex_key_ring.bench(key)
 
     async def get_paid_key(self) -> str:
         return self.paid_key
@@ -52,32 +158,51 @@ class KeyManager:
     async def reset_failure_counts(self):
         """重置所有key的失败计数"""
         async with self.failure_count_lock:
+            self.health_dirty = True
             for key in self.key_failure_counts:
                 self.key_failure_counts[key] = 0
+                self._clear_cooldown(key)
+                self.key_ring.restore(key)
+        if self.state_backend.shared:
+            try:
+                await self.state_backend.delete(_SHARED_KEY_HEALTH)
+                await self.state_backend.delete(_SHARED_KEY_FAILURES)
+            except Exception as e:
+                logger.warning(f"Failed to reset key health in shared backend: {e}")
 
     async def reset_vertex_failure_counts(self):
         """重置所有 Vertex key 的失败计数"""
         async with self.vertex_failure_count_lock:
+            self.health_dirty = True
             for key in self.vertex_key_failure_counts:
                 self.vertex_key_failure_counts[key] = 0
+                self.vertex_key_ring.restore(key)
 
     async def reset_key_failure_count(self, key: str) -> bool:
         """重置指定key的失败计数"""
         async with self.failure_count_lock:
             if key in self.key_failure_counts:
                 self.key_failure_counts[key] = 0
+                self.health_dirty = True
+                self._clear_cooldown(key)
+                self.key_ring.restore(key)
                 logger.info(f"Reset failure count for key: {redact_key_for_logging(key)}")
-                return True
-            logger.warning(
-                f"Attempt to reset failure count for non-existent key: {key}"
-            )
-            return False
+            else:
+                logger.warning(
+                    f"Attempt to reset failure count for non-existent key: {key}"
+                )
+                return False
+        await self._publish_failure_count(key)
+        await self._publish_key_health(key)
+        return True
 
     async def reset_vertex_key_failure_count(self, key: str) -> bool:
         """重置指定 Vertex key 的失败计数"""
         async with self.vertex_failure_count_lock:
             if key in self.vertex_key_failure_counts:
                 self.vertex_key_failure_counts[key] = 0
+                self.health_dirty = True
+                self.vertex_key_ring.restore(key)
                 logger.info(f"Reset failure count for Vertex key: {redact_key_for_logging(key)}")
                 return True
             logger.warning(
@@ -85,42 +210,476 @@ class KeyManager:
             )
             return False
 
-    async def get_next_working_key(self) -> str:
-        """获取下一可用的API key"""
-        initial_key = await self.get_next_key()
-        current_key = initial_key
+    async def get_next_working_key(self, model: Optional[str] = None) -> str:
+        """获取下一可用的API key
+
+        只在健康 key 轮转环中选取，所有 key 都失效时退回普通轮询。
+        KEY_SELECTION_STRATEGY 为 least_outstanding 时选择进行中请求最少的 key。
+        启用限流且指定了模型时，优先选择该模型下仍有 RPM/TPM/RPD 余量的 key。
+        """
+        least_outstanding = (
+            settings.KEY_SELECTION_STRATEGY.lower() == "least_outstanding"
+        )
+        rate_limited = bool(model) and settings.KEY_RATE_LIMIT_ENABLED
+        cursor = None
+        if self.state_backend.shared:
+            await self._sync_shared_health()
+            if not least_outstanding and not rate_limited:
+                cursor = await self._next_shared_cursor()
+        async with self.key_cycle_lock:
+            self._release_cooled_keys()
+            if least_outstanding:
+                key = self._least_loaded_key(model)
+            elif rate_limited:
+                key = self._next_key_with_headroom(model)
+            elif cursor is not None:
+                key = self.key_ring.key_at(cursor)
+            else:
+                key = self.key_ring.next()
+            if key is not None:
+                return key
+        return await self.get_next_key()
+
+    async def get_alternate_key(
+        self, exclude_key: str, model: Optional[str] = None
+    ) -> Optional[str]:
+        """获取一个不同于 exclude_key 的健康 key，用于对冲请求，没有时返回 None"""
+        for _ in range(2):
+            # 轮询恰好回到 exclude_key 时再取一次
+            key = await self.get_next_working_key(model)
+            if key and key != exclude_key:
+                return key
+        return None
+
+    async def _next_shared_cursor(self) -> Optional[int]:
+        """从共享后端获取全局轮询位置，多个 worker 共用同一个位置"""
+        try:
+            return await self.state_backend.incr(_SHARED_KEY_CURSOR)
+        except Exception as e:
+            logger.warning(f"Failed to get shared key cursor, using local rotation: {e}")
+            return None
+
+    async def _publish_key_health(self, key: str):
+        """将单个 key 的冷却状态写入共享后端"""
+        if not self.state_backend.shared:
+            return
+        try:
+            await self.state_backend.hset(
+                _SHARED_KEY_HEALTH,
+                key,
+                json.dumps(
+                    {
+                        "cooldown_until": self.key_cooldown_until.get(key),
+                        "cooldown_level": self.key_cooldown_levels.get(key, 0),
+                    }
+                ),
+            )
+        except Exception as e:
+            logger.warning(
+                f"Failed to publish health of key {redact_key_for_logging(key)} to shared backend: {e}"
+            )
+
+    async def _publish_failure_count(self, key: str):
+        """将单个 key 的失败计数直接写入共享后端，用于重置或标记失效"""
+        if not self.state_backend.shared:
+            return
+        try:
+            await self.state_backend.hset(
+                _SHARED_KEY_FAILURES, key, str(self.key_failure_counts.get(key, 0))
+            )
+        except Exception as e:
+            logger.warning(
+                f"Failed to publish failure count of key {redact_key_for_logging(key)} to shared backend: {e}"
+            )
+
+    async def _incr_shared_failure_count(self, key: str) -> Optional[int]:
+        """在共享后端中原子地增加 key 的失败计数，返回所有 worker 累计的次数，不可用时返回 None"""
+        if not self.state_backend.shared:
+            return None
+        try:
+            return await self.state_backend.hincrby(_SHARED_KEY_FAILURES, key)
+        except Exception as e:
+            logger.warning(
+                f"Failed to increment failure count of key {redact_key_for_logging(key)} in shared backend: {e}"
+            )
+            return None
+
+    async def _sync_shared_health(self):
+        """按 KEY_STATE_SYNC_INTERVAL_SECONDS 间隔从共享后端拉取其他 worker 更新的 key 健康状态"""
+        now = time.monotonic()
+        if now - self._last_shared_sync < settings.KEY_STATE_SYNC_INTERVAL_SECONDS:
+            return
+        self._last_shared_sync = now
+        try:
+            records = await self.state_backend.hgetall(_SHARED_KEY_HEALTH)
+            failure_counts = await self.state_backend.hgetall(_SHARED_KEY_FAILURES)
+        except Exception as e:
+            logger.warning(f"Failed to sync key health from shared backend: {e}")
+            return
+        async with self.failure_count_lock:
+            self._apply_shared_health(records, failure_counts)
+
+    def _apply_shared_health(self, records: Dict[str, str], failure_counts: Dict[str, str]):
+        """用共享后端中的状态覆盖本地状态，没有记录的 key 视为健康"""
+        now = time.time()
+        for key in self.api_keys:
+            item = json.loads(records[key]) if key in records else {}
+            failure_count = int(failure_counts.get(key) or 0)
+            cooldown_until = item.get("cooldown_until")
+            cooldown_level = item.get("cooldown_level", 0)
+            if failure_count != self.key_failure_counts.get(key, 0):
+                self.key_failure_counts[key] = failure_count
+                self.health_dirty = True
+            if cooldown_level:
+                self.key_cooldown_levels[key] = cooldown_level
+            else:
+                self.key_cooldown_levels.pop(key, None)
+            if cooldown_until and cooldown_until > now:
+                if self.key_cooldown_until.get(key) != cooldown_until:
+                    self.key_cooldown_until[key] = cooldown_until
+                    heapq.heappush(self._cooldown_heap, (cooldown_until, key))
+            else:
+                self.key_cooldown_until.pop(key, None)
+            if failure_count >= self.MAX_FAILURES or key in self.key_cooldown_until:
+                self.key_ring.bench(key)
+            else:
+                self.key_ring.restore(key)
+
+    def _next_key_with_headroom(self, model: str) -> Optional[str]:
+        """在健康 key 中轮询查找有余量的 key 并记录一次请求，调用方需持有 key_cycle_lock"""
+        first_key = None
+        for _ in range(self.key_ring.active_count):
+            key = self.key_ring.next()
+            if first_key is None:
+                first_key = key
+            if self.rate_limiter.has_headroom(key, model):
+                self.rate_limiter.record_request(key, model)
+                return key
+        if first_key is not None:
+            logger.warning(
+                f"All healthy keys are rate limited for model {model}, using {redact_key_for_logging(first_key)} anyway"
+            )
+            self.rate_limiter.record_request(first_key, model)
+        return first_key
+
+    def _least_loaded_key(self, model: Optional[str]) -> Optional[str]:
+        """选择进行中请求最少的健康 key，数量相同时取最久未被选中的，调用方需持有 key_cycle_lock"""
+        rate_limited = bool(model) and settings.KEY_RATE_LIMIT_ENABLED
+        key = None
+        if rate_limited:
+            key = self.inflight.least_loaded(
+                k for k in self.key_ring if self.rate_limiter.has_headroom(k, model)
+            )
+            if key is None and self.key_ring.active_count:
+                logger.warning(
+                    f"All healthy keys are rate limited for model {model}, using the least loaded key anyway"
+                )
+        if key is None:
+            key = self.inflight.least_loaded(self.key_ring)
+        if key is not None:
+            self.key_ring.touch(key)
+            if rate_limited:
+                self.rate_limiter.record_request(key, model)
+        return key
+
+    def _build_affinity_ring(self) -> ConsistentHashRing:
+        return ConsistentHashRing(self.api_keys, KEY_AFFINITY_VIRTUAL_NODES)
+
+    async def get_affinity_key(
+        self,
+        affinity_hash: int,
+        model: Optional[str] = None,
+        charged_key: Optional[str] = None,
+    ) -> Optional[str]:
+        """按亲和哈希在一致性哈希环上选择首选 key
+
+        从哈希位置顺时针查找第一个健康、未超出有界负载且有限流余量的 key，
+        首选 key 冷却或负载过高时顺延到环上的下一个 key。没有合适的 key 时返回 None。
+        charged_key 为路由依赖已记录过一次请求的 key：选中它时不再重复记录，
+        选中其他 key 时归还它的请求额度。
+        """
+        if self.state_backend.shared:
+            await self._sync_shared_health()
+        if self._affinity_ring is None:
+            # 运行中才开启亲和时在锁外构建
+            self._affinity_ring = self._build_affinity_ring()
+        async with self.key_cycle_lock:
+            self._release_cooled_keys()
+            active_count = self.key_ring.active_count
+            if not active_count:
+                return None
+            # 有界负载：单个 key 的进行中请求数不超过平均值的 KEY_AFFINITY_LOAD_FACTOR 倍
+            capacity = math.ceil(
+                settings.KEY_AFFINITY_LOAD_FACTOR
+                * (self.inflight.total + 1)
+                / active_count
+            )
+            rate_limited = bool(model) and settings.KEY_RATE_LIMIT_ENABLED
+            for key in self._affinity_ring.walk(affinity_hash):
+                if not self.key_ring.is_active(key):
+                    continue
+                if self.inflight.count(key) >= capacity:
+                    continue
+                if key == charged_key:
+                    return key
+                if rate_limited:
+                    if not self.rate_limiter.has_headroom(key, model):
+                        continue
+                    self.rate_limiter.record_request(key, model)
+                    if charged_key:
+                        self.rate_limiter.release_request(charged_key, model)
+                return key
+        return None
 
-        while True:
-            if await self.is_key_valid(current_key):
-                return current_key
+    async def release_request(self, key: str, model: Optional[str] = None):
+        """归还选 key 时记录的一次请求额度，用于最终没有发往上游的请求（如命中缓存）"""
+        if not model or not settings.KEY_RATE_LIMIT_ENABLED:
+            return
+        async with self.key_cycle_lock:
+            self.rate_limiter.release_request(key, model)
 
-            current_key = await self.get_next_key()
-            if current_key == initial_key:
-                return current_key
+    async def record_success(
+        self, key: str, model: str, usage_metadata: Optional[Dict] = None
+    ):
+        """记录一次成功调用：清除 key 的冷却退避等级，并按 usageMetadata 扣除 TPM 额度"""
+        if self.key_cooldown_levels.pop(key, None) is not None:
+            self.health_dirty = True
+            # 同步到共享后端，否则下次同步时会恢复旧的退避等级
+            await self._publish_key_health(key)
+        if not settings.KEY_RATE_LIMIT_ENABLED or not usage_metadata:
+            return
+        self.rate_limiter.record_tokens(
+            key, model, usage_metadata.get("totalTokenCount", 0)
+        )
 
     async def get_next_working_vertex_key(self) -> str:
         """获取下一可用的 Vertex Express API key"""
-        initial_key = await self.get_next_vertex_key()
-        current_key = initial_key
+        async with self.vertex_key_cycle_lock:
+            key = self.vertex_key_ring.next()
+            if key is not None:
+                return key
+        return await self.get_next_vertex_key()
+
+    async def increment_key_failure_count(self, key: str) -> int:
+        """增加指定key的失败计数，达到上限时将其移出轮转，返回新的失败次数"""
+        shared_count = await self._incr_shared_failure_count(key)
+        async with self.failure_count_lock:
+            if shared_count is None:
+                count = self.key_failure_counts.get(key, 0) + 1
+            else:
+                count = shared_count
+            self.key_failure_counts[key] = count
+            self.health_dirty = True
+            if count >= self.MAX_FAILURES:
+                self.key_ring.bench(key)
+        return count
+
+    def _clear_cooldown(self, key: str):
+        """清除 key 的冷却状态，堆中的过期条目在弹出时忽略"""
+        self.key_cooldown_until.pop(key, None)
+        self.key_cooldown_levels.pop(key, None)
 
-        while True:
-            if await self.is_vertex_key_valid(current_key):
-                return current_key
+    def _start_cooldown(self, key: str) -> float:
+        """将 key 移出轮转并按连续冷却次数指数退避，返回冷却时长（秒）"""
+        level = self.key_cooldown_levels.get(key, 0) + 1
+        duration = compute_cooldown(
+            level, settings.KEY_COOLDOWN_BASE_SECONDS, settings.KEY_COOLDOWN_MAX_SECONDS
+        )
+        until = time.time() + duration
+        self.key_cooldown_levels[key] = level
+        self.key_cooldown_until[key] = until
+        heapq.heappush(self._cooldown_heap, (until, key))
+        self.key_ring.bench(key)
+        return duration
 
-            current_key = await self.get_next_vertex_key()
-            if current_key == initial_key:
-                return current_key
+    def _release_cooled_keys(self):
+        """将冷却到期的 key 放回轮转，调用方需持有 key_cycle_lock"""
+        now = time.time()
+        while self._cooldown_heap and self._cooldown_heap[0][0] <= now:
+            until, key = heapq.heappop(self._cooldown_heap)
+            if self.key_cooldown_until.get(key) != until:
+                continue
+            del self.key_cooldown_until[key]
+            self.health_dirty = True
+            if self.key_failure_counts.get(key, 0) < self.MAX_FAILURES:
+                self.key_ring.restore(key)
+                logger.info(
+                    f"API key {redact_key_for_logging(key)} finished cooldown and is back in rotation"
+                )
+
+    def export_key_health(self) -> Dict[str, Dict]:
+        """导出 key 的冷却状态，用于重建实例时恢复"""
+        keys = (
+            set(self.key_cooldown_until)
+            | set(self.key_cooldown_levels)
+            | set(self.key_last_errors)
+        )
+        return {
+            key: {
+                "cooldown_until": self.key_cooldown_until.get(key),
+                "cooldown_level": self.key_cooldown_levels.get(key, 0),
+                "last_error": self.key_last_errors.get(key),
+            }
+            for key in keys
+        }
 
-    async def handle_api_failure(self, api_key: str, retries: int) -> str:
-        """处理API调用失败"""
+    def import_key_health(self, health: Dict[str, Dict]):
+        """恢复 key 的冷却状态，仅处理当前 key 列表中的 key，需在 rebuild_key_rings 之前调用"""
+        now = time.time()
+        for key, item in health.items():
+            if key not in self.key_failure_counts:
+                continue
+            cooldown_until = item.get("cooldown_until")
+            if cooldown_until and cooldown_until > now:
+                self.key_cooldown_until[key] = cooldown_until
+            if item.get("cooldown_level"):
+                self.key_cooldown_levels[key] = item["cooldown_level"]
+            if item.get("last_error"):
+                self.key_last_errors[key] = item["last_error"]
+
+    def build_health_snapshot(self) -> List[Dict]:
+        """生成需要持久化的 key 健康状态快照，只包含非初始状态的 key"""
+        records = []
+        for key in self.api_keys:
+            failure_count = self.key_failure_counts.get(key, 0)
+            cooldown_until = self.key_cooldown_until.get(key)
+            cooldown_level = self.key_cooldown_levels.get(key, 0)
+            last_error = self.key_last_errors.get(key)
+            if not (failure_count or cooldown_until or cooldown_level or last_error):
+                continue
+            records.append(
+                {
+                    "api_key": key,
+                    "key_type": "gemini",
+                    "state": self.get_key_state(key).value,
+                    "failure_count": failure_count,
+                    "cooldown_until": (
+                        datetime.datetime.fromtimestamp(cooldown_until)
+                        if cooldown_until
+                        else None
+                    ),
+                    "cooldown_level": cooldown_level,
+                    "last_error": last_error,
+                }
+            )
+        for key in self.vertex_api_keys:
+            failure_count = self.vertex_key_failure_counts.get(key, 0)
+            if not failure_count:
+                continue
+            records.append(
+                {
+                    "api_key": key,
+                    "key_type": "vertex",
+                    "state": (
+                        KeyState.DEAD.value
+                        if failure_count >= self.MAX_FAILURES
+                        else KeyState.HEALTHY.value
+                    ),
+                    "failure_count": failure_count,
+                    "cooldown_until": None,
+                    "cooldown_level": 0,
+                    "last_error": None,
+                }
+            )
+        return records
+
+    def apply_health_snapshot(self, records: List[Dict]):
+        """从持久化快照恢复失败计数和冷却状态，需在 rebuild_key_rings 之前调用"""
+        health = {}
+        for record in records:
+            key = record["api_key"]
+            if record.get("key_type") == "vertex":
+                if key in self.vertex_key_failure_counts:
+                    self.vertex_key_failure_counts[key] = record["failure_count"]
+                continue
+            if key not in self.key_failure_counts:
+                continue
+            self.key_failure_counts[key] = record["failure_count"]
+            cooldown_until = record.get("cooldown_until")
+            health[key] = {
+                "cooldown_until": (
+                    cooldown_until.timestamp() if cooldown_until else None
+                ),
+                "cooldown_level": record.get("cooldown_level") or 0,
+                "last_error": record.get("last_error"),
+            }
+        self.import_key_health(health)
+
+    def get_key_state(self, key: str) -> KeyState:
+        """获取 key 当前的健康状态"""
+        if self.key_failure_counts.get(key, 0) >= self.MAX_FAILURES:
+            return KeyState.DEAD
+        if self.key_cooldown_until.get(key, 0) > time.time():
+            return KeyState.COOLING
+        return KeyState.HEALTHY
+
+    async def _apply_failure(self, api_key: str, error_message: Optional[str]) -> ErrorClass:
+        """根据错误类别更新 key 的健康状态，返回错误类别"""
+        error_class = classify_error(error_message)
+        log_key = redact_key_for_logging(api_key)
+        shared_count = None
+        if error_class == ErrorClass.TRANSIENT:
+            shared_count = await self._incr_shared_failure_count(api_key)
         async with self.failure_count_lock:
-            self.key_failure_counts[api_key] += 1
-            if self.key_failure_counts[api_key] >= self.MAX_FAILURES:
+            self.health_dirty = True
+            if error_message:
+                self.key_last_errors[api_key] = error_message[:500]
+            if error_class == ErrorClass.CLIENT:
+                logger.info(
+                    f"Client-side error on API key {log_key}, key health unchanged"
+                )
+                return error_class
+            if error_class == ErrorClass.AUTH:
+                self.key_failure_counts[api_key] = self.MAX_FAILURES
+                self._clear_cooldown(api_key)
+                self.key_ring.bench(api_key)
                 logger.warning(
-                    f"API key {redact_key_for_logging(api_key)} has failed {self.MAX_FAILURES} times"
+                    f"API key {log_key} rejected by upstream, marked as invalid"
                 )
+                return error_class
+            if error_class == ErrorClass.TRANSIENT:
+                if shared_count is None:
+                    count = self.key_failure_counts.get(api_key, 0) + 1
+                else:
+                    count = shared_count
+                self.key_failure_counts[api_key] = count
+                if count >= self.MAX_FAILURES:
+                    self._clear_cooldown(api_key)
+                    self.key_ring.bench(api_key)
+                    logger.warning(
+                        f"API key {log_key} has failed {self.MAX_FAILURES} times"
+                    )
+                    return error_class
+            duration = self._start_cooldown(api_key)
+            logger.warning(
+                f"API key {log_key} cooling down for {duration:g}s after {error_class.value} error"
+            )
+        return error_class
+
+    async def record_failure(self, api_key: str, error_message: Optional[str] = None):
+        """记录一次不会在原请求内重试的失败（如对冲请求），只更新 key 健康状态"""
+        error_class = await self._apply_failure(api_key, error_message)
+        if error_class == ErrorClass.CLIENT:
+            return
+        if error_class == ErrorClass.AUTH:
+            await self._publish_failure_count(api_key)
+        await self._publish_key_health(api_key)
+
+    async def handle_api_failure(
+        self,
+        api_key: str,
+        retries: int,
+        model: Optional[str] = None,
+        error_message: Optional[str] = None,
+    ) -> str:
+        """处理API调用失败
+
+        根据错误类别更新 key 状态：客户端错误不影响 key，认证错误直接失效，
+        限流和临时错误进入冷却，冷却到期后自动恢复。
+        """
+        await self.record_failure(api_key, error_message)
         if retries < settings.MAX_RETRIES:
-            return await self.get_next_working_key()
+            return await self.get_next_working_key(model)
         else:
             return ""
 
@@ -128,7 +687,9 @@ class KeyManager:
         """处理 Vertex Express API 调用失败"""
         async with self.vertex_failure_count_lock:
             self.vertex_key_failure_counts[api_key] += 1
+            self.health_dirty = True
             if self.vertex_key_failure_counts[api_key] >= self.MAX_FAILURES:
+                self.vertex_key_ring.bench(api_key)
                 logger.warning(
                     f"Vertex Express API key {redact_key_for_logging(api_key)} has failed {self.MAX_FAILURES} times"
                 )
@@ -188,6 +749,8 @@ _singleton_instance = None
 _singleton_lock = asyncio.Lock()
 _preserved_failure_counts: Union[Dict[str, int], None] = None
 _preserved_vertex_failure_counts: Union[Dict[str, int], None] = None
+_preserved_key_health: Union[Dict[str, Dict], None] = None
+_key_health_restored = False
 _preserved_old_api_keys_for_reset: Union[list, None] = None
 _preserved_vertex_old_api_keys_for_reset: Union[list, None] = None
 _preserved_next_key_in_cycle: Union[str, None] = None
@@ -204,7 +767,7 @@ async def get_key_manager_instance(
     如果已创建实例，则忽略 api_keys 参数，返回现有单例。
     如果在重置后调用，会尝试恢复之前的状态（失败计数、循环位置）。
     """
-    global _singleton_instance, _preserved_failure_counts, _preserved_vertex_failure_counts, _preserved_old_api_keys_for_reset, _preserved_vertex_old_api_keys_for_reset, _preserved_next_key_in_cycle, _preserved_vertex_next_key_in_cycle
+    global _singleton_instance, _preserved_failure_counts, _preserved_vertex_failure_counts, _preserved_key_health, _key_health_restored, _preserved_old_api_keys_for_reset, _preserved_vertex_old_api_keys_for_reset, _preserved_next_key_in_cycle, _preserved_vertex_next_key_in_cycle
 
     async with _singleton_lock:
         if _singleton_instance is None:
@@ -256,6 +819,19 @@ async def get_key_manager_instance(
                 logger.info("Inherited failure counts for applicable Vertex keys.")
             _preserved_vertex_failure_counts = None
 
+            if _preserved_key_health:
+                _singleton_instance.import_key_health(_preserved_key_health)
+                logger.info("Inherited cooldown state for applicable keys.")
+            _preserved_key_health = None
+
+            # 进程首次创建实例时，从数据库恢复上次保存的健康状态
+            if not _key_health_restored:
+                _key_health_restored = True
+                await _restore_key_health(_singleton_instance)
+
+            _singleton_instance.rebuild_key_rings()
+            _rate_limiter.forget_keys(set(_singleton_instance.api_keys))
+
             # 2. 调整 key_cycle 的起始点
             start_key_for_new_cycle = None
             if (
@@ -296,6 +872,7 @@ async def get_key_manager_instance(
                     )
                     for _ in range(target_idx):
                         next(_singleton_instance.key_cycle)
+                    _singleton_instance.key_ring.rotate_to(start_key_for_new_cycle)
                     logger.info(
                         f"Key cycle in new instance advanced. Next call to get_next_key() will yield: {start_key_for_new_cycle}"
                     )
@@ -366,6 +943,9 @@ async def get_key_manager_instance(
                     )
                     for _ in range(target_idx):
                         next(_singleton_instance.vertex_key_cycle)
+                    _singleton_instance.vertex_key_ring.rotate_to(
+                        start_key_for_new_vertex_cycle
+                    )
                     logger.info(
                         f"Vertex key cycle in new instance advanced. Next call to get_next_vertex_key() will yield: {start_key_for_new_vertex_cycle}"
                     )
@@ -405,7 +985,7 @@ async def reset_key_manager_instance():
     将保存当前实例的状态（失败计数、旧 API keys、下一个 key 提示）
     以供下一次 get_key_manager_instance 调用时恢复。
     """
-    global _singleton_instance, _preserved_failure_counts, _preserved_vertex_failure_counts, _preserved_old_api_keys_for_reset, _preserved_vertex_old_api_keys_for_reset, _preserved_next_key_in_cycle, _preserved_vertex_next_key_in_cycle
+    global _singleton_instance, _preserved_failure_counts, _preserved_vertex_failure_counts, _preserved_key_health, _preserved_old_api_keys_for_reset, _preserved_vertex_old_api_keys_for_reset, _preserved_next_key_in_cycle, _preserved_vertex_next_key_in_cycle
     async with _singleton_lock:
         if _singleton_instance:
             # 1. 保存失败计数
@@ -413,6 +993,7 @@ async def reset_key_manager_instance():
             _preserved_vertex_failure_counts = (
                 _singleton_instance.vertex_key_failure_counts.copy()
             )
+            _preserved_key_health = _singleton_instance.export_key_health()
 
             # 2. 保存旧的 API keys 列表
             _preserved_old_api_keys_for_reset = _singleton_instance.api_keys.copy()
@@ -462,3 +1043,33 @@ async def reset_key_manager_instance():
             logger.info(
                 "KeyManager instance was not set (or already reset), no reset action performed."
             )
+
+
+async def _restore_key_health(key_manager: KeyManager):
+    """从数据库快照恢复 key 的失败计数和冷却状态"""
+    if not settings.KEY_HEALTH_PERSIST_ENABLED:
+        return
+    try:
+        records = await get_key_health_snapshot()
+    except Exception as e:
+        logger.warning(f"Could not restore key health snapshot: {e}")
+        return
+    if records:
+        key_manager.apply_health_snapshot(records)
+        logger.info(f"Restored key health snapshot for {len(records)} keys.")
+
+
+async def persist_key_health_snapshot():
+    """将 KeyManager 中有变化的健康状态写入数据库（write-behind），无变化时跳过"""
+    if not settings.KEY_HEALTH_PERSIST_ENABLED or _singleton_instance is None:
+        return
+    key_manager = _singleton_instance
+    if not key_manager.health_dirty:
+        return
+    key_manager.health_dirty = False
+    records = key_manager.build_health_snapshot()
+    if await save_key_health_snapshot(records):
+        logger.debug(f"Persisted key health snapshot with {len(records)} records.")
+    else:
+        # 写入失败时保留脏标记，下一周期重试
+        key_manager.health_dirty = True
@@ -0,0 +1,85 @@
+"""
+健康 key 轮转环
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+
+class KeyRing:
+    """健康 key 轮转环
+
+    仅健康的 key 参与轮转，失效的 key 被移入 benched 集合。
+    选取下一个 key、移出和恢复均为 O(1)，与失效 key 的数量无关。
+    另外按配置顺序维护健康 key 的有序列表，多个 worker 共用全局轮询位置时按位置 O(1) 取 key，
+    各 worker 健康状态一致时同一位置对应同一个 key。
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self._active: "OrderedDict[str, None]" = OrderedDict.fromkeys(keys)
+        self._benched: Set[str] = set()
+        self._positions: Dict[str, int] = {
+            key: position for position, key in enumerate(self._active)
+        }
+        self._indexed: List[str] = list(self._active)
+        self._indexed_positions: List[int] = list(range(len(self._indexed)))
+
+    def next(self) -> Optional[str]:
+        """返回下一个健康 key 并将其移到队尾，没有健康 key 时返回 None"""
+        if not self._active:
+            return None
+        key = next(iter(self._active))
+        self._active.move_to_end(key)
+        return key
+
+    def bench(self, key: str):
+        """将 key 移出轮转"""
+        if self._active.pop(key, False) is None:
+            self._benched.add(key)
+            index = bisect_left(self._indexed_positions, self._positions[key])
+            del self._indexed[index]
+            del self._indexed_positions[index]
+
+    def restore(self, key: str):
+        """将被移出的 key 恢复到轮转队尾"""
+        if key in self._benched:
+            self._benched.discard(key)
+            self._active[key] = None
+            position = self._positions[key]
+            index = bisect_left(self._indexed_positions, position)
+            self._indexed.insert(index, key)
+            self._indexed_positions.insert(index, position)
+
+    def key_at(self, cursor: int) -> Optional[str]:
+        """按全局轮询位置在健康 key 中取 key，不影响 next() 的轮转顺序，没有健康 key 时返回 None"""
+        if not self._indexed:
+            return None
+        return self._indexed[cursor % len(self._indexed)]
+
+    def rotate_to(self, key: str):
+        """调整轮转起点，使下一次 next() 返回指定 key"""
+        if key not in self._active:
+            return
+        while next(iter(self._active)) != key:
+            self._active.move_to_end(next(iter(self._active)))
+
+    def touch(self, key: str):
+        """将选中的 key 移到队尾，相当于一次 next()"""
+        if key in self._active:
+            self._active.move_to_end(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """按轮转顺序遍历健康 key，遍历期间不能修改轮转环"""
+        return iter(self._active)
+
+    def is_active(self, key: str) -> bool:
+        return key in self._active
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    @property
+    def benched_count(self) -> int:
+        return len(self._benched)
@@ -0,0 +1,150 @@
+"""
+按 key 和模型维度的限流令牌桶
+
+每个 (key, 模型) 组合维护 RPM（每分钟请求数）、TPM（每分钟 token 数）和
+RPD（每日请求数）三个令牌桶。选 key 时跳过没有余量的 key，
+避免请求打到上游后才收到 429 再重试。
+"""
+
+import time
+from typing import Callable, Dict, Set, Tuple
+
+# (rpm, tpm, rpd)，0 表示不限制
+RateLimits = Tuple[int, int, int]
+
+_MINUTE_SECONDS = 60.0
+_DAY_SECONDS = 86400.0
+
+
+class TokenBucket:
+    """按固定速率补充的令牌桶，容量为 0 时表示不限制"""
+
+    __slots__ = ("capacity", "period", "tokens", "updated_at")
+
+    def __init__(self, capacity: int, period: float, now: float):
+        self.capacity = capacity
+        self.period = period
+        self.tokens = float(capacity)
+        self.updated_at = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def reconfigure(self, capacity: int, now: float):
+        """限额变化时调整容量，已消耗的部分保持不变"""
+        if capacity == self.capacity:
+            return
+        self._refill(now)
+        used = self.capacity - self.tokens
+        self.capacity = capacity
+        self.tokens = min(float(capacity), capacity - used)
+
+    def _refill(self, now: float):
+        if self.unlimited:
+            return
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            rate = self.capacity / self.period
+            self.tokens = min(float(self.capacity), self.tokens + elapsed * rate)
+        self.updated_at = now
+
+    def available(self, now: float) -> float:
+        if self.unlimited:
+            return float("inf")
+        self._refill(now)
+        return self.tokens
+
+    def consume(self, amount: float, now: float):
+        """扣除令牌，允许透支（token 用量在响应返回后才知道）"""
+        if self.unlimited:
+            return
+        self._refill(now)
+        self.tokens -= amount
+
+    def refund(self, amount: float, now: float):
+        """归还令牌，不超过容量"""
+        if self.unlimited:
+            return
+        self._refill(now)
+        self.tokens = min(float(self.capacity), self.tokens + amount)
+
+
+class _KeyModelBuckets:
+    __slots__ = ("rpm", "tpm", "rpd")
+
+    def __init__(self, limits: RateLimits, now: float):
+        rpm, tpm, rpd = limits
+        self.rpm = TokenBucket(rpm, _MINUTE_SECONDS, now)
+        self.tpm = TokenBucket(tpm, _MINUTE_SECONDS, now)
+        self.rpd = TokenBucket(rpd, _DAY_SECONDS, now)
+
+    def reconfigure(self, limits: RateLimits, now: float):
+        rpm, tpm, rpd = limits
+        self.rpm.reconfigure(rpm, now)
+        self.tpm.reconfigure(tpm, now)
+        self.rpd.reconfigure(rpd, now)
+
+
+class KeyRateLimiter:
+    """按 (key, 模型) 维护令牌桶的限流器
+
+    Args:
+        limits_provider: 根据模型名返回 (rpm, tpm, rpd) 限额的函数
+        clock: 单调时钟，便于测试注入
+    """
+
+    def __init__(
+        self,
+        limits_provider: Callable[[str], RateLimits],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._limits_provider = limits_provider
+        self._clock = clock
+        self._buckets: Dict[Tuple[str, str], _KeyModelBuckets] = {}
+
+    def _get_buckets(self, key: str, model: str, now: float) -> _KeyModelBuckets:
+        limits = self._limits_provider(model)
+        buckets = self._buckets.get((key, model))
+        if buckets is None:
+            buckets = _KeyModelBuckets(limits, now)
+            self._buckets[(key, model)] = buckets
+        else:
+            buckets.reconfigure(limits, now)
+        return buckets
+
+    def has_headroom(self, key: str, model: str) -> bool:
+        """检查 key 在该模型下是否还有请求和 token 余量"""
+        now = self._clock()
+        buckets = self._get_buckets(key, model, now)
+        return (
+            buckets.rpm.available(now) >= 1
+            and buckets.rpd.available(now) >= 1
+            and buckets.tpm.available(now) > 0
+        )
+
+    def record_request(self, key: str, model: str):
+        """记录一次发往上游的请求"""
+        now = self._clock()
+        buckets = self._get_buckets(key, model, now)
+        buckets.rpm.consume(1, now)
+        buckets.rpd.consume(1, now)
+
+    def release_request(self, key: str, model: str):
+        """归还一次已记录但最终没有发往上游的请求"""
+        now = self._clock()
+        buckets = self._get_buckets(key, model, now)
+        buckets.rpm.refund(1, now)
+        buckets.rpd.refund(1, now)
+
+    def record_tokens(self, key: str, model: str, tokens: int):
+        """记录响应中 usageMetadata 报告的 token 用量"""
+        if tokens <= 0:
+            return
+        now = self._clock()
+        self._get_buckets(key, model, now).tpm.consume(tokens, now)
+
+    def forget_keys(self, keep_keys: Set[str]):
+        """清除已不在 key 列表中的令牌桶"""
+        for bucket_key in [k for k in self._buckets if k[0] not in keep_keys]:
+            del self._buckets[bucket_key]
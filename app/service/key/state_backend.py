@@ -0,0 +1,260 @@
+"""
+key 状态共享后端
+
+多个 worker 进程之间共享轮询位置、失败计数、冷却状态和上传会话。
+- memory: 进程内存储（默认，单 worker 时使用）
+- database: 基于现有数据库（SQLite/MySQL）的 t_shared_state 表，见 db_state_backend
+- redis: 任意兼容 Redis 协议（RESP）的服务，不依赖额外的客户端库
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+
+class KeyStateBackend(ABC):
+    """共享状态后端接口，值统一使用字符串"""
+
+    # 是否跨进程共享，为 False 时 KeyManager 直接使用本地状态
+    shared: bool = True
+
+    @abstractmethod
+    async def get(self, name: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def set(self, name: str, value: str, ttl: Optional[int] = None):
+        pass
+
+    @abstractmethod
+    async def delete(self, name: str):
+        pass
+
+    @abstractmethod
+    async def incr(self, name: str) -> int:
+        pass
+
+    @abstractmethod
+    async def hset(self, name: str, field: str, value: str):
+        pass
+
+    @abstractmethod
+    async def hincrby(self, name: str, field: str, amount: int = 1) -> int:
+        """原子地增加哈希字段的整数值，返回增加后的值"""
+        pass
+
+    @abstractmethod
+    async def hdel(self, name: str, field: str):
+        pass
+
+    @abstractmethod
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryStateBackend(KeyStateBackend):
+    """进程内存后端"""
+
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+
+    def _purge_expired(self, now: float):
+        expired = [
+            name
+            for name, (_, expires_at) in self._values.items()
+            if expires_at is not None and expires_at <= now
+        ]
+        for name in expired:
+            del self._values[name]
+
+    async def get(self, name: str) -> Optional[str]:
+        item = self._values.get(name)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._values[name]
+            return None
+        return value
+
+    async def set(self, name: str, value: str, ttl: Optional[int] = None):
+        now = time.time()
+        self._purge_expired(now)
+        self._values[name] = (value, now + ttl if ttl else None)
+
+    async def delete(self, name: str):
+        self._values.pop(name, None)
+        self._hashes.pop(name, None)
+
+    async def incr(self, name: str) -> int:
+        value = int(await self.get(name) or 0) + 1
+        self._values[name] = (str(value), None)
+        return value
+
+    async def hset(self, name: str, field: str, value: str):
+        self._hashes.setdefault(name, {})[field] = value
+
+    async def hincrby(self, name: str, field: str, amount: int = 1) -> int:
+        fields = self._hashes.setdefault(name, {})
+        value = int(fields.get(field) or 0) + amount
+        fields[field] = str(value)
+        return value
+
+    async def hdel(self, name: str, field: str):
+        self._hashes.get(name, {}).pop(field, None)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._hashes.get(name, {}))
+
+
+class RedisProtocolError(Exception):
+    """Redis 服务返回的错误"""
+
+
+class RedisStateBackend(KeyStateBackend):
+    """基于 RESP 协议的最小 Redis 客户端，单连接串行执行命令，断线后自动重连
+
+    连接和每条命令都有超时；命令被取消或超时时回复可能尚未读取，连接随之丢弃，
+    避免下一条命令读到上一条命令的回复。
+    """
+
+    def __init__(self, url: str, key_prefix: str = "gemini_balance:", timeout: float = 2.0):
+        parsed = urlparse(url)
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._username = unquote(parsed.username) if parsed.username else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._prefix = key_prefix
+        self._timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by Redis server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise RedisProtocolError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if prefix == b"*":
+            count = int(payload)
+            if count == -1:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisProtocolError(f"Unexpected reply: {line!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+        try:
+            if self._password:
+                if self._username:
+                    await self._send("AUTH", self._username, self._password)
+                else:
+                    await self._send("AUTH", self._password)
+            if self._db:
+                await self._send("SELECT", self._db)
+        except BaseException:
+            await self._drop_connection()
+            raise
+
+    async def _send(self, *args):
+        self._writer.write(self._encode(*args))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _drop_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+    async def _execute_once(self, *args):
+        if self._writer is None:
+            await self._connect()
+        return await self._send(*args)
+
+    async def execute(self, *args):
+        """执行一条命令，连接异常时重连并重试一次，超时不重试"""
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    return await asyncio.wait_for(
+                        self._execute_once(*args), self._timeout
+                    )
+                except RedisProtocolError:
+                    # 错误回复已完整读取，连接仍可继续使用
+                    raise
+                except asyncio.TimeoutError:
+                    await self._drop_connection()
+                    raise
+                except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                    await self._drop_connection()
+                    if attempt == 1:
+                        raise
+                except BaseException:
+                    # 被取消时回复可能尚未读取，连接状态未知
+                    await self._drop_connection()
+                    raise
+
+    def _key(self, name: str) -> str:
+        return self._prefix + name
+
+    async def get(self, name: str) -> Optional[str]:
+        return await self.execute("GET", self._key(name))
+
+    async def set(self, name: str, value: str, ttl: Optional[int] = None):
+        if ttl:
+            await self.execute("SET", self._key(name), value, "EX", int(ttl))
+        else:
+            await self.execute("SET", self._key(name), value)
+
+    async def delete(self, name: str):
+        await self.execute("DEL", self._key(name))
+
+    async def incr(self, name: str) -> int:
+        return await self.execute("INCR", self._key(name))
+
+    async def hset(self, name: str, field: str, value: str):
+        await self.execute("HSET", self._key(name), field, value)
+
+    async def hincrby(self, name: str, field: str, amount: int = 1) -> int:
+        return await self.execute("HINCRBY", self._key(name), field, amount)
+
+    async def hdel(self, name: str, field: str):
+        await self.execute("HDEL", self._key(name), field)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        reply: List[str] = await self.execute("HGETALL", self._key(name)) or []
+        return dict(zip(reply[::2], reply[1::2]))
+
+    async def close(self):
+        async with self._lock:
+            await self._drop_connection()
@@ -1,4 +1,5 @@
 
+import asyncio
 import datetime
 import json
 import re
@@ -6,6 +7,7 @@ import time
 from typing import Any, AsyncGenerator, Dict, Union
 
 from app.config.config import settings
+from app.core.constants import CLIENT_CLOSED_REQUEST_STATUS
 from app.database.services import (
     add_error_log,
     add_request_log,
@@ -123,16 +125,20 @@ class OpenAICompatiableService:
             current_attempt_key = api_key
             final_api_key = current_attempt_key
             try:
-                async for line in self.api_client.stream_generate_content(
+                async for event in self.api_client.stream_generate_content(
                     payload, current_attempt_key
                 ):
-                    if line.startswith("data:"):
-                        # print(line)
-                        yield line + "\n\n"
+                    yield event.encode()
                 logger.info("Streaming completed successfully")
                 is_success = True
                 status_code = 200
                 break
+            except asyncio.CancelledError:
+                # 客户端断开连接，上游流随取消一同关闭，不计为 key 失败
+                logger.info(f"Client disconnected, cancelled streaming for model {model}")
+                is_success = False
+                status_code = CLIENT_CLOSED_REQUEST_STATUS
+                raise
             except Exception as e:
                 retries += 1
                 is_success = False
@@ -157,7 +163,7 @@ class OpenAICompatiableService:
 
                 if self.key_manager:
                     api_key = await self.key_manager.handle_api_failure(
-                        current_attempt_key, retries
+                        current_attempt_key, retries, model, error_log_msg
                     )
                     if api_key:
                         logger.info(f"Switched to new API key: {redact_key_for_logging(api_key)}")
@@ -8,7 +8,9 @@ from sqlalchemy import delete
 
 from app.database.connection import database
 from app.config.config import settings
+from app.core.constants import STATS_ROLLUP_MINUTE_RETENTION_HOURS
 from app.database.models import RequestLog
+from app.database.services import compact_request_stats
 from app.log.logger import get_request_log_logger
 
 logger = get_request_log_logger()
@@ -48,3 +50,25 @@ async def delete_old_request_logs_task():
             f"An error occurred during the scheduled request log deletion: {str(e)}",
             exc_info=True,
         )
+
+
+async def compact_request_stats_task():
+    """
+    定时将较早的分钟汇总合并为小时汇总。
+    """
+    if not settings.STATS_ROLLUP_ENABLED:
+        return
+
+    try:
+        before = (
+            datetime.now() - timedelta(hours=STATS_ROLLUP_MINUTE_RETENTION_HOURS)
+        ).replace(minute=0, second=0, microsecond=0)
+        compacted = await compact_request_stats(before)
+        logger.info(
+            f"Compacted {compacted} minute stats rollups older than {before} into hourly rollups."
+        )
+    except Exception as e:
+        logger.error(
+            f"An error occurred during request stats rollup compaction: {str(e)}",
+            exc_info=True,
+        )
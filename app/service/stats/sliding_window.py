@@ -0,0 +1,111 @@
+"""
+进程内的滑动窗口调用计数
+
+每个 (key, 模型, 结果) 一个计数器，由两级环形缓冲区组成：最近 60 秒按秒计数，最近 60 分钟按分钟计数。
+写入只修改当前槽位（槽位过期时先清零），读取最多遍历 60 个槽位，不访问数据库。
+计数器只在事件循环线程中读写，不需要加锁。
+
+计数只包含当前进程处理的请求，进程启动后不足一个窗口时长时由调用方退回数据库查询。
+"""
+
+import math
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+SLOT_COUNT = 60
+MAX_WINDOW_SECONDS = SLOT_COUNT * 60
+
+
+class SlidingWindowCounter:
+    """两级环形缓冲区计数器：60 个秒槽位与 60 个分钟槽位"""
+
+    __slots__ = ("_second_counts", "_second_epochs", "_minute_counts", "_minute_epochs")
+
+    def __init__(self):
+        self._second_counts = [0] * SLOT_COUNT
+        self._second_epochs = [-1] * SLOT_COUNT
+        self._minute_counts = [0] * SLOT_COUNT
+        self._minute_epochs = [-1] * SLOT_COUNT
+
+    def add(self, now: float, count: int = 1):
+        second = int(now)
+        index = second % SLOT_COUNT
+        if self._second_epochs[index] != second:
+            self._second_epochs[index] = second
+            self._second_counts[index] = 0
+        self._second_counts[index] += count
+
+        minute = second // 60
+        index = minute % SLOT_COUNT
+        if self._minute_epochs[index] != minute:
+            self._minute_epochs[index] = minute
+            self._minute_counts[index] = 0
+        self._minute_counts[index] += count
+
+    def total(self, now: float, seconds: int) -> int:
+        """最近 seconds 秒内的计数：不超过 60 秒时精确到秒，否则精确到分钟（包含当前不完整的分钟）"""
+        second = int(now)
+        if seconds <= SLOT_COUNT:
+            oldest = second - seconds
+            counts, epochs = self._second_counts, self._second_epochs
+        else:
+            minute = second // 60
+            oldest = minute - min(SLOT_COUNT, math.ceil(seconds / 60))
+            counts, epochs = self._minute_counts, self._minute_epochs
+        return sum(count for count, epoch in zip(counts, epochs) if epoch > oldest)
+
+
+class LiveCallStats:
+    """按 (key, 模型, 结果) 维护滑动窗口计数，另外按结果维护总计数以便快速统计全部调用"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._counters: Dict[Tuple[str, str, bool], SlidingWindowCounter] = {}
+        self._totals = {True: SlidingWindowCounter(), False: SlidingWindowCounter()}
+        self.started_at = clock()
+
+    def record(self, api_key: Optional[str], model_name: Optional[str], success: bool):
+        """记录一次调用"""
+        now = self._clock()
+        key = (api_key or "", model_name or "", success)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = SlidingWindowCounter()
+        counter.add(now)
+        self._totals[success].add(now)
+
+    def covers(self, seconds: int) -> bool:
+        """是否可以回答最近 seconds 秒的统计：窗口不超过一小时，且进程已运行超过窗口时长"""
+        return seconds <= MAX_WINDOW_SECONDS and self._clock() - self.started_at >= seconds
+
+    def get_calls(
+        self,
+        seconds: int,
+        api_key: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """最近 seconds 秒的调用次数 (总数、成功、失败)，可按 key 和模型过滤"""
+        now = self._clock()
+        counts = {True: 0, False: 0}
+        if api_key is None and model_name is None:
+            for success, counter in self._totals.items():
+                counts[success] = counter.total(now, seconds)
+        else:
+            for (key, model, success), counter in self._counters.items():
+                if (api_key is None or key == api_key) and (
+                    model_name is None or model == model_name
+                ):
+                    counts[success] += counter.total(now, seconds)
+        return {
+            "total": counts[True] + counts[False],
+            "success": counts[True],
+            "failure": counts[False],
+        }
+
+
+_live_call_stats = LiveCallStats()
+
+
+def get_live_call_stats() -> LiveCallStats:
+    """获取全局滑动窗口调用计数"""
+    return _live_call_stats
@@ -1,60 +1,162 @@
 # app/service/stats_service.py
 
 import datetime
-from typing import Union
+import time
+from typing import Optional, Tuple, Union
 
 from sqlalchemy import and_, case, func, or_, select
 
+from app.config.config import settings
+from app.core.constants import STATS_ROLLUP_SINCE_CACHE_SECONDS
 from app.database.connection import database
-from app.database.models import RequestLog
+from app.database.models import RequestLog, RequestStatsHour, RequestStatsMinute
+from app.database.rollup import floor_time
+from app.database.services import get_request_stats_since
 from app.log.logger import get_stats_logger
+from app.service.stats.sliding_window import get_live_call_stats
 
 logger = get_stats_logger()
 
+# 汇总统计开始时间的缓存 (读取时间, 开始时间)，之前的请求只存在于原始日志中
+_rollup_since_cache: Optional[Tuple[float, Optional[datetime.datetime]]] = None
+
 
 class StatsService:
     """Service class for handling statistics related operations."""
 
-    async def get_calls_in_last_seconds(self, seconds: int) -> dict[str, int]:
-        """获取过去 N 秒内的调用次数 (总数、成功、失败)"""
-        try:
-            cutoff_time = datetime.datetime.now() - datetime.timedelta(seconds=seconds)
-            query = select(
-                func.count(RequestLog.id).label("total"),
-                func.sum(
-                    case(
-                        (
-                            and_(
-                                RequestLog.status_code >= 200,
-                                RequestLog.status_code < 300,
-                            ),
-                            1,
+    async def _count_calls(
+        self,
+        start_time: datetime.datetime,
+        end_time: Optional[datetime.datetime] = None,
+    ) -> dict[str, int]:
+        """从原始请求日志统计 [start_time, end_time) 内的调用次数 (总数、成功、失败)"""
+        conditions = [RequestLog.request_time >= start_time]
+        if end_time is not None:
+            conditions.append(RequestLog.request_time < end_time)
+        query = select(
+            func.count(RequestLog.id).label("total"),
+            func.sum(
+                case(
+                    (
+                        and_(
+                            RequestLog.status_code >= 200,
+                            RequestLog.status_code < 300,
                         ),
-                        else_=0,
-                    )
-                ).label("success"),
-                func.sum(
-                    case(
-                        (
-                            or_(
-                                RequestLog.status_code < 200,
-                                RequestLog.status_code >= 300,
-                            ),
-                            1,
+                        1,
+                    ),
+                    else_=0,
+                )
+            ).label("success"),
+            func.sum(
+                case(
+                    (
+                        or_(
+                            RequestLog.status_code < 200,
+                            RequestLog.status_code >= 300,
                         ),
-                        (RequestLog.status_code is None, 1),
-                        else_=0,
-                    )
-                ).label("failure"),
-            ).where(RequestLog.request_time >= cutoff_time)
+                        1,
+                    ),
+                    (RequestLog.status_code is None, 1),
+                    else_=0,
+                )
+            ).label("failure"),
+        ).where(*conditions)
+        result = await database.fetch_one(query)
+        if result:
+            return {
+                "total": result["total"] or 0,
+                "success": result["success"] or 0,
+                "failure": result["failure"] or 0,
+            }
+        return {"total": 0, "success": 0, "failure": 0}
+
+    async def _get_rollup_since(self) -> Optional[datetime.datetime]:
+        """汇总统计的开始时间，缓存 STATS_ROLLUP_SINCE_CACHE_SECONDS 秒"""
+        global _rollup_since_cache
+        now = time.monotonic()
+        if (
+            _rollup_since_cache is None
+            or now - _rollup_since_cache[0] >= STATS_ROLLUP_SINCE_CACHE_SECONDS
+        ):
+            _rollup_since_cache = (now, await get_request_stats_since())
+        return _rollup_since_cache[1]
+
+    async def _count_rollup_calls(self, start_time: datetime.datetime) -> dict[str, int]:
+        """从分钟/小时汇总表统计 start_time 之后的调用次数，窗口起点向下对齐到时间桶"""
+        success = failure = 0
+        for table, granularity in (
+            (RequestStatsHour, "hour"),
+            (RequestStatsMinute, "minute"),
+        ):
+            query = select(
+                func.sum(table.success_count).label("success"),
+                func.sum(table.failure_count).label("failure"),
+            ).where(table.bucket_start >= floor_time(start_time, granularity))
             result = await database.fetch_one(query)
             if result:
-                return {
-                    "total": result["total"] or 0,
-                    "success": result["success"] or 0,
-                    "failure": result["failure"] or 0,
-                }
-            return {"total": 0, "success": 0, "failure": 0}
+                success += result["success"] or 0
+                failure += result["failure"] or 0
+        return {"total": success + failure, "success": success, "failure": failure}
+
+    async def _get_calls_since(self, start_time: datetime.datetime) -> dict[str, int]:
+        """统计 start_time 之后的调用次数，启用汇总统计时按时间桶查询汇总表"""
+        if not settings.STATS_ROLLUP_ENABLED:
+            return await self._count_calls(start_time)
+        rollup_since = await self._get_rollup_since()
+        if rollup_since is None:
+            return await self._count_calls(start_time)
+        stats = await self._count_rollup_calls(max(start_time, rollup_since))
+        if start_time < rollup_since:
+            # 启用汇总统计之前的请求只在原始日志中
+            earlier = await self._count_calls(start_time, rollup_since)
+            stats = {name: stats[name] + earlier[name] for name in stats}
+        return stats
+
+    async def _rollup_covers(self, start_time: datetime.datetime) -> bool:
+        """汇总表是否覆盖 start_time 之后的全部请求"""
+        if not settings.STATS_ROLLUP_ENABLED:
+            return False
+        rollup_since = await self._get_rollup_since()
+        return rollup_since is not None and start_time >= rollup_since
+
+    async def _get_rollup_key_usage(
+        self, key: str, start_time: datetime.datetime
+    ) -> list[dict]:
+        """从汇总表按模型统计指定 key 在 start_time 之后的调用次数，按次数降序"""
+        usage: dict[str, int] = {}
+        for table, granularity in (
+            (RequestStatsHour, "hour"),
+            (RequestStatsMinute, "minute"),
+        ):
+            query = (
+                select(
+                    table.model_name,
+                    func.sum(table.success_count + table.failure_count).label("call_count"),
+                )
+                .where(
+                    table.api_key == key,
+                    table.bucket_start >= floor_time(start_time, granularity),
+                    table.model_name != "",
+                )
+                .group_by(table.model_name)
+            )
+            for row in await database.fetch_all(query):
+                usage[row["model_name"]] = usage.get(row["model_name"], 0) + int(row["call_count"] or 0)
+        return [
+            {"model_name": model_name, "call_count": call_count}
+            for model_name, call_count in sorted(usage.items(), key=lambda item: -item[1])
+        ]
+
+    async def get_calls_in_last_seconds(self, seconds: int) -> dict[str, int]:
+        """获取过去 N 秒内的调用次数 (总数、成功、失败)"""
+        if settings.LIVE_STATS_ENABLED:
+            live_stats = get_live_call_stats()
+            if live_stats.covers(seconds):
+                # 一小时以内的窗口直接读取进程内计数，不查询数据库
+                return live_stats.get_calls(seconds)
+        try:
+            cutoff_time = datetime.datetime.now() - datetime.timedelta(seconds=seconds)
+            return await self._get_calls_since(cutoff_time)
         except Exception as e:
             logger.error(f"Failed to get calls in last {seconds} seconds: {e}")
             return {"total": 0, "success": 0, "failure": 0}
@@ -74,42 +176,7 @@ class StatsService:
             start_of_month = now.replace(
                 day=1, hour=0, minute=0, second=0, microsecond=0
             )
-            query = select(
-                func.count(RequestLog.id).label("total"),
-                func.sum(
-                    case(
-                        (
-                            and_(
-                                RequestLog.status_code >= 200,
-                                RequestLog.status_code < 300,
-                            ),
-                            1,
-                        ),
-                        else_=0,
-                    )
-                ).label("success"),
-                func.sum(
-                    case(
-                        (
-                            or_(
-                                RequestLog.status_code < 200,
-                                RequestLog.status_code >= 300,
-                            ),
-                            1,
-                        ),
-                        (RequestLog.status_code is None, 1),
-                        else_=0,
-                    )
-                ).label("failure"),
-            ).where(RequestLog.request_time >= start_of_month)
-            result = await database.fetch_one(query)
-            if result:
-                return {
-                    "total": result["total"] or 0,
-                    "success": result["success"] or 0,
-                    "failure": result["failure"] or 0,
-                }
-            return {"total": 0, "success": 0, "failure": 0}
+            return await self._get_calls_since(start_of_month)
         except Exception as e:
             logger.error(f"Failed to get calls in current month: {e}")
             return {"total": 0, "success": 0, "failure": 0}
@@ -218,21 +285,23 @@ class StatsService:
         cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=24)
 
         try:
-            query = (
-                select(
-                    RequestLog.model_name, func.count(
-                        RequestLog.id).label("call_count")
-                )
-                .where(
-                    RequestLog.api_key == key,
-                    RequestLog.request_time >= cutoff_time,
-                    RequestLog.model_name.isnot(None),
+            if await self._rollup_covers(cutoff_time):
+                results = await self._get_rollup_key_usage(key, cutoff_time)
+            else:
+                query = (
+                    select(
+                        RequestLog.model_name, func.count(
+                            RequestLog.id).label("call_count")
+                    )
+                    .where(
+                        RequestLog.api_key == key,
+                        RequestLog.request_time >= cutoff_time,
+                        RequestLog.model_name.isnot(None),
+                    )
+                    .group_by(RequestLog.model_name)
+                    .order_by(func.count(RequestLog.id).desc())
                 )
-                .group_by(RequestLog.model_name)
-                .order_by(func.count(RequestLog.id).desc())
-            )
-
-            results = await database.fetch_all(query)
+                results = await database.fetch_all(query)
 
             if not results:
                 logger.info(
@@ -9,6 +9,8 @@ from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 import logging
 
+from fastapi import Request
+
 from app.core.constants import DATA_URL_PATTERN, IMAGE_URL_PATTERN, VALID_IMAGE_RATIOS
 
 helper_logger = logging.getLogger("app.utils")
@@ -173,6 +175,17 @@ def redact_key_for_logging(key: str) -> str:
         return f"{key[:6]}...{key[-6:]}"
 
 
+async def get_request_model(request: Request) -> Optional[str]:
+    """从 JSON 请求体中读取 model 字段，请求体已由 FastAPI 缓存，不会重复读取网络流"""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if isinstance(body, dict) and isinstance(body.get("model"), str):
+        return body["model"]
+    return None
+
+
 def get_current_version(default_version: str = "0.0.0") -> str:
     """Reads the current version from the VERSION file."""
     version_file = VERSION_FILE_PATH
@@ -0,0 +1,168 @@
+"""
+请求日志/错误日志索引的查询计划与耗时对比
+
+在内存 SQLite 中生成模拟日志，分别在没有二级索引和创建模型中声明的索引后，
+对统计页、key 用量详情、错误日志筛选和过期日志清理使用的查询执行 EXPLAIN QUERY PLAN 并计时。
+
+用法（在项目根目录）:
+    DATABASE_TYPE=sqlite python scripts/benchmark_log_indexes.py --rows 500000
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func, insert, select  # noqa: E402
+
+from app.database.models import ErrorLog, RequestLog  # noqa: E402
+
+MODELS = ["gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.0-flash", "gemini-2.5-flash-lite"]
+
+
+def populate(conn, rows: int, keys: int, days: int):
+    now = datetime.datetime.now()
+    api_keys = [f"AIzaSy{i:033d}" for i in range(keys)]
+    rng = random.Random(0)
+    batch = []
+    errors = []
+    for i in range(rows):
+        request_time = now - datetime.timedelta(seconds=rng.randrange(days * 86400))
+        key = rng.choice(api_keys)
+        model = rng.choice(MODELS)
+        success = rng.random() > 0.05
+        batch.append(
+            dict(
+                request_time=request_time,
+                model_name=model,
+                api_key=key,
+                is_success=success,
+                status_code=200 if success else 429,
+                latency_ms=rng.randrange(200, 20000),
+            )
+        )
+        if not success:
+            errors.append(
+                dict(
+                    gemini_key=key,
+                    model_name=model,
+                    error_type="gemini-chat-stream",
+                    error_log="status code 429",
+                    error_code=rng.choice([429, 500, 503]),
+                    request_time=request_time,
+                )
+            )
+        if len(batch) >= 10000:
+            conn.execute(insert(RequestLog), batch)
+            batch = []
+    if batch:
+        conn.execute(insert(RequestLog), batch)
+    if errors:
+        conn.execute(insert(ErrorLog), errors)
+    return api_keys[0]
+
+
+def build_queries(key: str):
+    now = datetime.datetime.now()
+    last_24h = now - datetime.timedelta(hours=24)
+    last_hour = now - datetime.timedelta(hours=1)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    cutoff = now - datetime.timedelta(days=25)
+    return [
+        (
+            "stats: calls in last 1h",
+            select(func.count(RequestLog.id)).where(RequestLog.request_time >= last_hour),
+        ),
+        (
+            "stats: calls this month",
+            select(func.count(RequestLog.id)).where(RequestLog.request_time >= start_of_month),
+        ),
+        (
+            "key usage details (24h)",
+            select(RequestLog.model_name, func.count(RequestLog.id))
+            .where(
+                RequestLog.api_key == key,
+                RequestLog.request_time >= last_24h,
+                RequestLog.model_name.isnot(None),
+            )
+            .group_by(RequestLog.model_name),
+        ),
+        (
+            "model calls (24h)",
+            select(func.count(RequestLog.id)).where(
+                RequestLog.model_name == MODELS[0], RequestLog.request_time >= last_24h
+            ),
+        ),
+        (
+            "error logs by code + time",
+            select(ErrorLog.id)
+            .where(ErrorLog.error_code == 500, ErrorLog.request_time >= last_24h)
+            .order_by(ErrorLog.request_time.desc())
+            .limit(20),
+        ),
+        (
+            "error logs by key + time",
+            select(ErrorLog.id)
+            .where(ErrorLog.gemini_key == key, ErrorLog.request_time >= last_24h)
+            .limit(20),
+        ),
+        (
+            "cleanup: expired request logs",
+            select(func.count(RequestLog.id)).where(RequestLog.request_time < cutoff),
+        ),
+    ]
+
+
+def run(conn, queries, repeat: int):
+    results = []
+    for name, query in queries:
+        compiled = query.compile(conn, compile_kwargs={"literal_binds": True})
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(query).fetchall()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        results.append((name, elapsed, "; ".join(row[-1] for row in plan)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=200000, help="模拟请求日志行数")
+    parser.add_argument("--keys", type=int, default=200, help="API key 数量")
+    parser.add_argument("--days", type=int, default=30, help="日志时间跨度（天）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个查询的执行次数")
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    tables = [RequestLog.__table__, ErrorLog.__table__]
+    with engine.begin() as conn:
+        for table in tables:
+            table.create(conn)
+            for index in table.indexes:
+                index.drop(conn)
+        key = populate(conn, args.rows, args.keys, args.days)
+        queries = build_queries(key)
+
+        before = run(conn, queries, args.repeat)
+        start = time.perf_counter()
+        for table in tables:
+            for index in table.indexes:
+                index.create(conn)
+        conn.exec_driver_sql("ANALYZE")
+        index_seconds = time.perf_counter() - start
+        after = run(conn, queries, args.repeat)
+
+    print(f"{args.rows} request log rows, indexes built in {index_seconds:.2f}s\n")
+    for (name, before_ms, before_plan), (_, after_ms, after_plan) in zip(before, after):
+        print(f"{name}: {before_ms:.2f} ms -> {after_ms:.2f} ms")
+        print(f"  before: {before_plan}")
+        print(f"  after:  {after_plan}")
+
+
+if __name__ == "__main__":
+    main()
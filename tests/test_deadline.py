@@ -0,0 +1,110 @@
+"""
+Unit tests for request deadlines and per-attempt timeouts
+"""
+
+import asyncio
+import contextvars
+import unittest
+
+from app.service.client.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    compute_attempt_timeout,
+    deadline_expired,
+    iterate_with_deadline,
+    parse_timeout_header,
+    start_request_deadline,
+)
+
+
+class TestDeadline(unittest.TestCase):
+    """Test cases for the deadline object and header parsing"""
+
+    def test_unbounded_deadline(self):
+        """A deadline without a timeout never expires"""
+        deadline = Deadline()
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired)
+
+    def test_tighten_only_shortens(self):
+        """Tightening keeps the earlier of the two deadlines"""
+        deadline = Deadline(10)
+        deadline.tighten(100)
+        self.assertLessEqual(deadline.remaining(), 10)
+        deadline.tighten(1)
+        self.assertLessEqual(deadline.remaining(), 1)
+        deadline.tighten(None)
+        deadline.tighten(0)
+        self.assertLessEqual(deadline.remaining(), 1)
+
+    def test_parse_timeout_header(self):
+        """Header values accept plain seconds and ms/s suffixes"""
+        self.assertEqual(parse_timeout_header("30"), 30.0)
+        self.assertEqual(parse_timeout_header("1.5s"), 1.5)
+        self.assertEqual(parse_timeout_header("500ms"), 0.5)
+        self.assertIsNone(parse_timeout_header(None))
+        self.assertIsNone(parse_timeout_header("soon"))
+        self.assertIsNone(parse_timeout_header("-1"))
+
+
+class TestAttemptTimeout(unittest.TestCase):
+    """Test cases for per-attempt timeout computation"""
+
+    def run_in_context(self, func, *args):
+        return contextvars.copy_context().run(func, *args)
+
+    def test_without_deadline(self):
+        """Without a deadline the base or adaptive timeout is used"""
+        self.assertEqual(self.run_in_context(compute_attempt_timeout, 300), 300)
+        self.assertEqual(self.run_in_context(compute_attempt_timeout, 300, 20, 3.0, 30), 60)
+        self.assertEqual(self.run_in_context(compute_attempt_timeout, 300, 5, 3.0, 30), 30)
+        self.assertEqual(self.run_in_context(compute_attempt_timeout, 300, 200, 3.0, 30), 300)
+
+    def test_capped_by_remaining_budget(self):
+        """The attempt timeout never exceeds the remaining request budget"""
+
+        def attempt():
+            start_request_deadline(2)
+            return compute_attempt_timeout(300)
+
+        self.assertLessEqual(self.run_in_context(attempt), 2)
+
+    def test_expired_deadline_raises(self):
+        """No attempt is made once the deadline has passed"""
+
+        def attempt():
+            deadline = start_request_deadline(1)
+            deadline.expires_at -= 2
+            self.assertTrue(deadline_expired())
+            return compute_attempt_timeout(300)
+
+        with self.assertRaises(DeadlineExceeded):
+            self.run_in_context(attempt)
+
+
+class TestIterateWithDeadline(unittest.IsolatedAsyncioTestCase):
+    """Test cases for bounding a stream by the request deadline"""
+
+    async def slow_stream(self):
+        for i in range(3):
+            await asyncio.sleep(0.05)
+            yield i
+
+    async def test_stream_within_deadline(self):
+        """Streams that finish in time are passed through unchanged"""
+        start_request_deadline(5)
+        items = [item async for item in iterate_with_deadline(self.slow_stream())]
+        self.assertEqual(items, [0, 1, 2])
+
+    async def test_stream_cut_at_deadline(self):
+        """A stream still running at the deadline is interrupted"""
+        start_request_deadline(0.08)
+        items = []
+        with self.assertRaises(DeadlineExceeded):
+            async for item in iterate_with_deadline(self.slow_stream()):
+                items.append(item)
+        self.assertEqual(items, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+"""
+Unit tests for hedged upstream requests
+"""
+
+import asyncio
+import unittest
+
+from app.service.chat.hedging import (
+    HedgeBudget,
+    LatencyTracker,
+    hedge_stream,
+    run_hedged,
+)
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """Test cases for the LatencyTracker class"""
+
+    def test_percentile(self):
+        """Percentiles use the most recent window of samples"""
+        tracker = LatencyTracker(window_size=100)
+        self.assertIsNone(tracker.percentile("m", 95))
+        for i in range(1, 101):
+            tracker.record("m", float(i))
+        self.assertEqual(tracker.percentile("m", 50), 50.0)
+        self.assertEqual(tracker.percentile("m", 95), 95.0)
+        tracker.record("m", 1000.0)
+        self.assertEqual(tracker.sample_count("m"), 100)
+        self.assertEqual(tracker.percentile("m", 100), 1000.0)
+
+
+class TestHedgeBudget(unittest.TestCase):
+    """Test cases for the HedgeBudget class"""
+
+    def test_budget_limits_ratio(self):
+        """Hedges never exceed the configured share of requests"""
+        budget = HedgeBudget(0.1)
+        hedges = 0
+        for _ in range(100):
+            budget.record_request()
+            if budget.try_spend():
+                hedges += 1
+        self.assertEqual(hedges, 10)
+        self.assertFalse(budget.try_spend())
+
+
+class TestRunHedged(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the run_hedged function"""
+
+    @staticmethod
+    async def _reply(value, delay, error=None):
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return value
+
+    async def test_fast_primary_skips_backup(self):
+        """No backup is started when the primary answers in time"""
+        started = []
+
+        async def start_backup():
+            started.append(True)
+            return self._reply("backup", 0)
+
+        result = await run_hedged(self._reply("primary", 0), 0.1, start_backup)
+        self.assertEqual(result, ("primary", 0))
+        self.assertEqual(started, [])
+
+    async def test_backup_wins_and_primary_is_cancelled(self):
+        """A faster backup wins and the slow primary is cancelled"""
+        primary = asyncio.ensure_future(self._reply("primary", 1))
+
+        async def start_backup():
+            return self._reply("backup", 0.01)
+
+        result = await run_hedged(primary, 0.01, start_backup)
+        self.assertEqual(result, ("backup", 1))
+        await asyncio.sleep(0)
+        self.assertTrue(primary.cancelled())
+
+    async def test_primary_error_reported_when_backup_wins(self):
+        """A failed primary is handed to on_primary_error when the backup succeeds"""
+        errors = []
+
+        async def start_backup():
+            return self._reply("backup", 0.05)
+
+        async def on_primary_error(error):
+            errors.append(str(error))
+
+        result = await run_hedged(
+            self._reply(None, 0.02, RuntimeError("status code 503")),
+            0.01,
+            start_backup,
+            on_primary_error,
+        )
+        self.assertEqual(result, ("backup", 1))
+        self.assertEqual(errors, ["status code 503"])
+
+    async def test_both_fail_raises_primary_error(self):
+        """The primary error is raised when both requests fail"""
+
+        async def start_backup():
+            return self._reply(None, 0.01, RuntimeError("backup"))
+
+        with self.assertRaisesRegex(RuntimeError, "primary"):
+            await run_hedged(
+                self._reply(None, 0.03, RuntimeError("primary")), 0.01, start_backup
+            )
+
+    async def test_declined_backup_waits_for_primary(self):
+        """The primary result is used when no backup is started"""
+
+        async def start_backup():
+            return None
+
+        result = await run_hedged(self._reply("primary", 0.03), 0.01, start_backup)
+        self.assertEqual(result, ("primary", 0))
+
+
+
+class TestHedgeStream(unittest.IsolatedAsyncioTestCase):
+    """Test cases for time-to-first-byte stream hedging"""
+
+    def setUp(self):
+        self.closed = []
+        self.delays = {}
+
+    def _open_stream(self, key):
+        async def stream():
+            try:
+                await asyncio.sleep(self.delays.get(key, 0))
+                if key == "broken":
+                    raise RuntimeError("status code 500")
+                yield ""
+                yield f"data: {key}-1"
+                yield f"data: {key}-2"
+            finally:
+                self.closed.append(key)
+
+        return stream()
+
+    async def _collect(self, api_key, backup_key, delay=0.01):
+        committed = []
+        errors = []
+
+        async def pick_backup_key():
+            return backup_key
+
+        async def on_error(key, error):
+            errors.append((key, str(error)))
+
+        lines = [
+            line
+            async for line in hedge_stream(
+                self._open_stream, api_key, delay, pick_backup_key, committed.append, on_error
+            )
+        ]
+        return lines, committed, errors
+
+    async def test_fast_primary_not_hedged(self):
+        """A primary that answers in time is used without opening a backup"""
+        lines, committed, _ = await self._collect("a", "b", delay=0.1)
+        self.assertEqual(lines, ["", "data: a-1", "data: a-2"])
+        self.assertEqual(committed, ["a"])
+        self.assertEqual(self.closed, ["a"])
+
+    async def test_backup_first_event_wins(self):
+        """The stream with the first event wins and the other is closed before output"""
+        self.delays = {"a": 1}
+        lines, committed, _ = await self._collect("a", "b")
+        self.assertEqual(lines, ["", "data: b-1", "data: b-2"])
+        self.assertEqual(committed, ["b"])
+        self.assertEqual(self.closed, ["a", "b"])
+
+    async def test_failed_primary_reported_when_backup_wins(self):
+        """A primary failing after the hedge started is reported through on_error"""
+        self.delays = {"broken": 0.02, "b": 0.05}
+        lines, committed, errors = await self._collect("broken", "b")
+        self.assertEqual(committed, ["b"])
+        self.assertEqual(lines[-1], "data: b-2")
+        self.assertEqual(errors, [("broken", "status code 500")])
+
+    async def test_primary_error_raised_without_backup(self):
+        """Without a backup key the primary error propagates"""
+        with self.assertRaisesRegex(RuntimeError, "500"):
+            await self._collect("broken", None)
+
+    async def test_closing_early_closes_winner(self):
+        """Closing the hedged stream mid-way also closes the winning upstream stream"""
+
+        async def pick_backup_key():
+            return None
+
+        stream = hedge_stream(self._open_stream, "a", 0.1, pick_backup_key)
+        self.assertEqual(await stream.__anext__(), "")
+        await stream.aclose()
+        self.assertEqual(self.closed, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
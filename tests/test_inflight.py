@@ -0,0 +1,52 @@
+"""
+Unit tests for in-flight request tracking used by least-outstanding key selection
+"""
+
+import unittest
+
+from app.service.key.inflight import InflightTracker
+from app.service.key.key_ring import KeyRing
+
+
+class TestInflightTracker(unittest.TestCase):
+    """Test cases for the InflightTracker class"""
+
+    def test_track_releases_on_error(self):
+        """Requests are released even when the call raises"""
+        tracker = InflightTracker()
+        with self.assertRaises(RuntimeError):
+            with tracker.track("k1"):
+                self.assertEqual(tracker.count("k1"), 1)
+                raise RuntimeError("boom")
+        self.assertEqual(tracker.count("k1"), 0)
+
+    def test_least_loaded(self):
+        """The key with the fewest in-flight requests wins, ties go to the first"""
+        tracker = InflightTracker()
+        tracker.acquire("k1")
+        tracker.acquire("k1")
+        tracker.acquire("k2")
+        self.assertEqual(tracker.least_loaded(["k1", "k2"]), "k2")
+        self.assertEqual(tracker.least_loaded(["k1", "k2", "k3"]), "k3")
+        tracker.release("k1")
+        self.assertEqual(tracker.least_loaded(["k1", "k2"]), "k1")
+        self.assertIsNone(tracker.least_loaded([]))
+
+    def test_ties_rotate_with_key_ring(self):
+        """Touching the selected key spreads idle traffic across the ring"""
+        tracker = InflightTracker()
+        ring = KeyRing(["k1", "k2", "k3"])
+        picked = []
+        for _ in range(3):
+            key = tracker.least_loaded(ring)
+            ring.touch(key)
+            picked.append(key)
+        self.assertEqual(picked, ["k1", "k2", "k3"])
+
+        tracker.acquire("k1")
+        tracker.acquire("k2")
+        self.assertEqual(tracker.least_loaded(ring), "k3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Unit tests for request prefix hashing and the consistent hash ring
+"""
+
+import unittest
+
+from app.service.key.affinity import ConsistentHashRing, compute_affinity_hash
+
+
+class TestComputeAffinityHash(unittest.TestCase):
+    """Test cases for the compute_affinity_hash function"""
+
+    def setUp(self):
+        self.system = {"parts": [{"text": "You are a helpful assistant"}]}
+        self.turns = [
+            {"role": "user", "parts": [{"text": "hi"}]},
+            {"role": "model", "parts": [{"text": "hello"}]},
+            {"role": "user", "parts": [{"text": "tell me more"}]},
+        ]
+
+    def test_later_turns_keep_hash(self):
+        """Adding turns after the prefix does not change the hash"""
+        first = compute_affinity_hash(
+            {"systemInstruction": self.system, "contents": self.turns[:2]}, 2
+        )
+        later = compute_affinity_hash(
+            {"systemInstruction": self.system, "contents": self.turns}, 2
+        )
+        self.assertEqual(first, later)
+
+    def test_different_prefix_changes_hash(self):
+        """A different system instruction maps to a different hash"""
+        other = {"parts": [{"text": "You are a pirate"}]}
+        self.assertNotEqual(
+            compute_affinity_hash({"systemInstruction": self.system, "contents": self.turns}, 2),
+            compute_affinity_hash({"systemInstruction": other, "contents": self.turns}, 2),
+        )
+
+    def test_empty_prefix(self):
+        """Requests without any prefix have no affinity"""
+        self.assertIsNone(compute_affinity_hash({"contents": []}, 2))
+        self.assertIsNone(compute_affinity_hash({"systemInstruction": None, "contents": self.turns}, 0))
+
+
+class TestConsistentHashRing(unittest.TestCase):
+    """Test cases for the ConsistentHashRing class"""
+
+    def test_walk_visits_each_key_once(self):
+        """Walking the ring yields every key exactly once"""
+        ring = ConsistentHashRing(["k1", "k2", "k3", "k4"], virtual_nodes=50)
+        walked = list(ring.walk(12345))
+        self.assertEqual(sorted(walked), ["k1", "k2", "k3", "k4"])
+
+    def test_removing_key_moves_few_hashes(self):
+        """Only hashes owned by the removed key change owner"""
+        keys = [f"k{i}" for i in range(10)]
+        full = ConsistentHashRing(keys)
+        reduced = ConsistentHashRing(keys[:-1])
+        values = [compute_affinity_hash({"contents": [{"text": str(i)}]}, 1) for i in range(500)]
+        moved = 0
+        for value in values:
+            owner = next(full.walk(value))
+            if owner != "k9":
+                self.assertEqual(next(reduced.walk(value)), owner)
+            else:
+                moved += 1
+        self.assertLess(moved, 150)
+
+    def test_empty_ring(self):
+        """An empty ring yields nothing"""
+        self.assertEqual(list(ConsistentHashRing([]).walk(1)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
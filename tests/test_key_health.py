@@ -0,0 +1,64 @@
+"""
+Unit tests for upstream error classification and cooldown backoff
+"""
+
+import unittest
+
+from app.service.key.key_health import ErrorClass, classify_error, compute_cooldown
+
+
+class TestClassifyError(unittest.TestCase):
+    """Test cases for the classify_error function"""
+
+    def test_rate_limit(self):
+        """429 responses are rate limit errors"""
+        self.assertEqual(
+            classify_error("API call failed with status code 429, quota exceeded"),
+            ErrorClass.RATE_LIMIT,
+        )
+
+    def test_auth_errors(self):
+        """401/403 and invalid-key 400 responses are auth errors"""
+        self.assertEqual(
+            classify_error("API call failed with status code 403, forbidden"),
+            ErrorClass.AUTH,
+        )
+        self.assertEqual(
+            classify_error(
+                'API call failed with status code 400, {"reason": "API_KEY_INVALID"}'
+            ),
+            ErrorClass.AUTH,
+        )
+
+    def test_client_error(self):
+        """Other 4xx responses are the client's fault"""
+        self.assertEqual(
+            classify_error("API call failed with status code 400, bad request"),
+            ErrorClass.CLIENT,
+        )
+
+    def test_transient_errors(self):
+        """5xx, timeouts and unknown errors are transient"""
+        self.assertEqual(
+            classify_error("API call failed with status code 503, overloaded"),
+            ErrorClass.TRANSIENT,
+        )
+        self.assertEqual(
+            classify_error("Request timeout: ReadTimeout"), ErrorClass.TRANSIENT
+        )
+        self.assertEqual(classify_error(None), ErrorClass.TRANSIENT)
+
+
+class TestComputeCooldown(unittest.TestCase):
+    """Test cases for the compute_cooldown function"""
+
+    def test_exponential_growth_with_cap(self):
+        """Cooldown doubles per level and is capped"""
+        self.assertEqual(compute_cooldown(1, 10, 600), 10)
+        self.assertEqual(compute_cooldown(2, 10, 600), 20)
+        self.assertEqual(compute_cooldown(4, 10, 600), 80)
+        self.assertEqual(compute_cooldown(100, 10, 600), 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Unit tests for KeyManager state shared between workers
+"""
+
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from app.config.config import settings  # noqa: E402
+from app.service.key.key_manager import KeyManager  # noqa: E402
+from app.service.key.rate_limiter import KeyRateLimiter  # noqa: E402
+from app.service.key.state_backend import MemoryStateBackend  # noqa: E402
+
+RATE_LIMIT_ERROR = "API call failed with status code 429, quota exceeded"
+SERVER_ERROR = "API call failed with status code 500, internal error"
+
+
+class SharedMemoryStateBackend(MemoryStateBackend):
+    """在测试中模拟多个 worker 共用的后端"""
+
+    shared = True
+
+
+class TestSharedKeyHealth(unittest.IsolatedAsyncioTestCase):
+    """Test cases for key health synchronised through a shared backend"""
+
+    def setUp(self):
+        patcher = patch.multiple(
+            settings,
+            KEY_STATE_SYNC_INTERVAL_SECONDS=0,
+            KEY_SELECTION_STRATEGY="round_robin",
+            KEY_RATE_LIMIT_ENABLED=False,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = SharedMemoryStateBackend()
+
+    def _manager(self, keys):
+        manager = KeyManager(keys, [])
+        manager.state_backend = self.backend
+        return manager
+
+    async def test_success_resets_shared_cooldown_level(self):
+        """A success clears the backoff level in the backend, not only locally"""
+        manager = self._manager(["a", "b"])
+        await manager.record_failure("a", RATE_LIMIT_ERROR)
+        self.assertEqual(manager.key_cooldown_levels.get("a"), 1)
+
+        await manager.record_success("a", "gemini-2.5-flash")
+        self.assertIsNone(manager.key_cooldown_levels.get("a"))
+
+        await manager.get_next_working_key()
+        self.assertIsNone(manager.key_cooldown_levels.get("a"))
+        other = self._manager(["a", "b"])
+        await other.get_next_working_key()
+        self.assertIsNone(other.key_cooldown_levels.get("a"))
+
+
+    async def test_shared_cursor_skips_benched_keys(self):
+        """Workers share one cursor that only lands on healthy keys"""
+        first = self._manager(["a", "b", "c"])
+        second = self._manager(["a", "b", "c"])
+        await first.record_failure("b", RATE_LIMIT_ERROR)
+        keys = [await manager.get_next_working_key() for manager in (first, second) * 2]
+        self.assertEqual(keys, ["c", "a", "c", "a"])
+
+    async def test_rate_limited_selection_does_not_use_cursor(self):
+        """The shared cursor is not incremented when it would not be used"""
+        manager = self._manager(["a", "b"])
+        with patch.object(settings, "KEY_RATE_LIMIT_ENABLED", True):
+            await manager.get_next_working_key("gemini-2.5-flash")
+        self.assertIsNone(await self.backend.get("key_cursor"))
+
+    async def test_concurrent_failures_are_not_lost(self):
+        """Failures recorded at the same time on different workers all count"""
+        first = self._manager(["a", "b"])
+        second = self._manager(["a", "b"])
+        for manager in (first, second):
+            manager.MAX_FAILURES = 10
+        await asyncio.gather(
+            first.record_failure("a", SERVER_ERROR),
+            second.record_failure("a", SERVER_ERROR),
+            first.increment_key_failure_count("a"),
+        )
+        third = self._manager(["a", "b"])
+        await third.get_next_working_key()
+        self.assertEqual(third.key_failure_counts["a"], 3)
+        self.assertEqual(await self.backend.hgetall("key_failures"), {"a": "3"})
+
+        await third.reset_key_failure_count("a")
+        await first.get_next_working_key()
+        self.assertEqual(first.key_failure_counts["a"], 0)
+
+
+class TestRateLimitCharges(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the RPM/RPD slots charged while selecting keys"""
+
+    MODEL = "gemini-2.5-flash"
+
+    def setUp(self):
+        patcher = patch.multiple(
+            settings,
+            KEY_SELECTION_STRATEGY="round_robin",
+            KEY_RATE_LIMIT_ENABLED=True,
+            KEY_AFFINITY_LOAD_FACTOR=10,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = KeyManager(["a", "b", "c"], [])
+        self.manager.state_backend = MemoryStateBackend()
+        self.manager.rate_limiter = KeyRateLimiter(
+            lambda model: (1, 0, 0), clock=lambda: 0.0
+        )
+
+    def _has_headroom(self, key):
+        return self.manager.rate_limiter.has_headroom(key, self.MODEL)
+
+    async def test_release_request(self):
+        """A request that never reaches upstream gives its slot back"""
+        key = await self.manager.get_next_working_key(self.MODEL)
+        self.assertFalse(self._has_headroom(key))
+        await self.manager.release_request(key, self.MODEL)
+        self.assertTrue(self._has_headroom(key))
+
+    async def test_affinity_releases_route_key(self):
+        """Only the key that serves the request keeps the charged slot"""
+        route_key = await self.manager.get_next_working_key(self.MODEL)
+        ring = self.manager._build_affinity_ring()
+        affinity_hash = next(
+            h for h in ring._points if next(iter(ring.walk(h))) != route_key
+        )
+        affinity_key = await self.manager.get_affinity_key(
+            affinity_hash, self.MODEL, charged_key=route_key
+        )
+        self.assertNotEqual(affinity_key, route_key)
+        self.assertTrue(self._has_headroom(route_key))
+        self.assertFalse(self._has_headroom(affinity_key))
+
+    async def test_affinity_keeps_route_key_without_second_charge(self):
+        """Affinity landing on the route key does not charge it twice"""
+        route_key = await self.manager.get_next_working_key(self.MODEL)
+        ring = self.manager._build_affinity_ring()
+        affinity_hash = next(
+            h for h in ring._points if next(iter(ring.walk(h))) == route_key
+        )
+        affinity_key = await self.manager.get_affinity_key(
+            affinity_hash, self.MODEL, charged_key=route_key
+        )
+        self.assertEqual(affinity_key, route_key)
+        self.assertEqual(
+            self.manager.rate_limiter._buckets[(route_key, self.MODEL)].rpm.tokens, 0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Unit tests for KeyRing healthy-key rotation
+"""
+
+import unittest
+
+from app.service.key.key_ring import KeyRing
+
+
+class TestKeyRing(unittest.TestCase):
+    """Test cases for the KeyRing class"""
+
+    def test_round_robin_over_active_keys(self):
+        """Keys are returned in round-robin order"""
+        ring = KeyRing(["a", "b", "c"])
+        self.assertEqual([ring.next() for _ in range(4)], ["a", "b", "c", "a"])
+
+    def test_benched_key_is_skipped(self):
+        """Benched keys are removed from rotation"""
+        ring = KeyRing(["a", "b", "c"])
+        ring.bench("b")
+        self.assertEqual([ring.next() for _ in range(4)], ["a", "c", "a", "c"])
+        self.assertEqual(ring.active_count, 2)
+        self.assertEqual(ring.benched_count, 1)
+
+    def test_restore_returns_key_to_rotation(self):
+        """Restored keys rejoin the rotation at the tail"""
+        ring = KeyRing(["a", "b"])
+        ring.bench("a")
+        ring.restore("a")
+        self.assertTrue(ring.is_active("a"))
+        self.assertEqual([ring.next() for _ in range(2)], ["b", "a"])
+
+    def test_all_benched_returns_none(self):
+        """An empty ring yields None"""
+        ring = KeyRing(["a"])
+        ring.bench("a")
+        self.assertIsNone(ring.next())
+
+    def test_restore_unknown_key_is_noop(self):
+        """Restoring a key that was never benched does not add it"""
+        ring = KeyRing(["a"])
+        ring.restore("x")
+        self.assertFalse(ring.is_active("x"))
+        self.assertEqual(ring.active_count, 1)
+
+    def test_rotate_to(self):
+        """rotate_to sets the next key returned"""
+        ring = KeyRing(["a", "b", "c"])
+        ring.rotate_to("c")
+        self.assertEqual([ring.next() for _ in range(3)], ["c", "a", "b"])
+
+
+    def test_key_at_maps_cursor_to_active_keys(self):
+        """Cursor positions map onto healthy keys in configured order"""
+        ring = KeyRing(["a", "b", "c", "d"])
+        ring.bench("b")
+        ring.bench("d")
+        self.assertEqual([ring.key_at(i) for i in range(4)], ["a", "c", "a", "c"])
+        ring.restore("d")
+        ring.restore("b")
+        self.assertEqual([ring.key_at(i) for i in range(4)], ["a", "b", "c", "d"])
+        self.assertEqual(ring.next(), "a")
+
+    def test_key_at_without_active_keys(self):
+        ring = KeyRing(["a"])
+        ring.bench("a")
+        self.assertIsNone(ring.key_at(7))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Unit tests for per-key RPM/TPM/RPD token buckets
+"""
+
+import unittest
+
+from app.service.key.rate_limiter import KeyRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestKeyRateLimiter(unittest.TestCase):
+    """Test cases for the KeyRateLimiter class"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limits = {"m": (2, 1000, 100)}
+        self.limiter = KeyRateLimiter(
+            lambda model: self.limits.get(model, (0, 0, 0)), clock=self.clock
+        )
+
+    def test_rpm_exhaustion_and_refill(self):
+        """A key without RPM headroom recovers as the bucket refills"""
+        self.limiter.record_request("k", "m")
+        self.limiter.record_request("k", "m")
+        self.assertFalse(self.limiter.has_headroom("k", "m"))
+        self.clock.now = 30.0
+        self.assertTrue(self.limiter.has_headroom("k", "m"))
+
+    def test_tpm_from_usage_metadata(self):
+        """Reported token usage drains the TPM bucket and may overdraw it"""
+        self.limiter.record_tokens("k", "m", 1500)
+        self.assertFalse(self.limiter.has_headroom("k", "m"))
+        self.clock.now = 60.0
+        self.assertTrue(self.limiter.has_headroom("k", "m"))
+
+    def test_limits_are_per_key_and_model(self):
+        """Exhausting one key does not affect other keys or models"""
+        self.limiter.record_request("k", "m")
+        self.limiter.record_request("k", "m")
+        self.assertTrue(self.limiter.has_headroom("other", "m"))
+        self.assertTrue(self.limiter.has_headroom("k", "unlimited-model"))
+
+    def test_unlimited_when_zero(self):
+        """A zero limit never blocks"""
+        for _ in range(1000):
+            self.limiter.record_request("k", "unlimited-model")
+        self.assertTrue(self.limiter.has_headroom("k", "unlimited-model"))
+
+    def test_release_request(self):
+        """A released request slot is usable again without exceeding the limit"""
+        self.limiter.record_request("k", "m")
+        self.limiter.record_request("k", "m")
+        self.limiter.release_request("k", "m")
+        self.assertTrue(self.limiter.has_headroom("k", "m"))
+        self.limiter.release_request("k", "m")
+        self.limiter.release_request("k", "m")
+        self.limiter.record_request("k", "m")
+        self.limiter.record_request("k", "m")
+        self.assertFalse(self.limiter.has_headroom("k", "m"))
+
+    def test_forget_keys(self):
+        """Buckets of removed keys are dropped"""
+        self.limiter.record_request("k", "m")
+        self.limiter.record_request("k", "m")
+        self.limiter.forget_keys({"other"})
+        self.assertTrue(self.limiter.has_headroom("k", "m"))
+
+
+if __name__ == "__main__":
+    unittest.main()
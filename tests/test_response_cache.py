@@ -0,0 +1,144 @@
+"""
+Unit tests for the response cache tiers and Cache-Control parsing
+"""
+
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from app.service.chat.response_cache import (  # noqa: E402
+    MemoryCacheTier,
+    ResponseCache,
+    SqliteCacheTier,
+    parse_cache_control,
+    split_response_for_replay,
+)
+
+
+class TestParseCacheControl(unittest.TestCase):
+    """Test cases for the parse_cache_control function"""
+
+    def test_directives(self):
+        """no-cache skips reads, no-store skips reads and writes"""
+        self.assertEqual(parse_cache_control(None), (True, True))
+        self.assertEqual(parse_cache_control("max-age=60"), (True, True))
+        self.assertEqual(parse_cache_control("no-cache"), (False, True))
+        self.assertEqual(parse_cache_control("max-age=0"), (False, True))
+        self.assertEqual(parse_cache_control("private, No-Store"), (False, False))
+
+
+class TestSplitResponseForReplay(unittest.TestCase):
+    """Test cases for the split_response_for_replay function"""
+
+    def setUp(self):
+        self.response = {
+            "candidates": [
+                {
+                    "content": {
+                        "role": "model",
+                        "parts": [
+                            {"text": "thinking", "thought": True},
+                            {"text": "hello world"},
+                            {"functionCall": {"name": "f", "args": {}}},
+                        ],
+                    },
+                    "finishReason": "STOP",
+                    "index": 0,
+                }
+            ],
+            "usageMetadata": {"totalTokenCount": 7},
+            "modelVersion": "gemini-2.0-flash",
+        }
+
+    def test_parts_become_chunks(self):
+        """Each part is one chunk and the finish data goes on the last chunk"""
+        chunks = split_response_for_replay(self.response)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0]["candidates"][0]["content"]["parts"], [{"text": "thinking", "thought": True}])
+        self.assertNotIn("finishReason", chunks[0]["candidates"][0])
+        self.assertNotIn("usageMetadata", chunks[0])
+        self.assertEqual(chunks[0]["modelVersion"], "gemini-2.0-flash")
+        self.assertEqual(chunks[-1]["candidates"][0]["finishReason"], "STOP")
+        self.assertEqual(chunks[-1]["usageMetadata"], {"totalTokenCount": 7})
+
+    def test_text_split_by_chunk_size(self):
+        """Long text parts are split without losing characters or flags"""
+        chunks = split_response_for_replay(self.response, chunk_size=4)
+        texts = [c["candidates"][0]["content"]["parts"][0].get("text") for c in chunks]
+        self.assertEqual("".join(t for t in texts[:2]), "thinking")
+        self.assertEqual("".join(t for t in texts[2:5]), "hello world")
+        self.assertTrue(all(c["candidates"][0]["content"]["parts"][0].get("thought") for c in chunks[:2]))
+        self.assertEqual(len(chunks), 6)
+
+    def test_multiple_candidates_kept_whole(self):
+        """Responses with several candidates are replayed as one chunk"""
+        response = {"candidates": [{"index": 0}, {"index": 1}]}
+        self.assertEqual(split_response_for_replay(response, 4), [response])
+
+
+class TestMemoryCacheTier(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the MemoryCacheTier class"""
+
+    async def test_lru_eviction_by_bytes(self):
+        """The least recently used entries are evicted once the byte cap is hit"""
+        tier = MemoryCacheTier(max_bytes=10)
+        await tier.set("a", b"aaaa", ttl=60)
+        await tier.set("b", b"bbbb", ttl=60)
+        await tier.get("a")
+        await tier.set("c", b"cccc", ttl=60)
+        self.assertIsNone(await tier.get("b"))
+        self.assertEqual(await tier.get("a"), b"aaaa")
+        self.assertEqual(tier.size_bytes, 8)
+
+        await tier.set("huge", b"x" * 11, ttl=60)
+        self.assertIsNone(await tier.get("huge"))
+
+    async def test_ttl(self):
+        """Expired entries are not returned"""
+        tier = MemoryCacheTier(max_bytes=100)
+        await tier.set("a", b"1", ttl=-1)
+        self.assertIsNone(await tier.get("a"))
+        self.assertEqual(tier.size_bytes, 0)
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the two-tier ResponseCache"""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+
+    async def asyncTearDown(self):
+        self.tmpdir.cleanup()
+
+    async def test_disk_tier_survives_new_memory_tier(self):
+        """Entries written to disk are found after the memory tier is lost"""
+        disk = SqliteCacheTier(self.path, max_bytes=1024)
+        cache = ResponseCache(MemoryCacheTier(1024), disk, ttl=60)
+        await cache.set("k", {"candidates": [{"text": "hi"}]})
+        disk.close()
+
+        disk = SqliteCacheTier(self.path, max_bytes=1024)
+        cache = ResponseCache(MemoryCacheTier(1024), disk, ttl=60)
+        first = await cache.get("k")
+        self.assertEqual(first, {"candidates": [{"text": "hi"}]})
+        first["candidates"].clear()
+        self.assertEqual(await cache.get("k"), {"candidates": [{"text": "hi"}]})
+        self.assertIsNone(await cache.get("missing"))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        disk.close()
+
+    async def test_disk_tier_evicts_oldest(self):
+        """The disk tier stays under its byte cap"""
+        disk = SqliteCacheTier(self.path, max_bytes=10)
+        await disk.set("a", b"aaaaaa", ttl=60)
+        await disk.set("b", b"bbbbbb", ttl=60)
+        self.assertIsNone(await disk.get("a"))
+        self.assertEqual(await disk.get("b"), b"bbbbbb")
+        disk.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Unit tests for request log time-bucket rollups
+"""
+
+import unittest
+from datetime import datetime
+
+from app.database.rollup import (
+    aggregate_request_rows,
+    floor_time,
+    rebucket_rollups,
+)
+
+
+class TestRollup(unittest.TestCase):
+    """Test cases for rollup aggregation"""
+
+    def test_floor_time(self):
+        value = datetime(2025, 5, 6, 7, 8, 9, 10)
+        self.assertEqual(floor_time(value, "minute"), datetime(2025, 5, 6, 7, 8))
+        self.assertEqual(floor_time(value, "hour"), datetime(2025, 5, 6, 7))
+
+    def test_aggregate_by_minute_key_and_model(self):
+        """Rows are grouped per minute, key and model with status-based outcomes"""
+        rows = [
+            dict(request_time=datetime(2025, 1, 1, 0, 0, 5), api_key="k", model_name="m", status_code=200, latency_ms=500),
+            dict(request_time=datetime(2025, 1, 1, 0, 0, 50), api_key="k", model_name="m", status_code=429, latency_ms=6000),
+            dict(request_time=datetime(2025, 1, 1, 0, 1, 0), api_key="k", model_name="m", status_code=None, latency_ms=None),
+            dict(request_time=datetime(2025, 1, 1, 0, 0, 10), api_key=None, model_name=None, status_code=200, latency_ms=40000),
+        ]
+        groups = aggregate_request_rows(rows)
+        first = groups[(datetime(2025, 1, 1, 0, 0), "k", "m")]
+        self.assertEqual(first["success_count"], 1)
+        self.assertEqual(first["failure_count"], 1)
+        self.assertEqual(first["latency_sum_ms"], 6500)
+        self.assertEqual(first["latency_under_1s"], 1)
+        self.assertEqual(first["latency_under_30s"], 1)
+        second = groups[(datetime(2025, 1, 1, 0, 1), "k", "m")]
+        self.assertEqual(second["failure_count"], 1)
+        self.assertEqual(second["latency_sum_ms"], 0)
+        anonymous = groups[(datetime(2025, 1, 1, 0, 0), "", "")]
+        self.assertEqual(anonymous["latency_over_30s"], 1)
+
+    def test_rebucket_minutes_into_hours(self):
+        """Minute rollups fold into hour rollups by summing every counter"""
+        minute_rows = [
+            dict(bucket_start=datetime(2025, 1, 1, 3, minute), api_key="k", model_name="m",
+                 success_count=2, failure_count=1, latency_sum_ms=300,
+                 latency_under_1s=3, latency_under_5s=0, latency_under_30s=0, latency_over_30s=0)
+            for minute in (0, 30, 59)
+        ]
+        groups = rebucket_rollups(minute_rows)
+        self.assertEqual(list(groups), [(datetime(2025, 1, 1, 3), "k", "m")])
+        hour = groups[(datetime(2025, 1, 1, 3), "k", "m")]
+        self.assertEqual(hour["success_count"], 6)
+        self.assertEqual(hour["failure_count"], 3)
+        self.assertEqual(hour["latency_sum_ms"], 900)
+        self.assertEqual(hour["latency_under_1s"], 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
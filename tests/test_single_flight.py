@@ -0,0 +1,113 @@
+"""
+Unit tests for single-flight request coalescing
+"""
+
+import asyncio
+import unittest
+
+from app.service.chat.single_flight import (
+    SingleFlight,
+    compute_request_hash,
+    is_deterministic,
+)
+
+
+class TestRequestHash(unittest.TestCase):
+    """Test cases for request hashing and eligibility"""
+
+    def test_key_order_does_not_matter(self):
+        """Payloads that differ only in key order hash the same"""
+        a = {"contents": [{"text": "hi"}], "generationConfig": {"temperature": 0, "topK": 1}}
+        b = {"generationConfig": {"topK": 1, "temperature": 0}, "contents": [{"text": "hi"}]}
+        self.assertEqual(
+            compute_request_hash("generateContent", "m", a),
+            compute_request_hash("generateContent", "m", b),
+        )
+        self.assertNotEqual(
+            compute_request_hash("generateContent", "m", a),
+            compute_request_hash("countTokens", "m", a),
+        )
+
+    def test_is_deterministic(self):
+        """Only an explicit zero temperature is deterministic"""
+        self.assertTrue(is_deterministic({"generationConfig": {"temperature": 0.0}}))
+        self.assertFalse(is_deterministic({"generationConfig": {"temperature": 0.7}}))
+        self.assertFalse(is_deterministic({"generationConfig": {}}))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the SingleFlight class"""
+
+    async def test_concurrent_calls_share_result(self):
+        """Concurrent duplicates run the call once"""
+        flight = SingleFlight()
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"ok": True}
+
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(5)))
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(flight.pending_count, 0)
+
+    async def test_on_join_only_for_shared_results(self):
+        """on_join runs for waiters that reuse the result, not for the caller that ran it"""
+        flight = SingleFlight()
+        joined = []
+
+        async def call():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        async def on_join(name):
+            joined.append(name)
+
+        await asyncio.gather(
+            *(flight.do("k", call, lambda n=n: on_join(n)) for n in range(3))
+        )
+        self.assertEqual(joined, [1, 2])
+
+    async def test_failure_lets_waiters_retry(self):
+        """Waiters run their own call when the first one fails"""
+        flight = SingleFlight()
+        attempts = []
+
+        async def failing():
+            attempts.append("leader")
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream error")
+
+        async def succeeding():
+            attempts.append("waiter")
+            return "ok"
+
+        leader = asyncio.create_task(flight.do("k", failing))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("k", succeeding))
+        with self.assertRaises(RuntimeError):
+            await leader
+        self.assertEqual(await waiter, "ok")
+        self.assertEqual(attempts, ["leader", "waiter"])
+
+    async def test_window_keeps_result(self):
+        """Results are reused within the window and dropped afterwards"""
+        flight = SingleFlight(window_seconds=0.05)
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        self.assertEqual(await flight.do("k", call), 1)
+        self.assertEqual(await flight.do("k", call), 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(await flight.do("k", call), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Unit tests for in-process sliding-window call counters
+"""
+
+import unittest
+
+from app.service.stats.sliding_window import LiveCallStats, SlidingWindowCounter
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    """Test cases for SlidingWindowCounter"""
+
+    def test_second_window(self):
+        """Counts older than the window drop out second by second"""
+        counter = SlidingWindowCounter()
+        for offset in range(90):
+            counter.add(1000.0 + offset)
+        now = 1089.5
+        self.assertEqual(counter.total(now, 60), 60)
+        self.assertEqual(counter.total(now, 10), 10)
+        self.assertEqual(counter.total(now + 30, 60), 30)
+
+    def test_minute_window_and_slot_reuse(self):
+        """Minute slots cover an hour and stale slots are reset on reuse"""
+        counter = SlidingWindowCounter()
+        start = 60 * 1000
+        for minute in range(120):
+            counter.add(start + minute * 60, 2)
+        now = start + 119 * 60
+        self.assertEqual(counter.total(now, 3600), 120)
+        self.assertEqual(counter.total(now, 600), 20)
+        self.assertEqual(counter.total(now + 7200, 3600), 0)
+
+
+class TestLiveCallStats(unittest.TestCase):
+    """Test cases for LiveCallStats"""
+
+    def test_totals_and_filters(self):
+        clock = FakeClock()
+        stats = LiveCallStats(clock)
+        stats.record("k1", "m1", True)
+        stats.record("k1", "m2", False)
+        stats.record("k2", "m1", True)
+        clock.now += 5
+        self.assertEqual(stats.get_calls(60), {"total": 3, "success": 2, "failure": 1})
+        self.assertEqual(stats.get_calls(60, api_key="k1"), {"total": 2, "success": 1, "failure": 1})
+        self.assertEqual(stats.get_calls(60, model_name="m1"), {"total": 2, "success": 2, "failure": 0})
+        clock.now += 120
+        self.assertEqual(stats.get_calls(60)["total"], 0)
+        self.assertEqual(stats.get_calls(3600)["total"], 3)
+
+    def test_covers_requires_uptime(self):
+        """Windows longer than the process uptime or one hour are not served"""
+        clock = FakeClock()
+        stats = LiveCallStats(clock)
+        self.assertFalse(stats.covers(60))
+        clock.now += 61
+        self.assertTrue(stats.covers(60))
+        self.assertFalse(stats.covers(3600))
+        clock.now += 86400
+        self.assertTrue(stats.covers(3600))
+        self.assertFalse(stats.covers(86400))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Unit tests for the bytes-level SSE parser
+"""
+
+import unittest
+
+from app.service.client.sse import SseEvent, SseParser, iter_sse_events
+
+
+class TestSseParser(unittest.TestCase):
+    """Test cases for incremental SSE parsing"""
+
+    def parse(self, *chunks):
+        parser = SseParser()
+        events = []
+        for chunk in chunks:
+            events.extend(parser.feed(chunk))
+        events.extend(parser.flush())
+        return events
+
+    def test_single_line_events(self):
+        """Gemini style events decode to JSON and CRLF line endings are accepted"""
+        events = self.parse(b'data: {"a": 1}\r\n\r\ndata: {"b": 2}\n\n')
+        self.assertEqual([e.json() for e in events], [{"a": 1}, {"b": 2}])
+        self.assertIsInstance(events[0].data, memoryview)
+
+    def test_events_split_across_chunks(self):
+        """Events and line endings split across chunks are reassembled"""
+        events = self.parse(b'da', b'ta: {"text": "h', b'i"}\r', b"\n\r\n", b"data: [DONE]\n\n")
+        self.assertEqual(events[0].json(), {"text": "hi"})
+        self.assertTrue(events[1].is_done)
+
+    def test_multi_line_data_and_fields(self):
+        """Multiple data lines are joined and event/id fields are kept"""
+        events = self.parse(
+            b": keep-alive\n",
+            b"event: message\nid: 7\ndata: {\"a\":\ndata:1}\n\n",
+            b"data: plain\n\n",
+        )
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0].event, "message")
+        self.assertEqual(events[0].id, "7")
+        self.assertEqual(events[0].json(), {"a": 1})
+        self.assertIsNone(events[1].event)
+        self.assertEqual(events[1].text, "plain")
+
+    def test_final_event_without_blank_line(self):
+        """A trailing event without a terminating blank line is still returned"""
+        events = self.parse(b'data: {"a": 1}\n\ndata: {"b": 2}')
+        self.assertEqual([e.json() for e in events], [{"a": 1}, {"b": 2}])
+
+    def test_encode(self):
+        """Events re-encode to data-only SSE frames"""
+        self.assertEqual(SseEvent(b"[DONE]").encode(), b"data: [DONE]\n\n")
+        self.assertEqual(SseEvent(b"a\nb").encode(), b"data: a\ndata: b\n\n")
+
+
+class TestIterSseEvents(unittest.IsolatedAsyncioTestCase):
+    """Test cases for parsing an async byte stream"""
+
+    async def test_iter_events(self):
+        """Byte chunks from a stream are turned into events"""
+
+        async def chunks():
+            yield b'data: {"a"'
+            yield b": 1}\n\ndata: {}"
+
+        events = [event async for event in iter_sse_events(chunks())]
+        self.assertEqual([e.json() for e in events], [{"a": 1}, {}])
+
+
+if __name__ == "__main__":
+    unittest.main()
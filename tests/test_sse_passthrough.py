@@ -0,0 +1,58 @@
+"""
+Unit tests for SSE pass-through relaying
+"""
+
+import unittest
+
+from app.service.chat.sse_passthrough import SsePassthrough
+
+
+class TestSsePassthrough(unittest.IsolatedAsyncioTestCase):
+    """Test cases for forwarding SSE bytes on event boundaries"""
+
+    def test_forwards_only_complete_events(self):
+        """Partial events are held back until their terminating blank line arrives"""
+        relay = SsePassthrough()
+        self.assertEqual(relay.feed(b'data: {"a"'), b"")
+        self.assertEqual(relay.feed(b': 1}\n\ndata: {"b"'), b'data: {"a": 1}\n\n')
+        self.assertEqual(relay.feed(b": 2}\r\n\r\n"), b'data: {"b": 2}\r\n\r\n')
+        self.assertEqual(relay.flush(), b"")
+
+    def test_usage_from_last_event(self):
+        """usageMetadata is read from the last event only"""
+        relay = SsePassthrough()
+        relay.feed(
+            b'data: {"text": "data: x", "usageMetadata": {"totalTokenCount": 1}}\n\n'
+            b'data: {"usageMetadata": {"totalTokenCount": 7}}\n\n'
+        )
+        self.assertEqual(relay.usage_metadata(), {"totalTokenCount": 7})
+
+    def test_usage_without_trailing_blank_line(self):
+        """A final event without a terminating blank line is flushed and parsed"""
+        relay = SsePassthrough()
+        relay.feed(b'data: {"usageMetadata": {"totalTokenCount": 1}}\n\n')
+        relay.feed(b'data: {"usageMetadata": {"totalTokenCount": 2}}')
+        self.assertEqual(relay.flush(), b'data: {"usageMetadata": {"totalTokenCount": 2}}')
+        self.assertEqual(relay.usage_metadata(), {"totalTokenCount": 2})
+
+    def test_invalid_last_event(self):
+        """Unparseable events yield no usage instead of failing the stream"""
+        relay = SsePassthrough()
+        relay.feed(b"data: not json\n\n")
+        self.assertIsNone(relay.usage_metadata())
+
+    async def test_relay(self):
+        """Relaying a stream reproduces the upstream bytes exactly"""
+
+        async def upstream():
+            for chunk in (b"data: {", b'"x": 1}\n', b"\ndata: {}\n\n", b"data: {}"):
+                yield chunk
+
+        relay = SsePassthrough()
+        out = [chunk async for chunk in relay.relay(upstream())]
+        self.assertEqual(b"".join(out), b'data: {"x": 1}\n\ndata: {}\n\ndata: {}')
+        self.assertEqual(out[0], b'data: {"x": 1}\n\ndata: {}\n\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+"""
+Unit tests for the shared key state backends
+"""
+
+import asyncio
+import time
+import unittest
+
+from app.service.key.state_backend import MemoryStateBackend, RedisStateBackend
+
+
+class _FakeRedisServer:
+    """In-process RESP server supporting the commands used by RedisStateBackend"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.commands = []
+        # 命令 -> 秒数：先写出一半回复，停顿后再写出剩余部分
+        self.stalls = {}
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @staticmethod
+    def _bulk(value):
+        if value is None:
+            return b"$-1\r\n"
+        data = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    async def _read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        return args
+
+    def _dispatch(self, args) -> bytes:
+        command, *rest = args
+        command = command.upper()
+        self.commands.append([command] + rest)
+        if command == "GET":
+            return self._bulk(self.values.get(rest[0]))
+        if command == "SET":
+            self.values[rest[0]] = rest[1]
+            return b"+OK\r\n"
+        if command == "DEL":
+            removed = int(self.values.pop(rest[0], None) is not None)
+            removed += int(self.hashes.pop(rest[0], None) is not None)
+            return b":%d\r\n" % removed
+        if command == "INCR":
+            value = int(self.values.get(rest[0], 0)) + 1
+            self.values[rest[0]] = str(value)
+            return b":%d\r\n" % value
+        if command == "HSET":
+            self.hashes.setdefault(rest[0], {})[rest[1]] = rest[2]
+            return b":1\r\n"
+        if command == "HINCRBY":
+            fields = self.hashes.setdefault(rest[0], {})
+            value = int(fields.get(rest[1], 0)) + int(rest[2])
+            fields[rest[1]] = str(value)
+            return b":%d\r\n" % value
+        if command == "HDEL":
+            self.hashes.get(rest[0], {}).pop(rest[1], None)
+            return b":1\r\n"
+        if command == "HGETALL":
+            items = self.hashes.get(rest[0], {})
+            reply = [b"*%d\r\n" % (len(items) * 2)]
+            for field, value in items.items():
+                reply.append(self._bulk(field))
+                reply.append(self._bulk(value))
+            return b"".join(reply)
+        return b"-ERR unknown command\r\n"
+
+    async def _handle(self, reader, writer):
+        while True:
+            args = await self._read_command(reader)
+            if args is None:
+                break
+            reply = self._dispatch(args)
+            stall = self.stalls.get(args[0].upper())
+            if stall:
+                writer.write(reply[: len(reply) // 2])
+                await writer.drain()
+                await asyncio.sleep(stall)
+                reply = reply[len(reply) // 2 :]
+            writer.write(reply)
+            await writer.drain()
+        writer.close()
+
+
+class TestMemoryStateBackend(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the in-process backend"""
+
+    async def test_values_and_ttl(self):
+        """Values expire once their TTL has passed"""
+        backend = MemoryStateBackend()
+        await backend.set("a", "1")
+        await backend.set("b", "2", ttl=60)
+        self.assertEqual(await backend.get("a"), "1")
+        self.assertEqual(await backend.get("b"), "2")
+
+        backend._values["b"] = ("2", time.time() - 1)
+        self.assertIsNone(await backend.get("b"))
+
+        await backend.delete("a")
+        self.assertIsNone(await backend.get("a"))
+
+    async def test_incr_and_hash(self):
+        """Counters start at zero and hashes keep independent fields"""
+        backend = MemoryStateBackend()
+        self.assertEqual(await backend.incr("cursor"), 1)
+        self.assertEqual(await backend.incr("cursor"), 2)
+
+        await backend.hset("health", "k1", "x")
+        await backend.hset("health", "k2", "y")
+        await backend.hdel("health", "k1")
+        self.assertEqual(await backend.hgetall("health"), {"k2": "y"})
+        self.assertEqual(await backend.hgetall("missing"), {})
+
+        self.assertEqual(await backend.hincrby("failures", "k1"), 1)
+        self.assertEqual(await backend.hincrby("failures", "k1", 2), 3)
+        self.assertEqual(await backend.hgetall("failures"), {"k1": "3"})
+
+
+class TestRedisStateBackend(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the RESP client against a local stand-in server"""
+
+    async def asyncSetUp(self):
+        self.server = _FakeRedisServer()
+        port = await self.server.start()
+        self.backend = RedisStateBackend(f"redis://127.0.0.1:{port}/0", key_prefix="t:")
+
+    async def asyncTearDown(self):
+        await self.backend.close()
+        await self.server.stop()
+
+    async def test_commands_round_trip(self):
+        """Values, counters and hashes are stored under the key prefix"""
+        await self.backend.set("session", "data", ttl=30)
+        self.assertEqual(await self.backend.get("session"), "data")
+        self.assertIn(["SET", "t:session", "data", "EX", "30"], self.server.commands)
+        self.assertIsNone(await self.backend.get("missing"))
+
+        self.assertEqual(await self.backend.incr("cursor"), 1)
+        self.assertEqual(await self.backend.incr("cursor"), 2)
+        self.assertEqual(await self.backend.hincrby("failures", "k1"), 1)
+        self.assertEqual(await self.backend.hincrby("failures", "k1", 2), 3)
+
+        await self.backend.hset("health", "k1", '{"failures": 1}')
+        await self.backend.hset("health", "k2", "{}")
+        await self.backend.hdel("health", "k2")
+        self.assertEqual(
+            await self.backend.hgetall("health"), {"k1": '{"failures": 1}'}
+        )
+
+        await self.backend.delete("health")
+        self.assertEqual(await self.backend.hgetall("health"), {})
+
+    async def test_reconnects_after_connection_loss(self):
+        """A dropped connection is re-established for the next command"""
+        await self.backend.set("a", "1")
+        self.backend._writer.close()
+        await self.backend._writer.wait_closed()
+        self.assertEqual(await self.backend.get("a"), "1")
+
+    async def test_cancelled_command_does_not_leak_reply(self):
+        """Cancelling a command mid-reply drops the connection for the next command"""
+        await self.backend.hset("health", "k1", "x")
+        self.server.stalls["HGETALL"] = 0.2
+        task = asyncio.create_task(self.backend.hgetall("health"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(await self.backend.incr("cursor"), 1)
+
+    async def test_command_timeout(self):
+        """A server that stops answering raises instead of stalling callers"""
+        self.backend._timeout = 0.05
+        self.server.stalls["GET"] = 1
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.backend.get("a")
+        del self.server.stalls["GET"]
+        await self.backend.set("a", "1")
+        self.assertEqual(await self.backend.get("a"), "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Unit tests for StreamOptimizer output pacing
+"""
+
+import asyncio
+import os
+import unittest
+
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from app.handler.stream_optimizer import StreamOptimizer  # noqa: E402
+
+
+async def _collect(optimizer, text, **kwargs):
+    return [
+        chunk
+        async for chunk in optimizer.optimize_stream_output(
+            text, lambda t: {"text": t}, lambda c: c["text"], **kwargs
+        )
+    ]
+
+
+class TestStreamOptimizer(unittest.TestCase):
+    """Test cases for StreamOptimizer.optimize_stream_output"""
+
+    def test_zero_delay_emits_text_at_once(self):
+        """A zero delay disables pacing instead of dividing by zero"""
+        optimizer = StreamOptimizer(min_delay=0, max_delay=0)
+        for text in ("short", "x" * 100, "y" * 5000):
+            chunks = asyncio.run(_collect(optimizer, text, pacer=optimizer.create_pacer()))
+            self.assertEqual(chunks, [text])
+
+    def test_zero_min_delay_for_long_text(self):
+        """Long texts use min_delay, which may be zero while max_delay is not"""
+        optimizer = StreamOptimizer(min_delay=0, max_delay=0.01, long_text_threshold=50)
+        text = "z" * 200
+        self.assertEqual(asyncio.run(_collect(optimizer, text)), [text])
+
+    def test_paced_output_preserves_text(self):
+        """Paced output splits the text but keeps every unit in order"""
+        optimizer = StreamOptimizer(min_delay=0.001, max_delay=0.001, batch_size=2)
+        text = "abcdefgh"
+        chunks = asyncio.run(_collect(optimizer, text))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
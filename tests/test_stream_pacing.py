@@ -0,0 +1,148 @@
+"""
+Unit tests for the shared stream pacing ticker
+"""
+
+import asyncio
+import unittest
+
+from app.handler.stream_pacing import (
+    PacingTicker,
+    StreamPacer,
+    get_pacing_ticker,
+    has_finish_reason,
+    pace_units,
+)
+
+
+async def _collect(units, rate, ticker, min_batch=1):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    out = []
+    async for segment in pace_units(units, rate, ticker, min_batch):
+        out.append((segment, loop.time() - start))
+    return out
+
+
+class TestPacingTicker(unittest.TestCase):
+    """Test cases for PacingTicker"""
+
+    def test_one_tick_wakes_all_waiters(self):
+        """Concurrent waiters share the same tick and the ticker stops when idle"""
+
+        async def run():
+            ticker = PacingTicker(0.01)
+            order = []
+
+            async def waiter(i):
+                await ticker.wait()
+                order.append(i)
+
+            await asyncio.gather(*(waiter(i) for i in range(50)))
+            self.assertEqual(sorted(order), list(range(50)))
+            await asyncio.sleep(0.05)
+            self.assertTrue(ticker._task.done())
+
+        asyncio.run(run())
+
+    def test_cancelled_waiter_does_not_cancel_tick(self):
+        """Cancelling one waiter leaves the shared tick intact for the others"""
+
+        async def run():
+            ticker = PacingTicker(0.02)
+            first = asyncio.ensure_future(ticker.wait())
+            second = asyncio.ensure_future(ticker.wait())
+            await asyncio.sleep(0)
+            first.cancel()
+            await asyncio.wait_for(second, 1)
+            self.assertTrue(first.cancelled())
+
+        asyncio.run(run())
+
+    def test_one_ticker_per_loop(self):
+        """get_pacing_ticker reuses the ticker within a loop"""
+
+        async def run():
+            return get_pacing_ticker(0.01), get_pacing_ticker(0.01)
+
+        first, second = asyncio.run(run())
+        self.assertIs(first, second)
+        third, _ = asyncio.run(run())
+        self.assertIsNot(first, third)
+
+
+class TestPaceUnits(unittest.TestCase):
+    """Test cases for pace_units"""
+
+    def test_emits_first_unit_immediately_and_keeps_all_text(self):
+        """The first unit is not delayed and every unit is emitted once"""
+
+        async def run():
+            return await _collect(list("abcdef"), 200, PacingTicker(0.01))
+
+        out = asyncio.run(run())
+        self.assertEqual(out[0][0], "a")
+        self.assertLess(out[0][1], 0.005)
+        self.assertEqual("".join(segment for segment, _ in out), "abcdef")
+
+    def test_coalesces_units_within_a_tick(self):
+        """At a high rate several units are merged into one segment per tick"""
+
+        async def run():
+            return await _collect(list("x" * 40), 1000, PacingTicker(0.02))
+
+        out = asyncio.run(run())
+        self.assertEqual(sum(len(segment) for segment, _ in out), 40)
+        self.assertLess(len(out), 10)
+
+    def test_rate_limits_throughput(self):
+        """Ten units at 100 units/s take roughly 90ms"""
+
+        async def run():
+            return await _collect(list("0123456789"), 100, PacingTicker(0.01))
+
+        out = asyncio.run(run())
+        self.assertGreater(out[-1][1], 0.07)
+        self.assertLess(out[-1][1], 0.3)
+
+    def test_min_batch(self):
+        """Segments hold at least min_batch units except the remainder"""
+
+        async def run():
+            return await _collect(list("abcdefg"), 300, PacingTicker(0.005), 3)
+
+        out = asyncio.run(run())
+        self.assertTrue(all(len(segment) >= 3 for segment, _ in out[:-1]))
+        self.assertEqual("".join(segment for segment, _ in out), "abcdefg")
+
+
+class TestStreamPacer(unittest.TestCase):
+    """Test cases for StreamPacer"""
+
+    def test_boost_when_upstream_is_waiting(self):
+        """Text arriving right after output finished doubles the rate, idle gaps decay it"""
+
+        async def run():
+            pacer = StreamPacer(max_boost=4)
+            boosts = [pacer.on_arrival(0.02)]
+            for _ in range(3):
+                pacer.on_output_done()
+                boosts.append(pacer.on_arrival(0.02))
+            pacer.on_output_done()
+            await asyncio.sleep(0.03)
+            boosts.append(pacer.on_arrival(0.02))
+            return boosts
+
+        self.assertEqual(asyncio.run(run()), [1.0, 2.0, 4.0, 4.0, 2.0])
+
+
+class TestFinishReason(unittest.TestCase):
+    """Test cases for has_finish_reason"""
+
+    def test_finish_reason(self):
+        self.assertTrue(has_finish_reason({"candidates": [{"finishReason": "STOP"}]}))
+        self.assertFalse(has_finish_reason({"candidates": [{"content": {}}]}))
+        self.assertFalse(has_finish_reason({"usageMetadata": {}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
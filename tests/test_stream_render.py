@@ -0,0 +1,72 @@
+"""
+Unit tests for stream text splitting and template rendering
+"""
+
+import json
+import unittest
+
+from app.handler.stream_render import (
+    build_chunk_renderer,
+    split_graphemes,
+    split_text_units,
+    split_words,
+)
+
+
+class TestTextSplitting(unittest.TestCase):
+    """Test cases for grapheme and word splitting"""
+
+    def test_graphemes_keep_sequences_together(self):
+        """Combining marks, emoji sequences, flags and CRLF are never split"""
+        text = "éa👍🏽👨‍👩‍👧🇨🇳\r\nb"
+        units = split_graphemes(text)
+        self.assertEqual("".join(units), text)
+        self.assertEqual(
+            units,
+            ["é", "a", "👍🏽", "👨‍👩‍👧", "🇨🇳", "\r\n", "b"],
+        )
+
+    def test_words(self):
+        """Words keep their trailing whitespace and CJK characters stand alone"""
+        text = "  Hello, world!\n你好 ok"
+        units = split_words(text)
+        self.assertEqual("".join(units), text)
+        self.assertEqual(units, ["  ", "Hello, ", "world!\n", "你", "好 ", "ok"])
+        self.assertEqual(split_text_units("ab", "word"), ["ab"])
+        self.assertEqual(split_text_units("ab", "grapheme"), ["a", "b"])
+
+
+class TestChunkRenderer(unittest.TestCase):
+    """Test cases for template-based chunk rendering"""
+
+    def setUp(self):
+        self.original = {
+            "candidates": [{"content": {"parts": [{"text": "full"}], "role": "model"}}],
+            "usageMetadata": {"totalTokenCount": 3},
+        }
+        self.calls = 0
+
+    def create_chunk(self, text):
+        self.calls += 1
+        chunk = json.loads(json.dumps(self.original))
+        chunk["candidates"][0]["content"]["parts"][0]["text"] = text
+        return chunk
+
+    def format_chunk(self, chunk):
+        return "data: " + json.dumps(chunk) + "\n\n"
+
+    def test_matches_full_serialization(self):
+        """Rendered output equals serializing the whole chunk, with one envelope build"""
+        render = build_chunk_renderer(self.create_chunk, self.format_chunk)
+        for text in ("a", '"quoted"\n', "中文", "\x00"):
+            self.assertEqual(render(text), self.format_chunk(self.create_chunk(text)))
+        self.assertEqual(self.calls, 5)
+
+    def test_falls_back_without_text_field(self):
+        """Chunks without a text slot are rendered the slow way"""
+        render = build_chunk_renderer(lambda text: {"other": 1}, self.format_chunk)
+        self.assertEqual(render("x"), 'data: {"other": 1}\n\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Unit tests for resuming interrupted streams
+"""
+
+import unittest
+
+from app.service.chat.stream_resume import StreamProgress, build_resume_payload
+
+
+def _chunk(*parts):
+    return {"candidates": [{"content": {"role": "model", "parts": list(parts)}, "index": 0}]}
+
+
+class TestStreamProgress(unittest.TestCase):
+    """Test cases for tracking emitted stream content"""
+
+    def test_accumulates_text(self):
+        """Text parts are concatenated in order and thought parts are skipped"""
+        progress = StreamProgress()
+        self.assertFalse(progress.can_resume)
+        progress.record(_chunk({"text": "plan", "thought": True}))
+        progress.record(_chunk({"text": "Hello, "}))
+        progress.record(_chunk({"text": "world", "thoughtSignature": "abc"}))
+        progress.record({"usageMetadata": {"totalTokenCount": 3}})
+        self.assertEqual(progress.text, "Hello, world")
+        self.assertTrue(progress.can_resume)
+
+    def test_non_text_content_is_not_resumable(self):
+        """A function call that was already emitted cannot be resumed"""
+        progress = StreamProgress()
+        progress.record(_chunk({"text": "Calling"}))
+        progress.record(_chunk({"functionCall": {"name": "f", "args": {}}}))
+        self.assertTrue(progress.emitted)
+        self.assertFalse(progress.can_resume)
+
+    def test_multiple_candidates_are_not_resumable(self):
+        """Responses with several candidates cannot be continued as one turn"""
+        progress = StreamProgress()
+        progress.record({"candidates": [_chunk({"text": "a"})["candidates"][0]] * 2})
+        self.assertFalse(progress.can_resume)
+
+
+class TestBuildResumePayload(unittest.TestCase):
+    """Test cases for building the continuation request"""
+
+    def test_appends_model_turn(self):
+        """The partial answer is appended as a model turn without touching the original"""
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": "hi"}]}],
+            "generationConfig": {"temperature": 0},
+        }
+        resumed = build_resume_payload(payload, "Hello")
+        self.assertEqual(resumed["contents"][-1], {"role": "model", "parts": [{"text": "Hello"}]})
+        self.assertEqual(resumed["generationConfig"], payload["generationConfig"])
+        self.assertEqual(len(payload["contents"]), 1)
+
+    def test_extends_prefilled_model_turn(self):
+        """A request that already ends with a model turn gets the text added to it"""
+        payload = {
+            "contents": [
+                {"role": "user", "parts": [{"text": "hi"}]},
+                {"role": "model", "parts": [{"text": "Sure: "}]},
+            ]
+        }
+        resumed = build_resume_payload(payload, "Hello")
+        self.assertEqual(len(resumed["contents"]), 2)
+        self.assertEqual(resumed["contents"][-1]["parts"], [{"text": "Sure: "}, {"text": "Hello"}])
+        self.assertEqual(payload["contents"][-1]["parts"], [{"text": "Sure: "}])
+
+
+if __name__ == "__main__":
+    unittest.main()
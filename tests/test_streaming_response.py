@@ -0,0 +1,66 @@
+"""
+Unit tests for the disconnect-aware streaming response
+"""
+
+import asyncio
+import unittest
+
+from app.handler.streaming_response import DisconnectAwareStreamingResponse
+
+
+class TestDisconnectAwareStreamingResponse(unittest.IsolatedAsyncioTestCase):
+    """Test cases for DisconnectAwareStreamingResponse"""
+
+    async def test_streams_to_completion(self):
+        """Without a disconnect every chunk is sent and the body is terminated"""
+
+        async def body():
+            yield "a"
+            yield "b"
+
+        sent = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        response = DisconnectAwareStreamingResponse(body())
+        await response({"type": "http"}, receive, send)
+        bodies = [m.get("body") for m in sent if m["type"] == "http.response.body"]
+        self.assertEqual(bodies, [b"a", b"b", b""])
+
+    async def test_disconnect_cancels_generator(self):
+        """A client disconnect cancels the generator while it waits on upstream"""
+        events = []
+        disconnected = asyncio.Event()
+
+        async def body():
+            try:
+                yield "first"
+                await asyncio.sleep(10)
+                yield "never"
+            except asyncio.CancelledError:
+                events.append("cancelled")
+                raise
+            finally:
+                # 取消后 finally 中仍可以等待（例如写请求日志）
+                await asyncio.sleep(0)
+                events.append("closed")
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body") == b"first":
+                disconnected.set()
+
+        response = DisconnectAwareStreamingResponse(body())
+        await asyncio.wait_for(response({"type": "http"}, receive, send), 1)
+        self.assertEqual(events, ["cancelled", "closed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Unit tests for the write-behind log queue
+"""
+
+import asyncio
+import unittest
+
+from app.database.write_behind import WriteBehindQueue
+
+
+class TestWriteBehindQueue(unittest.IsolatedAsyncioTestCase):
+    """Test cases for WriteBehindQueue"""
+
+    def setUp(self):
+        self.batches = []
+        self.fail = False
+
+    async def _write(self, table, rows):
+        if self.fail or any(row.get("poison") for row in rows):
+            raise RuntimeError("database unavailable")
+        self.batches.append((table, [row["n"] for row in rows]))
+
+    async def test_batches_by_size_and_table(self):
+        """Reaching batch_size flushes immediately with one INSERT per table"""
+        queue = WriteBehindQueue(self._write, batch_size=4, flush_interval=10)
+        queue.start()
+        for n in range(4):
+            await queue.put("request" if n % 2 == 0 else "error", {"n": n})
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.batches, [("request", [0, 2]), ("error", [1, 3])])
+        self.assertEqual(queue.written, 4)
+        await queue.stop()
+
+    async def test_flushes_on_interval(self):
+        """Rows below batch_size are written after flush_interval"""
+        queue = WriteBehindQueue(self._write, batch_size=100, flush_interval=0.01)
+        queue.start()
+        await queue.put("request", {"n": 1})
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.batches, [("request", [1])])
+        await queue.stop()
+
+    async def test_stop_drains_queue(self):
+        """Stopping writes every queued row"""
+        queue = WriteBehindQueue(self._write, batch_size=2, flush_interval=10)
+        queue.start()
+        for n in range(5):
+            await queue.put("request", {"n": n})
+        await queue.stop()
+        self.assertEqual(
+            [n for _, rows in self.batches for n in rows], [0, 1, 2, 3, 4]
+        )
+        self.assertEqual(queue.depth, 0)
+        self.assertFalse(queue.running)
+
+    async def test_drop_policies(self):
+        """drop_oldest keeps the newest rows, drop_newest rejects new rows"""
+        oldest = WriteBehindQueue(self._write, max_size=2, overflow_policy="drop_oldest")
+        for n in range(3):
+            self.assertTrue(await oldest.put("request", {"n": n}))
+        self.assertEqual([row["n"] for _, row in oldest._rows], [1, 2])
+        self.assertEqual(oldest.dropped, 1)
+
+        newest = WriteBehindQueue(self._write, max_size=2, overflow_policy="drop_newest")
+        results = [await newest.put("request", {"n": n}) for n in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual([row["n"] for _, row in newest._rows], [0, 1])
+        self.assertEqual(newest.metrics()["dropped"], 1)
+
+    async def test_block_policy_waits_for_space(self):
+        """block makes producers wait until the flusher frees space"""
+        queue = WriteBehindQueue(
+            self._write, max_size=2, batch_size=2, flush_interval=0.01, overflow_policy="block"
+        )
+        queue.start()
+        for n in range(5):
+            self.assertTrue(await asyncio.wait_for(queue.put("request", {"n": n}), 1))
+        await queue.stop()
+        self.assertEqual(queue.dropped, 0)
+        self.assertEqual(
+            [n for _, rows in self.batches for n in rows], [0, 1, 2, 3, 4]
+        )
+
+    async def test_failed_flush_requeues_rows(self):
+        """Rows survive a failed write and are written on the next flush"""
+        queue = WriteBehindQueue(self._write, batch_size=10)
+        await queue.put("request", {"n": 1})
+        await queue.put("request", {"n": 2})
+        self.fail = True
+        self.assertFalse(await queue.flush())
+        self.assertEqual(queue.depth, 2)
+        self.assertEqual(queue.failed_flushes, 1)
+        self.fail = False
+        self.assertTrue(await queue.flush())
+        self.assertEqual(self.batches, [("request", [1, 2])])
+
+    async def test_failing_row_is_dropped_after_retries(self):
+        """A row that always fails does not block the rows behind it"""
+        queue = WriteBehindQueue(self._write, batch_size=10, max_retries=2)
+        await queue.put("request", {"n": 1})
+        await queue.put("request", {"n": 2, "poison": True})
+        await queue.put("request", {"n": 3})
+        self.assertFalse(await queue.flush())
+        self.assertTrue(await queue.flush())
+        self.assertEqual(self.batches, [("request", [1]), ("request", [3])])
+        self.assertEqual(queue.depth, 0)
+        self.assertEqual(queue.metrics()["failed_rows"], 1)
+
+    async def test_database_down_drops_rows_instead_of_stalling(self):
+        """While the database stays down, each batch is given up after max_retries"""
+        queue = WriteBehindQueue(self._write, batch_size=2, max_retries=2)
+        for n in range(4):
+            await queue.put("request", {"n": n})
+        self.fail = True
+        for _ in range(4):
+            await queue.flush()
+        self.assertEqual(queue.depth, 0)
+        self.assertEqual(queue.failed_rows, 4)
+
+    async def test_block_policy_times_out(self):
+        """block gives up after block_timeout when the flusher cannot free space"""
+        queue = WriteBehindQueue(
+            self._write, max_size=1, flush_interval=10, overflow_policy="block", block_timeout=0.01
+        )
+        queue.start()
+        self.assertTrue(await queue.put("request", {"n": 1}))
+        self.assertFalse(await asyncio.wait_for(queue.put("request", {"n": 2}), 1))
+        self.assertEqual(queue.dropped, 1)
+        await queue.stop()
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            WriteBehindQueue(self._write, overflow_policy="spill")
+
+
+if __name__ == "__main__":
+    unittest.main()